@@ -8,12 +8,30 @@ from routes.employees import employees_bp, ensure_indexes as ensure_employee_ind
 from routes.resume import resume_bp
 from routes.projects import projects_bp, ensure_indexes as ensure_project_indexes
 from routes.match import match_bp
-from routes.hr_allocation import hr_allocation_bp  # NEW IMPORT
+from routes.hr_allocation import hr_allocation_bp, ensure_indexes as ensure_allocation_indexes  # NEW IMPORT
+from routes.admin import admin_bp
+from services.skill_index import skill_index
+from services import search_index
+from services.gemini_client import gemini_client
+from services import llm_cache
+from services import resume_jobs
+from services import resume_ingest
+from services import query_profile
+from utils.pdf import pdf_stats
+from utils import responses
+from services import versions
 
-def create_app():
+def create_app(start_workers: bool = True):
     app = Flask(__name__)
     CORS(app, supports_credentials=True)
     app.config["MAX_CONTENT_LENGTH"] = Config.MAX_UPLOAD_MB * 1024 * 1024
+    # GETs answered 304 while these version counters are unchanged
+    responses.install(app, versioned={
+        "employees": (versions.EMPLOYEES,),
+        "projects": (versions.PROJECTS,),
+        "hr_allocation.list_allocations": (versions.ALLOCATIONS,),
+        "match.match_for_project": (versions.EMPLOYEES, versions.PROJECTS, versions.ALLOCATIONS),
+    })
 
     db = None
     try:
@@ -24,6 +42,7 @@ def create_app():
             serverSelectionTimeoutMS=Config.MONGO_TIMEOUT_MS,
             connectTimeoutMS=Config.MONGO_TIMEOUT_MS,
             socketTimeoutMS=Config.MONGO_TIMEOUT_MS,
+            event_listeners=query_profile.listeners(),
         )
         client.admin.command("ping")
         db = client[Config.DB_NAME]
@@ -32,6 +51,16 @@ def create_app():
         with app.app_context():
             ensure_employee_indexes()
             ensure_project_indexes()
+            ensure_allocation_indexes()
+        llm_cache.ensure_indexes(db)
+        resume_jobs.ensure_indexes(db)
+        resume_ingest.ensure_indexes(db)
+        query_profile.start(db)
+        skill_index.rebuild(db)
+        if search_index.enabled():
+            search_index.rebuild(db)
+        if start_workers:
+            resume_jobs.start_runner(db)
 
         print("✅ Connected to MongoDB")
     except Exception as e:
@@ -39,13 +68,15 @@ def create_app():
 
     @app.route("/health", methods=["GET"])
     def health_check():
-        return jsonify({"status": "ok", "db_connected": db is not None})
+        return jsonify({"status": "ok", "db_connected": db is not None, "gemini": gemini_client.stats(),
+                        "pdf": pdf_stats()})
 
     app.register_blueprint(employees_bp, url_prefix="/employees")
     app.register_blueprint(resume_bp, url_prefix="/resume")
     app.register_blueprint(projects_bp, url_prefix="/projects")
     app.register_blueprint(match_bp, url_prefix="/match")
     app.register_blueprint(hr_allocation_bp, url_prefix="/hr_allocation")  # NEW
+    app.register_blueprint(admin_bp, url_prefix="/admin")
 
     return app
 
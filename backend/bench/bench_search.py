@@ -0,0 +1,82 @@
+"""
+Unanchored $regex search vs the trigram search index (services.search_index).
+
+    cd backend && python -m bench.bench_search [--docs 100000] [--mongo mongodb://localhost:27017]
+
+Without --mongo the regex side is a compiled re.search over every name in
+memory (the lower bound of a collection scan: no I/O, no BSON decoding).
+With --mongo a scratch database (bench_search) is seeded and the real
+`{"name": {"$regex": q, "$options": "i"}}` query is timed against index
+search + `_id: {$in: ...}` fetch; the database is dropped afterwards.
+"""
+import argparse
+import random
+import re
+import time
+
+from services.search_index import TrigramIndex
+
+FIRST = ["james", "mary", "robert", "patricia", "john", "jennifer", "michael", "linda", "david", "elizabeth",
+         "priya", "rahul", "anita", "wei", "yuki", "olumide", "sofia", "mateo", "chloe", "noah"]
+LAST = ["smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "sharma", "patel",
+        "nakamura", "chen", "okafor", "rossi", "müller", "dubois", "silva", "kowalski", "novak", "haddad"]
+QUERIES = ["jo", "smith", "rahul sh", "ller", "nakamura", "jon smith", "zzzz"]
+
+def _names(n):
+    rnd = random.Random(11)
+    return [f"{rnd.choice(FIRST).title()} {rnd.choice(LAST).title()} {rnd.randint(1, 9999)}" for _ in range(n)]
+
+def _ms(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000, out
+
+def bench_memory(names):
+    index = TrigramIndex()
+    t = time.perf_counter()
+    index.rebuild(enumerate(names))
+    print(f"index build: {(time.perf_counter() - t) * 1000:.0f} ms for {len(names)} names")
+    for q in QUERIES:
+        rx = re.compile(re.escape(q), re.I)
+        regex_ms, hits = _ms(lambda: [i for i, n in enumerate(names) if rx.search(n)])
+        index_ms, found = _ms(lambda: index.search(q))
+        print(f"  q={q!r:12} regex {regex_ms:8.2f} ms ({len(hits):>6} hits)   "
+              f"trigram {index_ms:8.2f} ms ({len(found):>6} hits)")
+
+def bench_mongo(names, uri):
+    from pymongo import MongoClient
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    db = client["bench_search"]
+    db.employees.drop()
+    ids = db.employees.insert_many([{"name": n} for n in names]).inserted_ids
+    index = TrigramIndex()
+    index.rebuild(zip(ids, names))
+    try:
+        for q in QUERIES:
+            regex_ms, hits = _ms(lambda: list(db.employees.find({"name": {"$regex": re.escape(q), "$options": "i"}},
+                                                                {"name": 1}).limit(50)), repeat=3)
+
+            def indexed():
+                top = sorted(index.search(q).items(), key=lambda kv: -kv[1])[:50]
+                return list(db.employees.find({"_id": {"$in": [i for i, _ in top]}}, {"name": 1}))
+
+            index_ms, found = _ms(indexed, repeat=3)
+            print(f"  q={q!r:12} mongo $regex {regex_ms:8.2f} ms   trigram + $in {index_ms:8.2f} ms")
+    finally:
+        client.drop_database("bench_search")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=100000)
+    ap.add_argument("--mongo", help="MongoDB URI to also time the real $regex query")
+    args = ap.parse_args()
+    names = _names(args.docs)
+    bench_memory(names)
+    if args.mongo:
+        bench_mongo(names, args.mongo)
+
+if __name__ == "__main__":
+    main()
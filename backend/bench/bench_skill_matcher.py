@@ -0,0 +1,65 @@
+"""
+Naive per-skill substring loops vs the compiled skill matcher.
+
+    cd backend && python -m bench.bench_skill_matcher [--lines 20000]
+
+Scans N synthetic project lines for 3 / 15 / 50 required skills, the way the
+flat-projects fallback in services.match and the bucketing in
+routes.resume._normalize_extracted do.
+"""
+import argparse
+import random
+import time
+
+from utils.skill_matcher import SKILL_LEXICON, group_matcher
+
+WORDS = ["portal", "dashboard", "api", "service", "pipeline", "exam", "inventory",
+         "chat", "analytics", "booking", "microservice", "frontend", "backend"]
+
+def _lines(n, skills):
+    rnd = random.Random(7)
+    out = []
+    for _ in range(n):
+        words = rnd.sample(WORDS, 4) + rnd.sample(skills, 2)
+        rnd.shuffle(words)
+        out.append(" ".join(words).lower() + " " + "x" * rnd.randint(0, 80))
+    return out
+
+def _skills(k):
+    base = [s.lower() for s in SKILL_LEXICON]
+    extra = [f"skill{i}" for i in range(max(0, k - len(base)))]
+    return (base + extra)[:k]
+
+def naive(lines, req):
+    hits = 0
+    for p in lines:
+        for r in req:
+            if r in p:
+                hits += 1
+    return hits
+
+def automaton(lines, req):
+    m = group_matcher(tuple(req))
+    hits = 0
+    for p in lines:
+        hits += len(m.labels(p))
+    return hits
+
+def _time(fn, *args):
+    t = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - t) * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=20000)
+    args = ap.parse_args()
+    for k in (3, 15, 50):
+        req = _skills(k)
+        lines = _lines(args.lines, req)
+        group_matcher(tuple(req))  # compile outside the timing
+        print(f"{k:>3} skills x {args.lines} lines: "
+              f"naive {_time(naive, lines, req):8.1f} ms   automaton {_time(automaton, lines, req):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
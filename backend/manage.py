@@ -0,0 +1,138 @@
+"""
+Maintenance commands. Run from the backend/ directory, e.g.:
+
+    python manage.py backfill-match-features [--force] [--batch-size 500]
+    python manage.py backfill-availability [--batch-size 500]
+    python manage.py backfill-name-keys [--batch-size 500]
+    python manage.py rebuild-text-index
+    python manage.py llm-cache-clear [--kind extract|rerank] [--below-version N]
+    python manage.py import-resumes PATH [--processes N]   # PATH: directory of PDFs or .zip
+    python manage.py reparse-resumes [--batch-size 100] [--workers N] [--rate R] [--force] [--restart] [--limit N]
+    python manage.py index-advice [--collection employees] [--min-count N] [--create]
+"""
+import argparse
+import sys
+
+from app import create_app
+from services.match_features import backfill_match_features
+from services.availability import backfill_availability_spans
+from services.resume_ingest import backfill_name_keys
+from services import text_index
+from services.llm_cache import llm_cache
+from services.resume_bulk import import_resumes
+from services.resume_reparse import ReparseBusy, reparse_resumes
+from services import query_profile
+import json
+
+def _db():
+    app = create_app(start_workers=False)
+    db = app.config.get("DB")
+    if db is None:
+        sys.exit("DB not connected")
+    return db
+
+def cmd_backfill_match_features(args):
+    n = backfill_match_features(_db(), batch_size=args.batch_size, force=args.force)
+    print(f"match_features updated on {n} employee(s)")
+
+def cmd_backfill_availability(args):
+    n = backfill_availability_spans(_db(), batch_size=args.batch_size)
+    print(f"availability_spans updated on {n} employee(s)")
+
+def cmd_backfill_name_keys(args):
+    n = backfill_name_keys(_db(), batch_size=args.batch_size)
+    print(f"name_key updated on {n} employee(s)")
+
+def cmd_rebuild_text_index(args):
+    db = _db()
+    if not text_index.available():
+        sys.exit("text index unavailable (numpy not installed?)")
+    n = text_index.rebuild(db)
+    print(f"text index rebuilt: {n} employee(s)")
+
+def cmd_llm_cache_clear(args):
+    n = llm_cache.invalidate(_db(), kind=args.kind, below_version=args.below_version)
+    print(f"removed {n} cached Gemini response(s)")
+
+def cmd_import_resumes(args):
+    report = import_resumes(_db(), args.path, processes=args.processes)
+    print(json.dumps(report, indent=2, default=str))
+    if report["failed"]:
+        sys.exit(1)
+
+def cmd_reparse_resumes(args):
+    def progress(cp):
+        print(f"  ... {cp['counts']['scanned']} scanned, {cp['counts']['reparsed']} re-parsed "
+              f"(last _id {cp['last_id']})", file=sys.stderr)
+
+    try:
+        cp = reparse_resumes(_db(), batch_size=args.batch_size, workers=args.workers, rate=args.rate,
+                             force=args.force, restart=args.restart, limit=args.limit, progress=progress)
+    except ReparseBusy as e:
+        sys.exit(str(e))
+    print(json.dumps({"status": cp["status"], "last_id": cp["last_id"], **cp["counts"]}, indent=2, default=str))
+
+def cmd_index_advice(args):
+    db = _db()
+    advice = query_profile.advise(db, collection=args.collection, min_count=args.min_count)
+    if not advice:
+        print("no index suggestions (is QUERY_PROFILE_ENABLED set on the servers?)")
+        return
+    for a in advice:
+        print(f"{a['create']}   # {a['count']} slow run(s), {a['total_ms']:.0f} ms total, "
+              f"max {a['max_ms']:.0f} ms, plan {'/'.join(a['stages']) or '?'}")
+        if args.create:
+            name = db[a["collection"]].create_index([tuple(k) for k in a["index"]])
+            print(f"  created {name}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="manage.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backfill-match-features", help="compute employees.match_features for existing documents")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.add_argument("--force", action="store_true", help="recompute every employee, not just missing/outdated ones")
+    p.set_defaults(func=cmd_backfill_match_features)
+
+    p = sub.add_parser("backfill-availability", help="compute employees.availability_spans from availability_dates")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=cmd_backfill_availability)
+
+    p = sub.add_parser("backfill-name-keys", help="compute employees.name_key (bulk import name lookup) from name")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=cmd_backfill_name_keys)
+
+    p = sub.add_parser("rebuild-text-index", help="re-encode the employee text vectors from Mongo (after turning TEXT_MATCH_WEIGHT on)")
+    p.set_defaults(func=cmd_rebuild_text_index)
+
+    p = sub.add_parser("llm-cache-clear", help="drop cached Gemini responses (e.g. after a prompt change)")
+    p.add_argument("--kind", choices=["extract", "rerank"])
+    p.add_argument("--below-version", type=int, help="only entries made with an older prompt version")
+    p.set_defaults(func=cmd_llm_cache_clear)
+
+    p = sub.add_parser("import-resumes", help="create / update employees from a directory or zip of PDF resumes")
+    p.add_argument("path")
+    p.add_argument("--processes", type=int, help="PDF extraction processes (default: BULK_IMPORT_PROCESSES or one per CPU)")
+    p.set_defaults(func=cmd_import_resumes)
+
+    p = sub.add_parser("reparse-resumes",
+                       help="re-run resume parsing from the stored text (resumes where it left off)")
+    p.add_argument("--batch-size", type=int, default=100)
+    p.add_argument("--workers", type=int, help="parse threads (default: REPARSE_WORKERS)")
+    p.add_argument("--rate", type=float, help="max parses started per second (default: REPARSE_RATE_PER_S)")
+    p.add_argument("--force", action="store_true", help="also re-parse resumes whose extraction is current")
+    p.add_argument("--restart", action="store_true", help="start a new pass instead of resuming")
+    p.add_argument("--limit", type=int, help="stop after this many employees (resume later)")
+    p.set_defaults(func=cmd_reparse_resumes)
+
+    p = sub.add_parser("index-advice", help="suggest compound indexes for the slow queries the profiler recorded")
+    p.add_argument("--collection")
+    p.add_argument("--min-count", type=int, default=1, help="ignore query shapes seen fewer times")
+    p.add_argument("--create", action="store_true", help="also create the suggested indexes")
+    p.set_defaults(func=cmd_index_advice)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from flask import Blueprint, request, jsonify, current_app
+from services import query_profile
+
+admin_bp = Blueprint("admin", __name__)
+
+@admin_bp.route("/queries/slow", methods=["GET"])
+def slow_queries():
+    """
+    Slow query shapes recorded by the query profiler (QUERY_PROFILE_ENABLED),
+    most total time first. ?collection=employees narrows it, ?limit=N (50).
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    limit = max(int(request.args.get("limit", "50") or "50"), 1)
+    rows = query_profile.slow_queries(db, request.args.get("collection"), limit)
+    return jsonify({"ok": True, "profiler": query_profile.profiler.stats(), "data": rows}), 200
+
+@admin_bp.route("/indexes/advice", methods=["GET"])
+def index_advice():
+    """
+    Compound indexes that would serve the recorded slow shapes (equality,
+    sort, range order), with the createIndex call for each.
+    ?collection=..., ?min_count=N ignores shapes seen fewer than N times.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    try:
+        min_count = int(request.args.get("min_count", "1") or "1")
+    except ValueError:
+        return jsonify({"ok": False, "error": "min_count must be an integer"}), 400
+    advice = query_profile.advise(db, request.args.get("collection"), min_count)
+    return jsonify({"ok": True, "advice": advice}), 200
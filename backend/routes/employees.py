@@ -1,7 +1,21 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from bson import ObjectId
 from datetime import datetime
 from typing import Dict, Any, List, Optional
+from services.skill_index import skill_index
+from services import versions
+from services import availability
+from services import text_index
+from services import search_index
+from config import Config
+from services.match_features import FEATURES_VERSION, build_match_features, match_features_update
+from services.resume_ingest import name_key
+from utils import pagination
+from utils import ndjson
+from utils import fieldsets
+from utils import bulk
+from pymongo import ReturnDocument
+import re
 
 employees_bp = Blueprint("employees", __name__)
 
@@ -10,8 +24,30 @@ def ensure_indexes():
     if db is None:
         return
     db.employees.create_index([("name", 1)])
+    db.employees.create_index("name_key")
     db.employees.create_index("role")
     db.employees.create_index("skills")
+    db.employees.create_index("match_features.skills")
+    for field in _SORTS[:-1]:
+        db.employees.create_index([(field, 1), ("_id", 1)])
+    availability.ensure_indexes(db)
+    # the skill filters read match_features; employees written before it (or
+    # with an older version) need the migration
+    if db.employees.find_one({"match_features.v": {"$ne": FEATURES_VERSION}}, {"_id": 1}) is not None:
+        current_app.logger.warning("employees without current match_features: run `python manage.py "
+                                   "backfill-match-features`")
+
+# large / internal fields the read endpoints never return
+_LIST_PROJECTION = {"resume_text": 0, "match_features": 0}
+
+# the only sorts the list endpoint accepts: each has a (field, _id) index, so an
+# unfiltered sorted page never needs an in-memory sort (filter + sort shapes
+# that do are what services.query_profile's index advisor reports)
+_SORTS = ("name", "created_at", "updated_at", "_id")
+
+# response fields, selectable with ?fields=
+_FIELDS = ("id", "name", "role", "skills", "projects_by_skill", "projects", "previous_experience", "availability",
+           "availability_dates", "cv_url", "portfolio_url", "cv_file_id", "created_at", "updated_at")
 
 def _public(doc: Dict[str, Any]) -> Dict[str, Any]:
     return {
@@ -59,6 +95,66 @@ def _oid(s: str) -> Optional[ObjectId]:
     except Exception:
         return None
 
+def _employee_fields(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized copies of the writable employee fields present in `body`."""
+    out: Dict[str, Any] = {}
+    for f in ("name", "role", "availability", "cv_url", "portfolio_url"):
+        if f in body:
+            out[f] = str(body.get(f) or "").strip() or None
+    if "name" in out:
+        out["name_key"] = name_key(out["name"])
+    if "skills" in body:
+        out["skills"] = _coerce_skills(body.get("skills"))
+    for f, empty in (("projects_by_skill", {}), ("projects", []), ("previous_experience", [])):
+        if f in body:
+            out[f] = body.get(f) or empty
+    if "availability_dates" in body:
+        out["availability_dates"] = _coerce_dates(body.get("availability_dates"))
+        out["availability_spans"] = availability.availability_spans_field(out["availability_dates"])
+    return out
+
+def _employee_changes(body: Dict[str, Any]) -> Dict[str, Any]:
+    """$set for a PATCH body, including the match_features it invalidates."""
+    body = dict(body)
+    body.pop("_id", None)
+    body.pop("match_features", None)
+    body.pop("availability_spans", None)
+    body.pop("name_key", None)
+    if "name" in body:
+        body["name_key"] = name_key(body.get("name"))
+    if "skills" in body:
+        body["skills"] = _coerce_skills(body.get("skills"))
+    if "availability_dates" in body:
+        body["availability_dates"] = _coerce_dates(body.get("availability_dates"))
+        body["availability_spans"] = availability.availability_spans_field(body["availability_dates"])
+    if "cv_file_id" in body and isinstance(body["cv_file_id"], str):
+        try: body["cv_file_id"] = ObjectId(body["cv_file_id"])
+        except Exception: pass
+    body.update(match_features_update(body))
+    body["updated_at"] = datetime.utcnow()
+    return body
+
+def _new_employee(fields: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    doc = {
+        "name": None,
+        "role": None,
+        "skills": [],
+        "projects_by_skill": {},
+        "projects": [],
+        "previous_experience": [],
+        "availability": None,
+        "availability_dates": [],
+        "availability_spans": [],
+        "cv_url": None,
+        "portfolio_url": None,
+        "cv_file_id": None,
+        **fields,
+        "created_at": now,
+        "updated_at": now,
+    }
+    doc["match_features"] = build_match_features(doc)
+    return doc
+
 @employees_bp.route("", methods=["POST"])
 def create_employee():
     db = current_app.config.get("DB")
@@ -66,32 +162,29 @@ def create_employee():
         return jsonify({"ok": False, "error": "DB not connected"}), 500
 
     body = request.get_json(force=True, silent=True) or {}
-    name = (body.get("name") or "").strip()
-    if not name:
+    fields = _employee_fields(body)
+    if not fields.get("name"):
         return jsonify({"ok": False, "error": "name is required"}), 400
-
-    doc = {
-        "name": name,
-        "role": (body.get("role") or "").strip() or None,
-        "skills": _coerce_skills(body.get("skills")),
-        # accept optional custom inputs too
-        "projects_by_skill": body.get("projects_by_skill") or {},
-        "projects": body.get("projects") or [],
-        "previous_experience": body.get("previous_experience") or [],
-        "availability": (body.get("availability") or "").strip() or None,
-        "availability_dates": _coerce_dates(body.get("availability_dates")),
-        "cv_url": (body.get("cv_url") or "").strip() or None,
-        "portfolio_url": (body.get("portfolio_url") or "").strip() or None,
-        "cv_file_id": body.get("cv_file_id"),
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
-    }
+    fields["cv_file_id"] = body.get("cv_file_id")
+    doc = _new_employee(fields, datetime.utcnow())
     res = db.employees.insert_one(doc)
     doc["_id"] = res.inserted_id
+    skill_index.add(doc)
+    text_index.index_employee(db, doc)
+    search_index.index_employee(doc)
+    versions.bump(db, versions.EMPLOYEES)
     return jsonify({"ok": True, "employee": _public(doc)}), 201
 
 @employees_bp.route("", methods=["GET"])
 def list_employees():
+    """
+    Filtered employee list. `q` searches names (best matches first unless a
+    sort is given); skill / skills are exact, case-insensitive skill filters.
+    Page with `after` (the `pagination.next` token of the previous response)
+    or, for older clients, page/limit.
+    count=exact|cached|estimated|none picks how `total` is computed
+    (default: cached with page/limit, none with after).
+    """
     db = current_app.config.get("DB")
     if db is None:
         return jsonify({"ok": False, "error": "DB not connected"}), 500
@@ -102,37 +195,188 @@ def list_employees():
     skills_csv = request.args.get("skills")
     q = request.args.get("q")
     page = int(request.args.get("page", "1") or "1")
-    limit = int(request.args.get("limit", "10") or "10")
+    limit = max(int(request.args.get("limit", "10") or "10"), 1)
     sort = (request.args.get("sort") or "").strip()
+    after = request.args.get("after")
+    count_mode = (request.args.get("count") or ("none" if after is not None else "cached")).lower()
+    if count_mode not in pagination.COUNT_MODES:
+        return jsonify({"ok": False, "error": f"count must be one of {', '.join(pagination.COUNT_MODES)}"}), 400
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
     query: Dict[str, Any] = {}
-    if q:
-        query["name"] = {"$regex": q, "$options": "i"}
     if role_like:
         query["role"] = {"$regex": role_like, "$options": "i"}
     elif role:
         query["role"] = role
+    # match_features.skills: the normalized (stripped, lowercased) skills
     if skills_csv:
-        skill_list = [s.strip() for s in skills_csv.split(",") if s.strip()]
+        skill_list = [s.strip().lower() for s in skills_csv.split(",") if s.strip()]
         if skill_list:
-            query["skills"] = {"$in": skill_list}
-    elif skill:
-        query["skills"] = skill
+            query["match_features.skills"] = {"$in": skill_list}
+    elif skill and skill.strip():
+        query["match_features.skills"] = skill.strip().lower()
+
+    field, direction = pagination.parse_sort("" if sort == "relevance" else sort, ("_id", 1))
+    if field not in _SORTS:
+        return jsonify({"ok": False, "error": f"sort must be one of {', '.join(_SORTS)} (prefix - to reverse)"}), 400
+    # the sort field is loaded even when not requested: the `after` token needs it
+    projection = fieldsets.projection(fields, _LIST_PROJECTION, also=[field])
+
+    if q:
+        ranked = search_index.search_employees(db, q) if search_index.enabled() else None
+        if ranked is not None and sort in ("", "relevance"):
+            if after is not None:
+                return jsonify({"ok": False, "error": "'after' can't page a relevance search; use page or a sort"}), 400
+            rows, total = search_index.relevance_page(db.employees, query, ranked, max(page - 1, 0) * limit, limit,
+                                                      projection)
+            return jsonify({"ok": True, "data": [{**fieldsets.pick(_public(x), fields), "score": x["_score"]}
+                                                 for x in rows],
+                            "pagination": {"page": page, "limit": limit, "count": "exact", "total": total,
+                                           "next": None, "order": "relevance"}}), 200
+        if ranked is not None and len(ranked) <= Config.SEARCH_MAX_IDS:
+            query["_id"] = {"$in": [i for i, _ in ranked]}
+        else:
+            query["name"] = {"$regex": re.escape(q), "$options": "i"}
+
+    after_filter = None
+    if after:
+        try:
+            after_filter = pagination.keyset_filter(field, direction, *pagination.decode_cursor(after, field, direction))
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+    cur = db.employees.find(pagination.with_filter(query, after_filter), projection)
+    cur = cur.sort(pagination.sort_spec(field, direction))
+    if after is None:
+        cur = cur.skip(max(page - 1, 0) * limit)
+    rows, more = pagination.page_rows(cur.limit(limit + 1), limit)
+
+    version = versions.get_versions(db, [versions.EMPLOYEES])[versions.EMPLOYEES] if count_mode in ("cached", "estimated") else 0
+    meta: Dict[str, Any] = {"limit": limit, "count": count_mode,
+                            "next": pagination.encode_cursor(field, direction, rows[-1]) if more else None}
+    if after is None:
+        meta["page"] = page
+    total = pagination.count_total(db.employees, query, count_mode, version)
+    if total is not None:
+        meta["total"] = total
+    return jsonify({"ok": True, "data": [fieldsets.pick(_public(x), fields) for x in rows], "pagination": meta}), 200
+
+@employees_bp.route("", methods=["PATCH"])
+def patch_employees():
+    """
+    Bulk update: a list of {"id": ..., "changes": {...}} (or {"items": [...]}),
+    each applied like PATCH /employees/<id>, all in one bulk_write. Returns a
+    result per item, in order: {"id", "ok": true, "employee"} or
+    {"id", "ok": false, "error"}; ?fields= narrows the returned employees.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    items = bulk.parse_items(request.get_json(force=True, silent=True))
+    if items is None:
+        return jsonify({"ok": False, "error": "body must be a list of {id, changes}"}), 400
+    if len(items) > Config.BULK_PATCH_MAX_ITEMS:
+        return jsonify({"ok": False, "error": f"at most {Config.BULK_PATCH_MAX_ITEMS} items per request"}), 413
+
+    results, written = bulk.apply_patches(db.employees, items, _employee_changes)
+    for doc in written:
+        skill_index.add(doc)
+    text_index.index_employees(db, written)
+    search_index.index_employees(written)
+    if written:
+        versions.bump(db, versions.EMPLOYEES)
+    for r in results:
+        if "doc" in r:
+            r["employee"] = fieldsets.pick(_public(r.pop("doc")), fields)
+    return jsonify({"ok": True, "updated": len(written), "failed": len(results) - len(written),
+                    "results": results}), 200
+
+@employees_bp.route("/import", methods=["POST"])
+def import_employees():
+    """
+    Bulk create / update from an NDJSON body, one employee object per line,
+    normalized like POST /employees. A line with "id" updates that employee
+    (only the fields it carries; an unknown id creates it with that id); with
+    ?match=name a line without "id" updates the employee of exactly that name.
+    Any other line creates an employee. The body is read line by line and
+    written with one bulk_write per NDJSON_BATCH lines; bad lines are
+    reported by line number and skipped.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    match = (request.args.get("match") or "id").lower()
+    if match not in ("id", "name"):
+        return jsonify({"ok": False, "error": "match must be id or name"}), 400
 
-    sort_spec = None
-    if sort:
-        direction = -1 if sort.startswith("-") else 1
-        field = sort[1:] if sort.startswith("-") else sort
-        sort_spec = [(field, direction)]
+    report = ndjson.ImportReport()
+    for chunk in ndjson.chunked(ndjson.iter_lines(request.stream), Config.NDJSON_BATCH):
+        written = ndjson.upsert_chunk(db.employees, chunk, report, "name", match == "name",
+                                      _employee_fields, _new_employee,
+                                      derive=lambda doc: {"match_features": build_match_features(doc)})
+        for doc in written:
+            skill_index.add(doc)
+        text_index.index_employees(db, written)
+        search_index.index_employees(written)
+        if written:
+            versions.bump(db, versions.EMPLOYEES)
+    return jsonify({"ok": True, **report.as_dict()}), 200
+
+@employees_bp.route("/export", methods=["GET"])
+def export_employees():
+    """
+    Every employee as NDJSON (the /employees item shape, ?fields= to narrow
+    it) in _id order, streamed from a batched cursor.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    cur = db.employees.find({}, fieldsets.projection(fields, _LIST_PROJECTION)).sort("_id", 1)
+    lines = ndjson.export_lines(cur.batch_size(Config.NDJSON_BATCH), lambda d: fieldsets.pick(_public(d), fields),
+                                current_app.json.dumps)
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+@employees_bp.route("/available", methods=["GET"])
+def list_available_employees():
+    """
+    Employees free for the whole start..end window (YYYY-MM-DD, end defaults
+    to start), answered from the availability_spans index.
+    include_unknown=true also returns employees with no availability dates.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
 
-    cur = db.employees.find(query)
-    if sort_spec:
-        cur = cur.sort(sort_spec)
+    start = availability.day_ordinal(request.args.get("start"))
+    end = availability.day_ordinal(request.args.get("end")) if request.args.get("end") else start
+    if start is None or end is None:
+        return jsonify({"ok": False, "error": "start (and optional end) must be YYYY-MM-DD"}), 400
+    if end < start:
+        return jsonify({"ok": False, "error": "end must not be before start"}), 400
+    include_unknown = request.args.get("include_unknown", "false").lower() in ("1", "true", "yes")
+    page = int(request.args.get("page", "1") or "1")
+    limit = int(request.args.get("limit", "50") or "50")
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
-    total = db.employees.count_documents(query)
+    query = availability.available_query(start, end, include_unknown)
+    cur = db.employees.find(query, fieldsets.projection(fields, _LIST_PROJECTION)).sort([("name", 1)])
     cur = cur.skip(max(page - 1, 0) * max(limit, 1)).limit(max(limit, 1))
-    data = [_public(x) for x in cur]
-    return jsonify({"ok": True, "data": data, "pagination": {"page": page, "limit": limit, "total": total}}), 200
+    data = [fieldsets.pick(_public(x), fields) for x in cur]
+    return jsonify({"ok": True, "data": data, "pagination": {"page": page, "limit": limit}}), 200
 
 @employees_bp.route("/<id>", methods=["PUT", "PATCH"])
 def update_employee(id):
@@ -144,20 +388,14 @@ def update_employee(id):
         return jsonify({"ok": False, "error": "Invalid id"}), 400
 
     body = request.get_json(force=True, silent=True) or {}
-    body.pop("_id", None)
-    if "skills" in body:
-        body["skills"] = _coerce_skills(body.get("skills"))
-    if "availability_dates" in body:
-        body["availability_dates"] = _coerce_dates(body.get("availability_dates"))
-    if "cv_file_id" in body and isinstance(body["cv_file_id"], str):
-        try: body["cv_file_id"] = ObjectId(body["cv_file_id"])
-        except Exception: pass
-    body["updated_at"] = datetime.utcnow()
-
-    db.employees.update_one({"_id": oid}, {"$set": body})
-    doc = db.employees.find_one({"_id": oid})
+    doc = db.employees.find_one_and_update({"_id": oid}, {"$set": _employee_changes(body)},
+                                           return_document=ReturnDocument.AFTER)
     if doc is None:
-        return jsonify({"ok": False, "error": "Not found after update"}), 404
+        return jsonify({"ok": False, "error": "Not found"}), 404
+    skill_index.add(doc)
+    text_index.index_employee(db, doc)
+    search_index.index_employee(doc)
+    versions.bump(db, versions.EMPLOYEES)
     return jsonify({"ok": True, "employee": _public(doc)}), 200
 
 @employees_bp.route("/<id>", methods=["GET"])
@@ -168,10 +406,14 @@ def get_employee(id):
     oid = _oid(id)
     if oid is None:
         return jsonify({"ok": False, "error": "Invalid id"}), 400
-    doc = db.employees.find_one({"_id": oid})
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    doc = db.employees.find_one({"_id": oid}, fieldsets.projection(fields, _LIST_PROJECTION))
     if doc is None:
         return jsonify({"ok": False, "error": "Not found"}), 404
-    return jsonify({"ok": True, "employee": _public(doc)}), 200
+    return jsonify({"ok": True, "employee": fieldsets.pick(_public(doc), fields)}), 200
 
 @employees_bp.route("/<id>", methods=["DELETE"])
 def delete_employee(id):
@@ -184,4 +426,8 @@ def delete_employee(id):
     res = db.employees.delete_one({"_id": oid})
     if res.deleted_count == 0:
         return jsonify({"ok": False, "error": "Not found"}), 404
+    skill_index.remove(oid)
+    text_index.remove_employee(db, oid)
+    search_index.remove_employee(oid)
+    versions.bump(db, versions.EMPLOYEES)
     return jsonify({"ok": True, "deleted": id}), 200
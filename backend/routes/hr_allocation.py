@@ -1,9 +1,22 @@
 from flask import Blueprint, request, jsonify, current_app
 from bson import ObjectId
 from datetime import datetime
+from services import versions
+from services.hr_allocation import propose_allocation_plan
+from services import availability
+from utils import fieldsets
 
 hr_allocation_bp = Blueprint("hr_allocation", __name__)
 
+def ensure_indexes():
+    db = current_app.config.get("DB")
+    if db is None:
+        return
+    db.hr_allocations.create_index([("employee_id", 1), ("status", 1)])
+
+# response fields, selectable with ?fields=
+_FIELDS = ("id", "employee_id", "employee_name", "project_id", "project_name", "allocated_on", "status")
+
 def _public(doc):
     return {
         "id": str(doc["_id"]),
@@ -15,11 +28,38 @@ def _public(doc):
         "status": doc.get("status", "Active"),
     }
 
+def _oid(s):
+    try:
+        return ObjectId(str(s))
+    except Exception:
+        return None
+
+def _availability_conflict(db, emp, proj):
+    start, end = availability.project_window(proj)
+    if start is None:
+        return None
+
+    spans = [[x["s"], x["e"]] for x in emp.get("availability_spans") or []]
+    if not spans and emp.get("availability_dates"):
+        spans = availability.spans_from_dates(emp.get("availability_dates"))
+    if not availability.fits_window(spans, start, end):
+        return "Employee is not available for the whole project window"
+
+    active = list(db.hr_allocations.find({"employee_id": str(emp["_id"]), "status": "Active"}))
+    for a, window in zip(active, availability.allocation_windows(db, active)):
+        if availability.windows_overlap((start, end), window):
+            return f"Employee is already allocated to {a.get('project_name') or 'another project'} in that window"
+    return None
+
 @hr_allocation_bp.route("", methods=["GET"])
 def list_allocations():
     db = current_app.config["DB"]
-    cur = db.hr_allocations.find({}).sort("allocated_on", -1)
-    return jsonify({"ok": True, "data": [_public(x) for x in cur]})
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    cur = db.hr_allocations.find({}, fieldsets.projection(fields)).sort("allocated_on", -1)
+    return jsonify({"ok": True, "data": [fieldsets.pick(_public(x), fields) for x in cur]})
 
 @hr_allocation_bp.route("", methods=["POST"])
 def create_allocation():
@@ -35,20 +75,59 @@ def create_allocation():
     if not emp or not proj:
         return jsonify({"ok": False, "error": "Invalid employee or project"}), 400
 
+    # Availability / double-booking checks; {"force": true} overrides them.
+    if not body.get("force"):
+        conflict = _availability_conflict(db, emp, proj)
+        if conflict:
+            return jsonify({"ok": False, "error": conflict}), 409
+
     doc = {
         "employee_id": emp_id,
         "employee_name": emp.get("name"),
         "project_id": proj_id,
         "project_name": proj.get("project_name"),
+        "start_date": proj.get("start_date"),
+        "end_date": proj.get("end_date"),
         "allocated_on": datetime.utcnow(),
         "status": "Active",
     }
     res = db.hr_allocations.insert_one(doc)
     doc["_id"] = res.inserted_id
+    versions.bump(db, versions.ALLOCATIONS)
     return jsonify({"ok": True, "allocation": _public(doc)}), 201
 
 @hr_allocation_bp.route("/<id>", methods=["DELETE"])
 def delete_allocation(id):
     db = current_app.config["DB"]
     db.hr_allocations.delete_one({"_id": ObjectId(id)})
+    versions.bump(db, versions.ALLOCATIONS)
     return jsonify({"ok": True, "deleted": id})
+
+@hr_allocation_bp.route("/optimize", methods=["POST"])
+def optimize_allocations():
+    """
+    Propose a plan that staffs all Open projects at once (nothing is saved).
+    Body (optional): {"project_ids": [...], "candidates_per_slot": 5}
+    """
+    db = current_app.config["DB"]
+    body = request.get_json(force=True, silent=True) or {}
+
+    per_slot = body.get("candidates_per_slot")
+    if per_slot is not None:
+        try:
+            per_slot = int(per_slot)
+        except (TypeError, ValueError):
+            per_slot = 0
+        if per_slot < 1:
+            return jsonify({"ok": False, "error": "candidates_per_slot must be a positive integer"}), 400
+
+    project_ids = body.get("project_ids") or None
+    if project_ids is not None:
+        if not isinstance(project_ids, list):
+            return jsonify({"ok": False, "error": "project_ids must be a list"}), 400
+        project_ids = [_oid(x) for x in project_ids]
+        if None in project_ids:
+            return jsonify({"ok": False, "error": "Invalid project id"}), 400
+
+    plan = propose_allocation_plan(db, project_ids=project_ids, candidates_per_slot=per_slot)
+    return jsonify({"ok": True, "plan": plan})
@@ -1,6 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from bson import ObjectId
-from services.match import score_candidates, gemini_rerank
+from services.match import CandidatePool, score_candidates, gemini_rerank
+from services.skill_index import skill_index
+from services import search_index
+from services.match_cache import current_versions, match_cache, match_cache_key
+from services.llm_cache import llm_cache
+from services.gemini_client import gemini_client
+from services.rerank_prompt import prompt_stats
+from utils.responses import no_store
 
 match_bp = Blueprint("match", __name__)
 
@@ -52,21 +59,155 @@ def match_for_project():
 
     top_n = int(request.args.get("limit", "5"))
     use_ai = request.args.get("use_ai", "false").lower() in ("1", "true", "yes")
+    # skip employees whose availability can't cover the project's start..end
+    available_only = request.args.get("available_only", "false").lower() in ("1", "true", "yes")
 
-    ranked = score_candidates(db, proj)
-    ranked.sort(key=lambda x: x.get("_base_score", 0), reverse=True)
+    key = match_cache_key(db, proj, (top_n, use_ai, available_only))
+    payload = match_cache.get(key)
+    if payload is None:
+        ranked = score_candidates(db, proj, top_k=_keep(top_n, use_ai), available_only=available_only)
+        top = _top_candidates(proj, ranked, top_n, use_ai, db)
+        payload = {
+            "ok": True,
+            "project": _project_public(proj),
+            "candidates": [_cand_public(x) for x in top],
+        }
+        if _cacheable(top):
+            match_cache.put(key, payload)
+        else:
+            no_store()
 
+    return jsonify(payload), 200
+
+def _keep(top_n, use_ai):
+    # the AI rerank looks at up to 15 candidates, so keep that many when it's on
+    return max(top_n, 15) if use_ai else top_n
+
+def _cacheable(top):
+    # a Gemini failure / timeout is retried on the next request, not cached for the TTL
+    return not any(x.get("_rerank_fallback") for x in top)
+
+def _top_candidates(proj, ranked, top_n, use_ai, db=None):
+    """`ranked` is already best-first (see CandidatePool.top)."""
     if use_ai and len(ranked) > 1:
-        ranked = gemini_rerank(proj, ranked, top_k=min(15, len(ranked)))
+        ranked = gemini_rerank(proj, ranked, top_k=min(15, len(ranked)), db=db)
 
     top = ranked[:top_n]
     if top:
         max_s = max((x.get("_base_score") or 0) for x in top) or 1e-9
         for x in top:
             x["score"] = round((float(x.get("_base_score") or 0) / max_s) * 100.0, 2)
+    return top
+
+@match_bp.route("/batch", methods=["POST"])
+def match_batch():
+    """
+    Top-N candidates for many projects in one pass.
+    Body: {"project_ids": [..] | "all_open", "limit": 5, "use_ai": false, "available_only": false}
+    The employee set is loaded (and encoded) once; the response is NDJSON with
+    one {"project", "candidates"} line per project, streamed as it is scored.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+
+    body = request.get_json(force=True, silent=True) or {}
+    ids = body.get("project_ids")
+    if ids == "all_open" or body.get("all_open"):
+        query = {"status": "Open"}
+    elif isinstance(ids, list) and ids:
+        oids = []
+        for x in ids:
+            try:
+                oids.append(ObjectId(str(x)))
+            except Exception:
+                return jsonify({"ok": False, "error": f"Invalid project id: {x}"}), 400
+        query = {"_id": {"$in": oids}}
+    else:
+        return jsonify({"ok": False, "error": "project_ids (list or \"all_open\") is required"}), 400
+
+    top_n = int(body.get("limit") or request.args.get("limit", "5"))
+    use_ai = str(body.get("use_ai", request.args.get("use_ai", "false"))).lower() in ("1", "true", "yes")
+    available_only = str(body.get("available_only", request.args.get("available_only", "false"))).lower() in ("1", "true", "yes")
+
+    projects = list(db.projects.find(query))
+    versions = current_versions(db)
+    options = (top_n, use_ai, available_only)
+    keys = {p["_id"]: match_cache_key(db, p, options, versions) for p in projects}
+    cached = {pid: match_cache.get(k) for pid, k in keys.items()}
+    todo = [p for p in projects if cached[p["_id"]] is None]
+    pool = CandidatePool.load(db, todo) if todo else None
+    keep = _keep(top_n, use_ai)
+
+    def generate():
+        for proj in projects:
+            payload = cached[proj["_id"]]
+            if payload is None:
+                exclude = pool.unavailable_for(proj, available_only)
+                ranked = pool.materialize(pool.top(proj, keep, exclude=exclude))
+                top = _top_candidates(proj, ranked, top_n, use_ai, db)
+                payload = {
+                    "ok": True,
+                    "project": _project_public(proj),
+                    "candidates": [_cand_public(x) for x in top],
+                }
+                if _cacheable(top):
+                    match_cache.put(keys[proj["_id"]], payload)
+            line = {"project": payload["project"], "candidates": payload["candidates"]}
+            yield current_app.json.dumps(line) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    if use_ai:
+        # the headers go out before the lines are ranked, so any of them may be a fallback
+        no_store()
+    return response
 
-    return jsonify({
-        "ok": True,
-        "project": _project_public(proj),
-        "candidates": [_cand_public(x) for x in top],
-    }), 200
+@match_bp.route("/index/rebuild", methods=["POST"])
+def rebuild_skill_index():
+    """
+    Reload the in-process skill -> employee index (and the name / project
+    search index) from Mongo.
+    Use this when the index has drifted (bulk edits made directly in the
+    database, or writes served by another worker process).
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    skill_index.rebuild(db)
+    if search_index.enabled():
+        search_index.rebuild(db)
+    match_cache.clear()
+    return jsonify({"ok": True, "index": skill_index.stats(), "search": search_index.stats()}), 200
+
+@match_bp.route("/cache/stats", methods=["GET"])
+def match_cache_stats():
+    """Hit/miss counters of this worker's /match result cache."""
+    return jsonify({"ok": True, "cache": match_cache.stats()}), 200
+
+@match_bp.route("/ai/stats", methods=["GET"])
+def ai_stats():
+    """Gemini client counters / circuit state and recent rerank prompt sizes."""
+    return jsonify({"ok": True, "gemini": gemini_client.stats(), "rerank_prompt": prompt_stats()}), 200
+
+@match_bp.route("/llm_cache/stats", methods=["GET"])
+def llm_cache_stats():
+    """Gemini response cache: this worker's hit/miss counters + stored entries per kind."""
+    db = current_app.config.get("DB")
+    return jsonify({"ok": True, "llm_cache": llm_cache.stats(db)}), 200
+
+@match_bp.route("/llm_cache", methods=["DELETE"])
+def llm_cache_invalidate():
+    """
+    Drop cached Gemini responses. ?kind=extract|rerank limits it to one call
+    site, ?below_version=N to entries made with an older prompt version.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    below = request.args.get("below_version")
+    try:
+        below = int(below) if below is not None else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "below_version must be an integer"}), 400
+    n = llm_cache.invalidate(db, kind=request.args.get("kind"), below_version=below)
+    return jsonify({"ok": True, "deleted": n}), 200
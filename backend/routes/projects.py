@@ -1,7 +1,16 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from datetime import datetime
 from bson import ObjectId
 from typing import Any, Dict, List, Optional
+from services import versions
+from services import search_index
+from config import Config
+from utils import pagination
+from utils import ndjson
+from utils import fieldsets
+from utils import bulk
+from pymongo import ReturnDocument, UpdateOne
+import re
 
 projects_bp = Blueprint("projects", __name__)
 
@@ -15,12 +24,20 @@ def _coerce_skills(value: Any) -> List[str]:
         return [s.strip() for s in value.split(",") if s.strip()]
     return []
 
+def _skill_keys(skills: List[str]) -> List[str]:
+    """Normalized copy of required_skills for exact, indexed skill filters."""
+    return list(dict.fromkeys(s.lower() for s in skills))
+
 def _oid(s: str) -> Optional[ObjectId]:
     try:
         return ObjectId(str(s))
     except Exception:
         return None
 
+# response fields, selectable with ?fields=
+_FIELDS = ("id", "project_name", "required_skills", "description", "priority", "status", "start_date", "end_date",
+           "duration", "headcount", "created_at", "updated_at")
+
 def _public(doc: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "id": str(doc["_id"]),
@@ -37,16 +54,84 @@ def _public(doc: Dict[str, Any]) -> Dict[str, Any]:
         "updated_at": doc.get("updated_at"),
     }
 
+def _project_fields(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized copies of the writable project fields present in `body`."""
+    out: Dict[str, Any] = {}
+    if "project_name" in body:
+        out["project_name"] = (body.get("project_name") or "").strip() or None
+    if "required_skills" in body:
+        out["required_skills"] = _coerce_skills(body.get("required_skills"))
+        out["required_skills_norm"] = _skill_keys(out["required_skills"])
+    if "description" in body:
+        out["description"] = (body.get("description") or "").strip() or None
+    if "priority" in body:
+        out["priority"] = body.get("priority") or "Medium"
+    if "status" in body:
+        out["status"] = body.get("status") or "Open"
+    if "start_date" in body:
+        out["start_date"] = (body.get("start_date") or "").strip() or None
+    if "end_date" in body:
+        out["end_date"] = (body.get("end_date") or "").strip() or None
+    if "duration" in body:
+        out["duration"] = (body.get("duration") or "").strip() or None
+    if "headcount" in body:
+        try:
+            out["headcount"] = int(body.get("headcount"))
+        except Exception:
+            out["headcount"] = None
+    return out
+
+def _project_changes(body: Dict[str, Any]) -> Dict[str, Any]:
+    """$set for a PATCH body."""
+    return {**_project_fields(body), "updated_at": datetime.utcnow()}
+
+def _new_project(fields: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    doc = {
+        "project_name": None,
+        "required_skills": [],
+        "description": None,
+        "priority": "Medium",
+        "status": "Open",
+        "start_date": None,   # expect "YYYY-MM-DD"
+        "end_date": None,
+        "duration": None,
+        "headcount": None,
+        **fields,
+        "created_at": now,
+        "updated_at": now,
+    }
+    doc["headcount"] = doc["headcount"] or None
+    doc["required_skills_norm"] = _skill_keys(doc["required_skills"])
+    return doc
+
 def ensure_indexes():
     db = current_app.config.get("DB")
     if db is None:
         return
     db.projects.create_index([("project_name", 1)])
     db.projects.create_index("required_skills")
+    db.projects.create_index("required_skills_norm")
     db.projects.create_index("status")
     db.projects.create_index("priority")
     db.projects.create_index("start_date")
     db.projects.create_index("end_date")
+    for field in _SORTS[:-1]:
+        db.projects.create_index([(field, 1), ("_id", 1)])
+    # projects written before required_skills_norm existed
+    ops: List[UpdateOne] = []
+    for doc in db.projects.find({"required_skills_norm": {"$exists": False}}, {"required_skills": 1}).batch_size(500):
+        ops.append(UpdateOne({"_id": doc["_id"]},
+                             {"$set": {"required_skills_norm": _skill_keys(doc.get("required_skills") or [])}}))
+        if len(ops) >= 500:
+            db.projects.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        db.projects.bulk_write(ops, ordered=False)
+
+# the only sorts the list endpoint accepts: each has a (field, _id) index, so an
+# unfiltered sorted page never needs an in-memory sort (filter + sort shapes
+# that do are what services.query_profile's index advisor reports)
+_SORTS = ("created_at", "project_name", "start_date", "end_date", "_id")
 
 # ---------- Routes ----------
 @projects_bp.route("", methods=["POST"])
@@ -56,29 +141,25 @@ def create_project():
         return jsonify({"ok": False, "error": "DB not connected"}), 500
 
     body = request.get_json(force=True, silent=True) or {}
-    name = (body.get("project_name") or "").strip()
-    if not name:
+    fields = _project_fields(body)
+    if not fields.get("project_name"):
         return jsonify({"ok": False, "error": "project_name is required"}), 400
-
-    doc = {
-        "project_name": name,
-        "required_skills": _coerce_skills(body.get("required_skills")),
-        "description": (body.get("description") or "").strip() or None,
-        "priority": (body.get("priority") or "Medium"),
-        "status": (body.get("status") or "Open"),
-        "start_date": (body.get("start_date") or "").strip() or None,  # expect "YYYY-MM-DD"
-        "end_date": (body.get("end_date") or "").strip() or None,
-        "duration": (body.get("duration") or "").strip() or None,
-        "headcount": int(body.get("headcount") or 0) or None,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
-    }
+    doc = _new_project(fields, datetime.utcnow())
     res = db.projects.insert_one(doc)
     doc["_id"] = res.inserted_id
+    search_index.index_project(doc)
+    versions.bump(db, versions.PROJECTS)
     return jsonify({"ok": True, "project": _public(doc)}), 201
 
 @projects_bp.route("", methods=["GET"])
 def list_projects():
+    """
+    Filtered project list (newest first by default). `q` searches name and
+    description (best matches first unless a sort is given), `skill` is an
+    exact, case-insensitive required skill. Page with `after` (the
+    `pagination.next` token of the previous response) or page/limit;
+    count=exact|cached|estimated|none as for /employees.
+    """
     db = current_app.config.get("DB")
     if db is None:
         return jsonify({"ok": False, "error": "DB not connected"}), 500
@@ -88,32 +169,146 @@ def list_projects():
     skill = request.args.get("skill")
     status = request.args.get("status")
     page = int(request.args.get("page", "1") or "1")
-    limit = int(request.args.get("limit", "50") or "50")
-    sort = (request.args.get("sort") or "-created_at").strip()
+    limit = max(int(request.args.get("limit", "50") or "50"), 1)
+    sort = (request.args.get("sort") or "").strip()
+    after = request.args.get("after")
+    count_mode = (request.args.get("count") or ("none" if after is not None else "cached")).lower()
+    if count_mode not in pagination.COUNT_MODES:
+        return jsonify({"ok": False, "error": f"count must be one of {', '.join(pagination.COUNT_MODES)}"}), 400
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
     query: Dict[str, Any] = {}
-    if q:
-        query["$or"] = [
-            {"project_name": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-        ]
-    if skill:
-        query["required_skills"] = {"$regex": skill, "$options": "i"}
+    if skill and skill.strip():
+        query["required_skills_norm"] = skill.strip().lower()
     if status and status in ("Open", "Closed"):
         query["status"] = status
 
-    sort_spec = [("created_at", -1)]
-    if sort:
-        direction = -1 if sort.startswith("-") else 1
-        field = sort[1:] if sort.startswith("-") else sort
-        sort_spec = [(field, direction)]
+    field, direction = pagination.parse_sort("" if sort == "relevance" else sort, ("created_at", -1))
+    if field not in _SORTS:
+        return jsonify({"ok": False, "error": f"sort must be one of {', '.join(_SORTS)} (prefix - to reverse)"}), 400
+    # the sort field is loaded even when not requested: the `after` token needs it
+    projection = fieldsets.projection(fields, also=[field])
+
+    if q:
+        ranked = search_index.search_projects(db, q) if search_index.enabled() else None
+        if ranked is not None and sort in ("", "relevance"):
+            if after is not None:
+                return jsonify({"ok": False, "error": "'after' can't page a relevance search; use page or a sort"}), 400
+            rows, total = search_index.relevance_page(db.projects, query, ranked, max(page - 1, 0) * limit, limit,
+                                                      projection)
+            return jsonify({"ok": True, "data": [{**fieldsets.pick(_public(x), fields), "score": x["_score"]}
+                                                 for x in rows],
+                            "pagination": {"page": page, "limit": limit, "count": "exact", "total": total,
+                                           "next": None, "order": "relevance"}}), 200
+        if ranked is not None and len(ranked) <= Config.SEARCH_MAX_IDS:
+            query["_id"] = {"$in": [i for i, _ in ranked]}
+        else:
+            pattern = re.escape(q)
+            query["$or"] = [
+                {"project_name": {"$regex": pattern, "$options": "i"}},
+                {"description": {"$regex": pattern, "$options": "i"}},
+            ]
+
+    after_filter = None
+    if after:
+        try:
+            after_filter = pagination.keyset_filter(field, direction, *pagination.decode_cursor(after, field, direction))
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+    cur = db.projects.find(pagination.with_filter(query, after_filter), projection).sort(pagination.sort_spec(field, direction))
+    if after is None:
+        cur = cur.skip(max(page - 1, 0) * limit)
+    rows, more = pagination.page_rows(cur.limit(limit + 1), limit)
+
+    version = versions.get_versions(db, [versions.PROJECTS])[versions.PROJECTS] if count_mode in ("cached", "estimated") else 0
+    meta: Dict[str, Any] = {"limit": limit, "count": count_mode,
+                            "next": pagination.encode_cursor(field, direction, rows[-1]) if more else None}
+    if after is None:
+        meta["page"] = page
+    total = pagination.count_total(db.projects, query, count_mode, version)
+    if total is not None:
+        meta["total"] = total
+    return jsonify({"ok": True, "data": [fieldsets.pick(_public(x), fields) for x in rows], "pagination": meta}), 200
 
-    cur = db.projects.find(query).sort(sort_spec)
-    total = db.projects.count_documents(query)
-    cur = cur.skip(max(page - 1, 0) * max(limit, 1)).limit(max(limit, 1))
+@projects_bp.route("", methods=["PATCH"])
+def patch_projects():
+    """
+    Bulk update: a list of {"id": ..., "changes": {...}} (or {"items": [...]}),
+    each applied like PATCH /projects/<id>, all in one bulk_write. Returns a
+    result per item, in order: {"id", "ok": true, "project"} or
+    {"id", "ok": false, "error"}; ?fields= narrows the returned projects.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    items = bulk.parse_items(request.get_json(force=True, silent=True))
+    if items is None:
+        return jsonify({"ok": False, "error": "body must be a list of {id, changes}"}), 400
+    if len(items) > Config.BULK_PATCH_MAX_ITEMS:
+        return jsonify({"ok": False, "error": f"at most {Config.BULK_PATCH_MAX_ITEMS} items per request"}), 413
 
-    data = [_public(x) for x in cur]
-    return jsonify({"ok": True, "data": data, "pagination": {"page": page, "limit": limit, "total": total}}), 200
+    results, written = bulk.apply_patches(db.projects, items, _project_changes)
+    for doc in written:
+        search_index.index_project(doc)
+    if written:
+        versions.bump(db, versions.PROJECTS)
+    for r in results:
+        if "doc" in r:
+            r["project"] = fieldsets.pick(_public(r.pop("doc")), fields)
+    return jsonify({"ok": True, "updated": len(written), "failed": len(results) - len(written),
+                    "results": results}), 200
+
+@projects_bp.route("/import", methods=["POST"])
+def import_projects():
+    """
+    Bulk create / update from an NDJSON body, one project object per line,
+    normalized like POST /projects. "id" updates that project (only the
+    fields the line carries), ?match=project_name matches lines without "id"
+    by exact name, anything else creates a project. One bulk_write per
+    NDJSON_BATCH lines; bad lines are reported by line number and skipped.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    match = (request.args.get("match") or "id").lower()
+    if match not in ("id", "project_name"):
+        return jsonify({"ok": False, "error": "match must be id or project_name"}), 400
+
+    report = ndjson.ImportReport()
+    for chunk in ndjson.chunked(ndjson.iter_lines(request.stream), Config.NDJSON_BATCH):
+        written = ndjson.upsert_chunk(db.projects, chunk, report, "project_name", match == "project_name",
+                                      _project_fields, _new_project)
+        for doc in written:
+            search_index.index_project(doc)
+        if written:
+            versions.bump(db, versions.PROJECTS)
+    return jsonify({"ok": True, **report.as_dict()}), 200
+
+@projects_bp.route("/export", methods=["GET"])
+def export_projects():
+    """
+    Every project as NDJSON (the /projects item shape, ?fields= to narrow it)
+    in _id order, streamed from a batched cursor.
+    """
+    db = current_app.config.get("DB")
+    if db is None:
+        return jsonify({"ok": False, "error": "DB not connected"}), 500
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    cur = db.projects.find({}, fieldsets.projection(fields)).sort("_id", 1)
+    lines = ndjson.export_lines(cur.batch_size(Config.NDJSON_BATCH), lambda d: fieldsets.pick(_public(d), fields),
+                                current_app.json.dumps)
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
 
 @projects_bp.route("/<id>", methods=["GET"])
 def get_project(id):
@@ -123,10 +318,14 @@ def get_project(id):
     oid = _oid(id)
     if oid is None:
         return jsonify({"ok": False, "error": "Invalid id"}), 400
-    doc = db.projects.find_one({"_id": oid})
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), _FIELDS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    doc = db.projects.find_one({"_id": oid}, fieldsets.projection(fields))
     if not doc:
         return jsonify({"ok": False, "error": "Not found"}), 404
-    return jsonify({"ok": True, "project": _public(doc)}), 200
+    return jsonify({"ok": True, "project": fieldsets.pick(_public(doc), fields)}), 200
 
 @projects_bp.route("/<id>", methods=["PUT", "PATCH"])
 def update_project(id):
@@ -140,35 +339,12 @@ def update_project(id):
     body = request.get_json(force=True, silent=True) or {}
     body.pop("_id", None)
 
-    update: Dict[str, Any] = {}
-    if "project_name" in body:
-        update["project_name"] = (body.get("project_name") or "").strip() or None
-    if "required_skills" in body:
-        update["required_skills"] = _coerce_skills(body.get("required_skills"))
-    if "description" in body:
-        update["description"] = (body.get("description") or "").strip() or None
-    if "priority" in body:
-        update["priority"] = body.get("priority") or "Medium"
-    if "status" in body:
-        update["status"] = body.get("status") or "Open"
-    if "start_date" in body:
-        update["start_date"] = (body.get("start_date") or "").strip() or None
-    if "end_date" in body:
-        update["end_date"] = (body.get("end_date") or "").strip() or None
-    if "duration" in body:
-        update["duration"] = (body.get("duration") or "").strip() or None
-    if "headcount" in body:
-        try:
-            update["headcount"] = int(body.get("headcount"))
-        except Exception:
-            update["headcount"] = None
-
-    update["updated_at"] = datetime.utcnow()
-
-    db.projects.update_one({"_id": oid}, {"$set": update})
-    doc = db.projects.find_one({"_id": oid})
+    doc = db.projects.find_one_and_update({"_id": oid}, {"$set": _project_changes(body)},
+                                          return_document=ReturnDocument.AFTER)
     if not doc:
-        return jsonify({"ok": False, "error": "Not found after update"}), 404
+        return jsonify({"ok": False, "error": "Not found"}), 404
+    search_index.index_project(doc)
+    versions.bump(db, versions.PROJECTS)
     return jsonify({"ok": True, "project": _public(doc)}), 200
 
 @projects_bp.route("/<id>", methods=["DELETE"])
@@ -182,4 +358,6 @@ def delete_project(id):
     res = db.projects.delete_one({"_id": oid})
     if res.deleted_count == 0:
         return jsonify({"ok": False, "error": "Not found"}), 404
+    search_index.remove_project(oid)
+    versions.bump(db, versions.PROJECTS)
     return jsonify({"ok": True, "deleted": id}), 200
@@ -0,0 +1,120 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from bisect import bisect_right
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+
+# ------------------ Availability Calendar ------------------
+#
+# availability_dates (sorted ISO strings) are collapsed into runs of
+# consecutive days, stored on the employee as
+#     availability_spans: [{"s": first_day, "e": last_day}, ...]
+# with day ordinals (date.toordinal()). The compound multikey index on
+# (availability_spans.s, availability_spans.e) lets Mongo answer "who is free
+# for the whole start..end window" with one $elemMatch, and the same spans are
+# copied into match_features so the scorer / optimizer can check a window
+# without touching the date strings.
+#
+# An employee with no availability data is "unknown": range queries only
+# return them with include_unknown, and the match / allocation filters let
+# them through.
+
+def day_ordinal(s: Any) -> Optional[int]:
+    if not s:
+        return None
+    try:
+        y, m, d = map(int, str(s).split("T", 1)[0].split("-"))
+        return datetime(y, m, d).date().toordinal()
+    except Exception:
+        return None
+
+def to_spans(days: Iterable[int]) -> List[List[int]]:
+    """Merge day ordinals into sorted [first, last] runs of consecutive days."""
+    spans: List[List[int]] = []
+    for d in sorted(set(days)):
+        if spans and d == spans[-1][1] + 1:
+            spans[-1][1] = d
+        else:
+            spans.append([d, d])
+    return spans
+
+def spans_from_dates(dates: Iterable[Any]) -> List[List[int]]:
+    return to_spans(d for d in (day_ordinal(x) for x in dates or []) if d is not None)
+
+def availability_spans_field(dates: Iterable[Any]) -> List[Dict[str, int]]:
+    """Value stored in employees.availability_spans."""
+    return [{"s": s, "e": e} for s, e in spans_from_dates(dates)]
+
+def covers(spans: List[List[int]], start: int, end: Optional[int] = None) -> bool:
+    """True when one run of available days contains the whole start..end window."""
+    if end is None or end < start:
+        end = start
+    i = bisect_right(spans, [start, float("inf")]) - 1
+    return i >= 0 and spans[i][0] <= start and spans[i][1] >= end
+
+def project_window(project: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    start = day_ordinal(project.get("start_date"))
+    end = day_ordinal(project.get("end_date"))
+    if start is None:
+        return None, None
+    return start, (end if end is not None and end >= start else start)
+
+def windows_overlap(a: Tuple[Optional[int], Optional[int]], b: Tuple[Optional[int], Optional[int]]) -> bool:
+    """Two project_window()s share a day (an unknown window overlaps nothing)."""
+    if a[0] is None or b[0] is None:
+        return False
+    return a[0] <= b[1] and b[0] <= a[1]
+
+def allocation_windows(db, allocations: List[Dict[str, Any]]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """Window of each allocation: its own dates, else (made before they were stored) its project's."""
+    legacy = {str(a.get("project_id")) for a in allocations if not a.get("start_date")}
+    oids = [ObjectId(x) for x in legacy if ObjectId.is_valid(x)]
+    projects = {str(p["_id"]): p for p in db.projects.find({"_id": {"$in": oids}}, {"start_date": 1, "end_date": 1})} \
+        if oids else {}
+    return [project_window(a if a.get("start_date") else projects.get(str(a.get("project_id")), {}))
+            for a in allocations]
+
+def fits_window(spans: List[List[int]], start: Optional[int], end: Optional[int]) -> bool:
+    """Unknown availability (no spans) or no window counts as a fit."""
+    if start is None or not spans:
+        return True
+    return covers(spans, start, end)
+
+def unavailable_ids(employees: List[Dict[str, Any]], start: Optional[int], end: Optional[int]) -> Set[Any]:
+    """Ids of employees (with match_features loaded) whose known availability misses the window."""
+    if start is None:
+        return set()
+    return {
+        e["_id"] for e in employees
+        if not fits_window(e["match_features"]["avail_spans"], start, end)
+    }
+
+def available_query(start: int, end: int, include_unknown: bool = False) -> Dict[str, Any]:
+    """Mongo filter for employees free for the whole window (index-backed)."""
+    covered = {"availability_spans": {"$elemMatch": {"s": {"$lte": start}, "e": {"$gte": end}}}}
+    if not include_unknown:
+        return covered
+    return {"$or": [
+        covered,
+        {"availability_spans": {"$exists": False}},
+        {"availability_spans": {"$size": 0}},
+    ]}
+
+def ensure_indexes(db) -> None:
+    db.employees.create_index([("availability_spans.s", 1), ("availability_spans.e", 1)])
+
+def backfill_availability_spans(db, batch_size: int = 500) -> int:
+    """(Re)compute employees.availability_spans from availability_dates. Returns the number updated."""
+    ops: List[UpdateOne] = []
+    updated = 0
+    for doc in db.employees.find({}, {"availability_dates": 1}).batch_size(batch_size):
+        ops.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"availability_spans": availability_spans_field(doc.get("availability_dates"))}},
+        ))
+        if len(ops) >= batch_size:
+            updated += db.employees.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += db.employees.bulk_write(ops, ordered=False).modified_count
+    return updated
@@ -0,0 +1,192 @@
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from threading import BoundedSemaphore, Lock
+import time
+
+from config import Config
+
+# ------------------ Gemini Client Layer ------------------
+#
+# One long-lived model object per process instead of genai.configure() +
+# GenerativeModel() on every request, and every call goes through:
+#   * a concurrency limit (GEMINI_MAX_CONCURRENCY in-flight calls; a caller
+#     that can't get a slot before its deadline gets GeminiUnavailable),
+#   * a per-call deadline: the request thread waits at most `timeout`
+#     seconds; the upstream call keeps its slot until it really returns, so
+#     a hanging upstream can't pile up more than the limit,
+#   * a circuit breaker: after GEMINI_BREAKER_FAILURES consecutive failures
+#     or timeouts Gemini is skipped for GEMINI_BREAKER_COOLDOWN_S, then one
+#     trial call decides whether it closes again.
+# Callers catch GeminiUnavailable (or any error) and use their heuristic.
+#
+# For local runs and tests, GEMINI_FAKE=true (or use_model_factory) swaps in
+# FakeModel, which needs neither network nor API key.
+
+class GeminiUnavailable(Exception):
+    """Gemini was skipped (disabled, circuit open, busy) or didn't answer in time."""
+
+class FakeModel:
+    """
+    Stand-in for genai.GenerativeModel. `handler(prompt) -> str` produces the
+    response text (default: empty, so callers fall back); `delay` seconds of
+    sleep and `fail=True` simulate a slow / broken upstream.
+    """
+
+    class _Response:
+        def __init__(self, text: str):
+            self.text = text
+
+    def __init__(self, handler: Optional[Callable[[str], str]] = None, delay: float = 0.0, fail: bool = False):
+        self.handler = handler
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def generate_content(self, prompt: str):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("fake model failure")
+        return self._Response(self.handler(prompt) if self.handler else "")
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_s: float):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.cooldown_s = cooldown_s
+        self._lock = Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_s or self._trial_in_flight:
+                return False
+            # half-open: let exactly one call through
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def cancel_trial(self) -> None:
+        """The call allowed by allow() never reached the upstream."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.cooldown_s:
+                return "open"
+            return "half-open"
+
+    def reset(self) -> None:
+        self.record_success()
+
+def _genai_model_factory():
+    import google.generativeai as genai
+    genai.configure(api_key=Config.GEMINI_API_KEY)
+    return genai.GenerativeModel(Config.GEMINI_MODEL)
+
+class GeminiClient:
+    def __init__(self, max_concurrency: int, breaker: CircuitBreaker,
+                 model_factory: Optional[Callable[[], Any]] = None):
+        self._factory = model_factory
+        self._model = None
+        self._model_lock = Lock()
+        self._max_concurrency = max(int(max_concurrency), 1)
+        self._slots = BoundedSemaphore(self._max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix="gemini")
+        self.breaker = breaker
+        self._counts = {"calls": 0, "ok": 0, "errors": 0, "timeouts": 0, "busy": 0, "short_circuited": 0}
+        self._counts_lock = Lock()
+
+    def use_model_factory(self, factory: Optional[Callable[[], Any]]) -> None:
+        """Swap the model (e.g. lambda: FakeModel(...)); None goes back to the real one."""
+        with self._model_lock:
+            self._factory = factory
+            self._model = None
+        self.breaker.reset()
+
+    def enabled(self) -> bool:
+        if self._factory is not None:
+            return True
+        return bool(Config.GEMINI_API_KEY) and not Config.SKIP_GEMINI
+
+    def model_name(self) -> str:
+        """Model identity for cache keys; fake models never share entries with the real one."""
+        return Config.GEMINI_MODEL if self._factory is None else "fake"
+
+    def _get_model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = (self._factory or _genai_model_factory)()
+        return self._model
+
+    def _count(self, key: str) -> None:
+        with self._counts_lock:
+            self._counts[key] += 1
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        """Response text for `prompt`, or GeminiUnavailable within `timeout` seconds."""
+        if not self.enabled():
+            raise GeminiUnavailable("disabled")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise GeminiUnavailable("circuit open")
+
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=max(timeout, 0)):
+            self._count("busy")
+            # not the upstream's fault: no failure recorded
+            self.breaker.cancel_trial()
+            raise GeminiUnavailable("busy")
+        self._count("calls")
+        try:
+            fut = self._pool.submit(lambda: self._get_model().generate_content(prompt))
+        except Exception:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            out = fut.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            self._count("timeouts")
+            self.breaker.record_failure()
+            raise GeminiUnavailable(f"no answer within {timeout:g}s")
+        except Exception:
+            self._count("errors")
+            self.breaker.record_failure()
+            raise
+        self._count("ok")
+        self.breaker.record_success()
+        return (getattr(out, "text", "") or "").strip()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return {"enabled": self.enabled(), "circuit": self.breaker.state(),
+                "max_concurrency": self._max_concurrency, **counts}
+
+gemini_client = GeminiClient(
+    max_concurrency=Config.GEMINI_MAX_CONCURRENCY,
+    breaker=CircuitBreaker(Config.GEMINI_BREAKER_FAILURES, Config.GEMINI_BREAKER_COOLDOWN_S),
+    model_factory=(lambda: FakeModel(delay=Config.GEMINI_FAKE_DELAY_S)) if Config.GEMINI_FAKE else None,
+)
@@ -0,0 +1,255 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+import heapq
+import time
+
+from bson import ObjectId
+from config import Config
+from services.match import CandidatePool
+from services.availability import allocation_windows, project_window, unavailable_ids, windows_overlap
+
+# ------------------ Global Allocation Optimizer ------------------
+#
+# Assigns employees to every Open project at once instead of picking the best
+# /match candidate project by project. The problem is a min-cost flow:
+#
+#   source --(remaining headcount)--> project --(1, -score)--> employee --(1)--> sink
+#
+# where `score` is the regular match score (services.match) and only
+# employees who can cover the project window (services.availability) and
+# have no Active allocation overlapping it (the check create_allocation makes)
+# get an edge. To keep the graph small each project only gets edges to its
+# best `headcount * ALLOCATION_CANDIDATES_PER_SLOT` eligible candidates,
+# which leaves plenty of room for the flow to trade employees between
+# projects while keeping 5k x 300 well under a few seconds.
+#
+# Costs are integers (score * 1000) so the solver is exact.
+
+_SCALE = 1000
+
+class _MinCostFlow:
+    """Successive shortest paths with Dijkstra on reduced costs (Johnson potentials)."""
+
+    def __init__(self, n: int):
+        self.n = n
+        # edge: [to, cap, cost, index of reverse edge in graph[to]]
+        self.graph: List[List[List[int]]] = [[] for _ in range(n)]
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> List[int]:
+        fwd = [v, cap, cost, len(self.graph[v])]
+        self.graph[u].append(fwd)
+        self.graph[v].append([u, 0, -cost, len(self.graph[u]) - 1])
+        return fwd
+
+    def _initial_potentials(self, s: int) -> List[float]:
+        # Bellman-Ford (queue based); the graph is a DAG so this is one sweep in practice
+        inf = float("inf")
+        pot = [inf] * self.n
+        pot[s] = 0
+        queue = deque([s])
+        in_queue = [False] * self.n
+        in_queue[s] = True
+        while queue:
+            u = queue.popleft()
+            in_queue[u] = False
+            for v, cap, cost, _ in self.graph[u]:
+                if cap > 0 and pot[u] + cost < pot[v]:
+                    pot[v] = pot[u] + cost
+                    if not in_queue[v]:
+                        queue.append(v)
+                        in_queue[v] = True
+        return [p if p < inf else 0 for p in pot]
+
+    def run(self, s: int, t: int) -> Tuple[int, int]:
+        """
+        Push flow while it lowers the total cost. Returns (flow, cost).
+        Each phase runs one Dijkstra (stopped once t is settled), then pushes
+        as many augmenting paths as fit through the zero-reduced-cost edges
+        before recomputing distances.
+        """
+        inf = float("inf")
+        graph = self.graph
+        pot = self._initial_potentials(s)
+        flow = cost = 0
+        while True:
+            dist = [inf] * self.n
+            dist[s] = 0
+            heap = [(0, s)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if u == t:
+                    break
+                pu = pot[u]
+                for v, cap, c, _ in graph[u]:
+                    if cap > 0:
+                        nd = d + c + pu - pot[v]
+                        if nd < dist[v]:
+                            dist[v] = nd
+                            heapq.heappush(heap, (nd, v))
+            dt = dist[t]
+            if dt == inf:
+                break
+            for v in range(self.n):
+                pot[v] += dist[v] if dist[v] < dt else dt
+            path_cost = pot[t] - pot[s]
+            if path_cost >= 0:
+                break
+
+            pushed = self._augment_admissible(s, t, pot)
+            if not pushed:
+                break
+            flow += pushed
+            cost += pushed * path_cost
+        return flow, cost
+
+    def _augment_admissible(self, s: int, t: int, pot: List[float]) -> int:
+        """Unit-bottleneck DFS augmentations over edges with zero reduced cost."""
+        graph = self.graph
+        dead = [False] * self.n
+        nxt = [0] * self.n
+        pushed = 0
+        while True:
+            on_path = [False] * self.n
+            on_path[s] = True
+            stack: List[Tuple[int, int]] = []   # (node, edge index taken)
+            u = s
+            while u != t:
+                adj = graph[u]
+                moved = False
+                while nxt[u] < len(adj):
+                    v, cap, c, _ = adj[nxt[u]]
+                    if cap > 0 and not dead[v] and not on_path[v] and c + pot[u] - pot[v] == 0:
+                        stack.append((u, nxt[u]))
+                        on_path[v] = True
+                        u = v
+                        moved = True
+                        break
+                    nxt[u] += 1
+                if moved:
+                    continue
+                dead[u] = True
+                if not stack:
+                    return pushed
+                on_path[u] = False
+                u, _ = stack.pop()
+                nxt[u] += 1
+            push = min(graph[x][i][1] for x, i in stack)
+            for x, i in stack:
+                e = graph[x][i]
+                e[1] -= push
+                graph[e[0]][e[3]][1] += push
+            pushed += push
+
+def propose_allocation_plan(db, project_ids: Optional[List[Any]] = None,
+                            candidates_per_slot: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Best joint assignment of available employees to Open projects.
+    Nothing is written; the caller decides whether to create the allocations.
+    """
+    t0 = time.perf_counter()
+    per_slot = int(candidates_per_slot or Config.ALLOCATION_CANDIDATES_PER_SLOT)
+
+    query: Dict[str, Any] = {"status": "Open"}
+    if project_ids:
+        query["_id"] = {"$in": [ObjectId(str(x)) for x in project_ids]}
+    projects = list(db.projects.find(query))
+
+    # Existing Active allocations take up headcount and make employees busy
+    # for their window (and for the project they are on).
+    active = list(db.hr_allocations.find({"status": "Active"},
+                                         {"employee_id": 1, "project_id": 1, "start_date": 1, "end_date": 1}))
+    booked: Dict[str, List[Tuple[str, Tuple[Optional[int], Optional[int]]]]] = {}
+    taken: Dict[str, int] = {}
+    for a, window in zip(active, allocation_windows(db, active)):
+        booked.setdefault(str(a.get("employee_id")), []).append((str(a.get("project_id")), window))
+        taken[str(a.get("project_id"))] = taken.get(str(a.get("project_id")), 0) + 1
+
+    slots: Dict[Any, int] = {}
+    for p in projects:
+        remaining = int(p.get("headcount") or 1) - taken.get(str(p["_id"]), 0)
+        if remaining > 0:
+            slots[p["_id"]] = remaining
+    open_projects = [p for p in projects if p["_id"] in slots]
+
+    pool = CandidatePool.load(db, open_projects)
+    pool_ids = {str(e["_id"]): e["_id"] for e in pool.employees}
+    booked_ids = {pool_ids[k]: v for k, v in booked.items() if k in pool_ids}
+    t_load = time.perf_counter()
+
+    # Candidate edges
+    edges: List[Tuple[Any, Any, float]] = []
+    for p in open_projects:
+        window = project_window(p)
+        busy = {
+            emp_id for emp_id, allocs in booked_ids.items()
+            if any(pid == str(p["_id"]) or windows_overlap(window, w) for pid, w in allocs)
+        }
+        exclude = busy | unavailable_ids(pool.employees, *window)
+        for rec in pool.top(p, slots[p["_id"]] * per_slot, exclude=exclude):
+            if rec.score > 0:
+                edges.append((p["_id"], rec.emp_id, rec.score))
+    t_score = time.perf_counter()
+
+    # Flow network
+    proj_node = {p["_id"]: 1 + i for i, p in enumerate(open_projects)}
+    emp_node: Dict[Any, int] = {}
+    for _, emp_id, _ in edges:
+        if emp_id not in emp_node:
+            emp_node[emp_id] = 1 + len(proj_node) + len(emp_node)
+    source, sink = 0, 1 + len(proj_node) + len(emp_node)
+    mcf = _MinCostFlow(sink + 1)
+    for pid, node in proj_node.items():
+        mcf.add_edge(source, node, slots[pid], 0)
+    for node in emp_node.values():
+        mcf.add_edge(node, sink, 1, 0)
+    assignment_edges = [
+        (pid, emp_id, score, mcf.add_edge(proj_node[pid], emp_node[emp_id], 1, -int(round(score * _SCALE))))
+        for pid, emp_id, score in edges
+    ]
+    mcf.run(source, sink)
+    t_solve = time.perf_counter()
+
+    chosen = [(pid, emp_id, score) for pid, emp_id, score, e in assignment_edges if e[1] == 0]
+    names = {
+        d["_id"]: d.get("name")
+        for d in db.employees.find({"_id": {"$in": [emp_id for _, emp_id, _ in chosen]}}, {"name": 1})
+    }
+    by_id = {p["_id"]: p for p in open_projects}
+
+    assignments = [
+        {
+            "project_id": str(pid),
+            "project_name": by_id[pid].get("project_name"),
+            "employee_id": str(emp_id),
+            "employee_name": names.get(emp_id),
+            "score": round(score, 4),
+        }
+        for pid, emp_id, score in chosen
+    ]
+    filled: Dict[Any, int] = {}
+    for pid, _, _ in chosen:
+        filled[pid] = filled.get(pid, 0) + 1
+
+    return {
+        "assignments": assignments,
+        "projects": [
+            {
+                "project_id": str(p["_id"]),
+                "project_name": p.get("project_name"),
+                "open_slots": slots[p["_id"]],
+                "filled": filled.get(p["_id"], 0),
+            }
+            for p in open_projects
+        ],
+        "total_score": round(sum(score for _, _, score in chosen), 4),
+        "stats": {
+            "projects": len(open_projects),
+            "candidates": len(pool.employees),
+            "edges": len(edges),
+            "load_ms": round((t_load - t0) * 1000, 1),
+            "score_ms": round((t_score - t_load) * 1000, 1),
+            "solve_ms": round((t_solve - t_score) * 1000, 1),
+        },
+    }
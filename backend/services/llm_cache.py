@@ -0,0 +1,116 @@
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
+from threading import Lock
+import hashlib
+import json
+
+from config import Config
+
+# ------------------ LLM Response Cache ------------------
+#
+# Gemini responses stored in the `llm_cache` collection, keyed on
+#     sha256(kind, model, prompt version, input payload)
+# so re-uploading the same resume or reranking the same shortlist is served
+# from Mongo. `kind` is the call site ("extract", "rerank"); each call site
+# owns a prompt version constant and bumps it whenever the prompt changes,
+# which makes every older entry unreachable (they age out via the TTL index,
+# or drop them at once with invalidate()).
+#
+# Entries expire after LLM_CACHE_TTL_DAYS (Mongo TTL index on expires_at) and
+# the collection is trimmed to LLM_CACHE_MAX_ENTRIES, least recently used
+# first. Only responses the caller could parse are stored.
+
+_TRIM_EVERY = 50
+
+def cache_key(kind: str, model: str, prompt_version: int, payload: Any) -> str:
+    blob = json.dumps(
+        {"kind": kind, "model": model, "v": prompt_version, "input": payload},
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    def __init__(self):
+        self._lock = Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._puts = 0
+
+    def _count(self, kind: str, what: str) -> None:
+        with self._lock:
+            c = self._counts.setdefault(kind, {"hits": 0, "misses": 0, "stores": 0})
+            c[what] += 1
+
+    def get(self, db, kind: str, model: str, prompt_version: int, payload: Any) -> Optional[str]:
+        if db is None or not Config.LLM_CACHE_ENABLED:
+            return None
+        key = cache_key(kind, model, prompt_version, payload)
+        doc = db.llm_cache.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+            {"$set": {"last_used": datetime.utcnow()}, "$inc": {"hits": 1}},
+            projection={"response": 1},
+        )
+        self._count(kind, "hits" if doc else "misses")
+        return doc["response"] if doc else None
+
+    def put(self, db, kind: str, model: str, prompt_version: int, payload: Any, response: str) -> None:
+        if db is None or not Config.LLM_CACHE_ENABLED:
+            return
+        now = datetime.utcnow()
+        db.llm_cache.update_one(
+            {"_id": cache_key(kind, model, prompt_version, payload)},
+            {"$set": {
+                "kind": kind,
+                "model": model,
+                "prompt_version": prompt_version,
+                "response": response,
+                "size": len(response),
+                "created_at": now,
+                "last_used": now,
+                "expires_at": now + timedelta(days=Config.LLM_CACHE_TTL_DAYS),
+            }, "$setOnInsert": {"hits": 0}},
+            upsert=True,
+        )
+        self._count(kind, "stores")
+        with self._lock:
+            self._puts += 1
+            trim = self._puts % _TRIM_EVERY == 0
+        if trim:
+            self.trim(db)
+
+    def trim(self, db, max_entries: Optional[int] = None) -> int:
+        """Drop least recently used entries beyond max_entries. Returns the number removed."""
+        limit = Config.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        extra = db.llm_cache.estimated_document_count() - limit
+        if extra <= 0:
+            return 0
+        old = [d["_id"] for d in db.llm_cache.find({}, {"_id": 1}).sort("last_used", 1).limit(extra)]
+        return db.llm_cache.delete_many({"_id": {"$in": old}}).deleted_count
+
+    def invalidate(self, db, kind: Optional[str] = None, below_version: Optional[int] = None) -> int:
+        """Delete entries (of one kind / older prompt versions). Returns the number removed."""
+        query: Dict[str, Any] = {}
+        if kind:
+            query["kind"] = kind
+        if below_version is not None:
+            query["prompt_version"] = {"$lt": below_version}
+        return db.llm_cache.delete_many(query).deleted_count
+
+    def stats(self, db=None) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"process": {k: dict(v) for k, v in self._counts.items()}}
+        if db is not None:
+            out["stored"] = {
+                d["_id"]: {"entries": d["entries"], "bytes": d["bytes"], "hits": d["hits"]}
+                for d in db.llm_cache.aggregate([
+                    {"$group": {"_id": "$kind", "entries": {"$sum": 1},
+                                "bytes": {"$sum": "$size"}, "hits": {"$sum": "$hits"}}},
+                ])
+            }
+        return out
+
+llm_cache = LLMCache()
+
+def ensure_indexes(db) -> None:
+    db.llm_cache.create_index("expires_at", expireAfterSeconds=0)
+    db.llm_cache.create_index("last_used")
+    db.llm_cache.create_index([("kind", 1), ("prompt_version", 1)])
@@ -1,147 +1,302 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Set, Tuple
 from datetime import datetime
 from math import exp
+import heapq
+import json
 from config import Config
+from services.skill_index import candidate_ids, has_skills
+from services import match_numpy
+from services import text_index
+from services.match_features import SOURCE_FIELDS, build_match_features, is_current
+from pymongo import UpdateOne
+from services.availability import project_window, unavailable_ids
+from utils.skill_matcher import group_matcher
+from services.gemini_client import gemini_client
+from services.llm_cache import llm_cache
+from services.rerank_prompt import build_rerank_prompt
 
 # ------------------ Helpers ------------------
 
-def _skill_overlap_list(req: List[str], have: List[str]) -> List[str]:
-    rs = {s.strip().lower() for s in req or [] if s}
-    hs = {s.strip().lower() for s in have or [] if s}
-    inter = rs & hs
-    have_map = {s.strip().lower(): s for s in have or []}
-    return [have_map.get(k, k) for k in inter]
+class _Req:
+    """A project's required skills, normalized once per ranking."""
+    __slots__ = ("keys", "key_set", "lows", "_flat")
 
-def _soonest_date_score(iso_dates: List[str]) -> float:
-    if not iso_dates:
-        return 0.0
-    today = datetime.utcnow().date()
-    best = 0.0
-    for s in iso_dates:
-        try:
-            y, m, d = map(int, s.split("-"))
-            dt = datetime(y, m, d).date()
-            delta = (dt - today).days
-            best = max(best, exp(-abs(delta) / 7.0))
-        except Exception:
-            continue
-    return best
-
-def _previous_exp_bonus(prev: List[Dict[str, Any]]) -> float:
-    if not prev:
+    def __init__(self, req: List[str]):
+        req = req or []
+        # one entry per required skill (duplicates count twice for project hits)
+        self.keys = [(r or "").strip().lower() for r in req]
+        self.key_set = {k for k in self.keys if k}
+        # substring fallback over flat projects uses the unstripped spelling
+        self.lows = [r.lower() for r in req if r]
+        self._flat = None
+
+    @property
+    def flat(self):
+        """Automaton over self.lows (+ lexicon synonyms); labels are indices into lows."""
+        if self._flat is None:
+            self._flat = group_matcher(tuple(self.lows))
+        return self._flat
+
+def _soonest_day_score(days: List[int], today: int) -> float:
+    if not days:
         return 0.0
-    score = 0.0
-    for it in prev:
-        if it.get("company") or it.get("title"):
-            score += 0.5
-    return min(score, 2.0)
+    return exp(-min(abs(d - today) for d in days) / 7.0)
 
 # ------------------ Core Scoring ------------------
 
-def score_candidates(db, project: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Compute match % heavily weighted toward skill + project experience."""
-    req = project.get("required_skills", []) or []
-    ranked: List[Dict[str, Any]] = []
-
-    for emp in db.employees.find({}):
-        skills = emp.get("skills", [])
-        projects_by_skill = emp.get("projects_by_skill", {}) or {}
-        projects_flat = emp.get("projects", []) or []
-        availability_dates = emp.get("availability_dates", []) or []
-        prev = emp.get("previous_experience", []) or []
-
-        matched_skills = _skill_overlap_list(req, skills)
-        s_overlap = len(matched_skills)
-
-        # Experience in those specific skills
-        proj_hits = 0
-        for r in req:
-            rlow = (r or "").strip().lower()
-            if rlow in (k.strip().lower() for k in projects_by_skill.keys()):
-                proj_hits += len(projects_by_skill.get(r, []) or [])
-        if proj_hits == 0 and projects_flat:
-            for p in projects_flat:
-                for r in req:
-                    if r and r.lower() in str(p).lower():
-                        proj_hits += 1
-
-        prev_bonus = _previous_exp_bonus(prev)
-        avail_bonus = _soonest_date_score(availability_dates)
-
-        # Heavier weights for skills & project experience
-        base = (4.0 * s_overlap) + (3.0 * proj_hits) + (1.0 * prev_bonus) + (1.0 * avail_bonus)
-
-        emp["_base_score"] = float(base)
-        emp["matched_skills"] = matched_skills
-        ranked.append(emp)
-
-    return ranked
+# Only the fields the formula reads; full documents are fetched for winners.
+_SCORING_PROJECTION = {"match_features": 1}
+
+class _Scored:
+    """Compact per-candidate record kept while ranking."""
+    __slots__ = ("score", "seq", "emp_id", "matched_skills")
+
+    def __init__(self, score: float, seq: int, emp_id: Any, matched_skills: List[str]):
+        self.score = score
+        self.seq = seq
+        self.emp_id = emp_id
+        self.matched_skills = matched_skills
+
+def _score_one(req: _Req, f: Dict[str, Any], today: int) -> Tuple[float, List[str]]:
+    names = f["skill_names"]
+    matched_skills = [names[i] for i, k in enumerate(f["skills"]) if k in req.key_set]
+    s_overlap = len(matched_skills)
+
+    # Experience in those specific skills
+    proj_hits = 0
+    if f["proj_skills"]:
+        counts = dict(zip(f["proj_skills"], f["proj_counts"]))
+        for k in req.keys:
+            proj_hits += counts.get(k, 0)
+    if proj_hits == 0 and f["projects"]:
+        # one scan per project line, however many skills are required
+        for p in f["projects"]:
+            proj_hits += len(req.flat.labels(p))
+
+    prev_bonus = f["prev_bonus"]
+    avail_bonus = _soonest_day_score(f["avail_days"], today)
+
+    # Heavier weights for skills & project experience
+    base = (4.0 * s_overlap) + (3.0 * proj_hits) + (1.0 * prev_bonus) + (1.0 * avail_bonus)
+    return float(base), matched_skills
+
+def _with_features(db, employees: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Compute (and store) match_features for employees written before it existed."""
+    stale = [e["_id"] for e in employees if not is_current(e.get("match_features"))]
+    if not stale:
+        return employees
+    fresh: Dict[Any, Dict[str, Any]] = {}
+    ops: List[UpdateOne] = []
+    for doc in db.employees.find({"_id": {"$in": stale}}, {f: 1 for f in SOURCE_FIELDS}):
+        fresh[doc["_id"]] = build_match_features(doc)
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"match_features": fresh[doc["_id"]]}}))
+    if ops:
+        db.employees.bulk_write(ops, ordered=False)
+    for e in employees:
+        if e["_id"] in fresh:
+            e["match_features"] = fresh[e["_id"]]
+    return [e for e in employees if is_current(e.get("match_features"))]
+
+def _load_employees(db, projects: List[Dict[str, Any]], extra_ids: Set[Any] = frozenset()) -> List[Dict[str, Any]]:
+    """
+    Load the feature block of every employee that can score for at least one
+    of the projects on skill overlap or project experience: those posted
+    under a required skill in the inverted index (skills, projects_by_skill
+    keys and the words / lexicon skills of their flat project lines). A
+    required skill that only occurs inside a longer word of a project line
+    ("java" in "javascript") doesn't count for the prefilter, and employees
+    that would score on the experience / availability bonuses alone are
+    skipped. `extra_ids` (text-recalled employees) are loaded regardless.
+    """
+    reqs = [proj.get("required_skills", []) or [] for proj in projects]
+    # also brings the index up to date for CandidatePool.top
+    ids = candidate_ids(db, [s for req in reqs for s in req])
+    if ids is None or not all(has_skills(req) for req in reqs):
+        query = {}
+    else:
+        query = {"_id": {"$in": list(set(ids) | set(extra_ids))}}
+    return _with_features(db, list(db.employees.find(query, _SCORING_PROJECTION)))
+
+# ------------------ Text Similarity Term ------------------
+
+def _text_on() -> bool:
+    return text_index.enabled()
+
+def _text_similarities(db, project: Dict[str, Any]) -> Dict[str, float]:
+    """employee id (str) -> cosine similarity of resume text to the project text."""
+    return text_index.employee_similarities(db, project) if _text_on() else {}
+
+def _recalled(sims: Dict[str, float]) -> Set[str]:
+    """The TEXT_RECALL_K employees most similar to the project (str ids)."""
+    return set(heapq.nlargest(Config.TEXT_RECALL_K, sims, key=sims.get))
+
+class CandidatePool:
+    """
+    An employee set loaded (and, for the numpy engine, encoded) once and then
+    ranked against any number of projects.
+    """
+
+    def __init__(self, db, employees: List[Dict[str, Any]],
+                 text_sims: Optional[Dict[Any, Dict[str, float]]] = None):
+        self.db = db
+        self.employees = employees
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        self._str_ids = [str(e["_id"]) for e in employees]
+        # project _id -> employee text similarities, filled lazily
+        self._text_sims: Dict[Any, Dict[str, float]] = dict(text_sims or {})
+        self._matrix = None
+        if Config.MATCH_ENGINE == "numpy" and match_numpy.available() and employees:
+            self._matrix = match_numpy.EmployeeMatrix([e["match_features"] for e in employees])
+
+    @classmethod
+    def load(cls, db, projects: List[Dict[str, Any]]) -> "CandidatePool":
+        sims = {p.get("_id"): _text_similarities(db, p) for p in projects} if _text_on() else {}
+        recalled: Set[str] = set()
+        for s in sims.values():
+            recalled |= _recalled(s)
+        extra = {text_index.raw_id(x) for x in recalled}
+        return cls(db, _load_employees(db, projects, extra), text_sims=sims)
+
+    def _sims_for(self, project: Dict[str, Any]) -> Dict[str, float]:
+        key = project.get("_id")
+        if key not in self._text_sims:
+            self._text_sims[key] = _text_similarities(self.db, project)
+        return self._text_sims[key]
+
+    def top(self, project: Dict[str, Any], k: int, exclude: Optional[Set[Any]] = None) -> List[_Scored]:
+        """
+        Best k candidates for the project, best first (ties keep load order).
+        Employee ids in `exclude` are skipped.
+        """
+        req = project.get("required_skills", []) or []
+        # the index was synced when the pool was loaded
+        ids = candidate_ids(self.db, req, sync=False)
+        keep = None if ids is None else set(ids)
+        sims = self._sims_for(project)
+        if keep is not None and sims:
+            recalled = _recalled(sims)
+            keep |= {e["_id"] for e, s in zip(self.employees, self._str_ids) if s in recalled}
+        text_w = Config.TEXT_MATCH_WEIGHT if sims else 0.0
+        if exclude:
+            keep = (keep if keep is not None else {e["_id"] for e in self.employees}) - exclude
+        k = max(int(k), 0)
+        if k == 0:
+            return []
+
+        if self._matrix is not None:
+            return self._top_numpy(req, keep, k, sims, text_w)
+
+        prepared = _Req(req)
+        today = datetime.utcnow().date().toordinal()
+        heap: List[Tuple[float, int, _Scored]] = []
+        for seq, emp in enumerate(self.employees):
+            if keep is not None and emp["_id"] not in keep:
+                continue
+            score, matched = _score_one(prepared, emp["match_features"], today)
+            if text_w:
+                score = score + text_w * sims.get(self._str_ids[seq], 0.0)
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -seq, _Scored(score, seq, emp["_id"], matched)))
+            elif (score, -seq) > heap[0][:2]:
+                heapq.heapreplace(heap, (score, -seq, _Scored(score, seq, emp["_id"], matched)))
+        return [rec for _, _, rec in sorted(heap, reverse=True)]
+
+    def _top_numpy(self, req: List[str], keep, k: int, sims: Dict[str, float], text_w: float) -> List[_Scored]:
+        np = match_numpy.np
+        base, hit_mask = self._matrix.score(req)
+        if text_w:
+            base = base + text_w * np.array([sims.get(s, 0.0) for s in self._str_ids])
+        if keep is None:
+            rows = np.arange(len(self.employees))
+        else:
+            rows = np.asarray([i for i, e in enumerate(self.employees) if e["_id"] in keep], dtype=np.int64)
+        order = rows[np.argsort(-base[rows], kind="stable")][:k]
+        matched = self._matrix.matched_skills(hit_mask, rows=order)
+        return [
+            _Scored(float(base[i]), int(i), self.employees[i]["_id"], matched.get(int(i), []))
+            for i in order
+        ]
+
+    def unavailable_for(self, project: Dict[str, Any], available_only: bool = True) -> Set[Any]:
+        """Employees in the pool whose known availability misses the project window."""
+        if not available_only:
+            return set()
+        return unavailable_ids(self.employees, *project_window(project))
+
+    def materialize(self, recs: List[_Scored]) -> List[Dict[str, Any]]:
+        """Full employee documents for the winners, annotated with score + matched skills."""
+        missing = [r.emp_id for r in recs if r.emp_id not in self._docs]
+        if missing:
+            for doc in self.db.employees.find({"_id": {"$in": missing}}):
+                self._docs[doc["_id"]] = doc
+        out: List[Dict[str, Any]] = []
+        for r in recs:
+            doc = self._docs.get(r.emp_id)
+            if doc is None:  # deleted since the pool was loaded
+                continue
+            doc = dict(doc)
+            doc["_base_score"] = r.score
+            doc["matched_skills"] = r.matched_skills
+            out.append(doc)
+        return out
+
+def score_candidates(db, project: Dict[str, Any], top_k: int = 5,
+                     available_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Compute match % heavily weighted toward skill + project experience.
+    Returns the best top_k employee documents, best first. With
+    available_only, employees whose availability can't cover the project's
+    start..end window are skipped.
+    """
+    pool = CandidatePool.load(db, [project])
+    return pool.materialize(pool.top(project, top_k, exclude=pool.unavailable_for(project, available_only)))
 
 # ------------------ Gemini / AI Re-rank ------------------
 
-def gemini_rerank(project: Dict[str, Any], candidates: List[Dict[str, Any]], top_k: int = 10) -> List[Dict[str, Any]]:
+def _heuristic_reasons(candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    for c in candidates[:top_k]:
+        matched = ", ".join(c.get("matched_skills", []))
+        availability = ", ".join(c.get("availability_dates", [])) or c.get("availability", "soon")
+        reason = (
+            f"This employee has {matched or 'relevant'} skills, "
+            f"has done projects in these areas, and is available {availability}. "
+            f"Hence the match score is based on strong alignment."
+        )
+        c["ai_reason"] = reason
+    return candidates
+
+# Bump when the rerank prompt changes (invalidates cached responses).
+RERANK_PROMPT_VERSION = 2
+
+def gemini_rerank(project: Dict[str, Any], candidates: List[Dict[str, Any]], top_k: int = 10,
+                  db=None) -> List[Dict[str, Any]]:
     """
     Use Gemini (or fallback) to create a single-sentence AI reason.
     Example: "This employee has React and Django skills, has done projects in these areas, and is available soon."
+    Gemini gets GEMINI_RERANK_TIMEOUT_S to answer (see services.gemini_client)
+    and a compact prompt of at most RERANK_PROMPT_TOKEN_BUDGET tokens
+    (services.rerank_prompt); with a db, responses are cached in llm_cache.
+    Candidates the model doesn't return keep their score and get the
+    heuristic reason. When Gemini fails or times out, the candidates are
+    marked `_rerank_fallback` so callers don't cache the result.
     """
-    if Config.SKIP_GEMINI or not Config.GEMINI_API_KEY:
-        for c in candidates[:top_k]:
-            matched = ", ".join(c.get("matched_skills", []))
-            availability = ", ".join(c.get("availability_dates", [])) or c.get("availability", "soon")
-            reason = (
-                f"This employee has {matched or 'relevant'} skills, "
-                f"has done projects in these areas, and is available {availability}. "
-                f"Hence the match score is based on strong alignment."
-            )
-            c["ai_reason"] = reason
-        return candidates
+    if not gemini_client.enabled():
+        return _heuristic_reasons(candidates, top_k)
 
     # ----- Gemini path -----
     try:
-        import google.generativeai as genai
-        import json
-
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        model = genai.GenerativeModel(Config.GEMINI_MODEL)
-
-        payload = {
-            "project": {
-                "name": project.get("project_name"),
-                "required_skills": project.get("required_skills", []),
-            },
-            "candidates": [
-                {
-                    "id": str(c.get("_id") or c.get("id")),
-                    "name": c.get("name"),
-                    "role": c.get("role"),
-                    "matched_skills": c.get("matched_skills", []),
-                    "projects_by_skill": c.get("projects_by_skill", {}),
-                    "projects": c.get("projects", []),
-                    "previous_experience": c.get("previous_experience", []),
-                    "availability": c.get("availability"),
-                    "availability_dates": c.get("availability_dates", []),
-                    "_base_score": c.get("_base_score", 0),
-                }
-                for c in candidates[:top_k]
-            ],
-        }
-
-        prompt = (
-            "You are a technical recruiter AI. Analyze each candidate for the given project.\n"
-            "Focus mainly on skills and whether they have built projects using those skills.\n"
-            "Also lightly consider availability.\n"
-            "Return STRICT JSON with this structure:\n"
-            "{ \"results\": [ {\"id\": string, \"rerank_score\": float (0-1), \"reason\": string} ] }\n"
-            "Each reason must be ONE SENTENCE (<= 180 chars) like:\n"
-            "\"This employee has React and Django skills, has done projects in these areas, and is available soon.\"\n"
-            "---\n"
-            f"{payload}"
-        )
+        prompt, payload = build_rerank_prompt(project, candidates[:top_k], Config.RERANK_PROMPT_TOKEN_BUDGET)
 
-        out = model.generate_content(prompt)
-        raw = (out.text or "").strip()
+        model = gemini_client.model_name()
+        raw = llm_cache.get(db, "rerank", model, RERANK_PROMPT_VERSION, payload)
+        fresh = raw is None
+        if fresh:
+            raw = gemini_client.generate(prompt, timeout=Config.GEMINI_RERANK_TIMEOUT_S)
         data = json.loads(raw)
+        if fresh:
+            llm_cache.put(db, "rerank", model, RERANK_PROMPT_VERSION, payload, raw)
         results = {str(x["id"]): x for x in data.get("results", []) if "id" in x}
+        _heuristic_reasons(candidates, top_k)
 
         for c in candidates[:top_k]:
             cid = str(c.get("_id") or c.get("id"))
@@ -153,14 +308,7 @@ def gemini_rerank(project: Dict[str, Any], candidates: List[Dict[str, Any]], top
 
         return candidates
     except Exception:
-        # fallback to heuristic
-        for c in candidates[:top_k]:
-            matched = ", ".join(c.get("matched_skills", []))
-            availability = ", ".join(c.get("availability_dates", [])) or c.get("availability", "soon")
-            reason = (
-                f"This employee has {matched or 'relevant'} skills, "
-                f"has done projects in these areas, and is available {availability}. "
-                f"Hence the match score is based on strong alignment."
-            )
-            c["ai_reason"] = reason
-        return candidates
+        # fallback to heuristic (also on timeout / open circuit)
+        for c in candidates:
+            c["_rerank_fallback"] = True
+        return _heuristic_reasons(candidates, top_k)
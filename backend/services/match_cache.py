@@ -0,0 +1,94 @@
+from typing import Any, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+import time
+
+from config import Config
+from services.versions import EMPLOYEES, ALLOCATIONS, get_versions
+
+# ------------------ Match Result Cache ------------------
+#
+# Per-process LRU + TTL cache of finished /match payloads. Keys carry every
+# input the result depends on: the project id and its updated_at, the
+# employee and allocation version counters (bumped by every write, see
+# services.versions), the request options, and today's date (the
+# availability bonus is relative to today). A write therefore changes the key
+# and stale entries simply age out of the LRU.
+
+class MatchCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(int(max_entries), 0)
+        self.ttl = float(ttl_seconds)
+        self._lock = Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            stored_at, value = item
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+def current_versions(db) -> Dict[str, int]:
+    return get_versions(db, (EMPLOYEES, ALLOCATIONS))
+
+match_cache = MatchCache(Config.MATCH_CACHE_SIZE, Config.MATCH_CACHE_TTL)
+
+def match_cache_key(db, project: Dict[str, Any], options: Tuple,
+                    versions: Optional[Dict[str, int]] = None) -> Hashable:
+    """
+    `options` are the request knobs that change the result (limit, use_ai, ...).
+    Pass `versions` (from current_versions) to avoid re-reading them per project.
+    """
+    versions = versions or current_versions(db)
+    updated = project.get("updated_at")
+    return (
+        str(project["_id"]),
+        updated.isoformat() if isinstance(updated, datetime) else str(updated),
+        versions[EMPLOYEES],
+        versions[ALLOCATIONS],
+        tuple(options),
+        datetime.utcnow().date().toordinal(),
+    )
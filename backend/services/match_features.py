@@ -0,0 +1,112 @@
+from typing import Any, Dict, List
+from pymongo import UpdateOne
+from services.availability import day_ordinal, to_spans
+
+# ------------------ Precomputed Match Features ------------------
+#
+# Everything the scorer needs, normalized once at write time and stored on the
+# employee as `match_features`:
+#   skills       lowercased, de-duplicated skill keys
+#   skill_names  display spelling for each key (last spelling wins)
+#   proj_skills  lowercased projects_by_skill keys
+#   proj_counts  number of projects for each proj_skills key
+#   projects     lowercased flat `projects` strings (substring fallback)
+#   avail_days   availability_dates as day ordinals (unparseable dates dropped)
+#   avail_spans  avail_days merged into [first, last] runs (services.availability)
+#   prev_bonus   previous-experience bonus
+# Keys are stored as parallel arrays rather than sub-documents because skill
+# names routinely contain "." (Node.js, ASP.NET).
+#
+# Bump FEATURES_VERSION whenever the shape or normalization changes; documents
+# with an older version are recomputed on read and by `manage.py
+# backfill-match-features`.
+
+FEATURES_VERSION = 2
+
+# Employee fields the features are derived from.
+SOURCE_FIELDS = ("skills", "projects_by_skill", "projects", "previous_experience", "availability_dates")
+
+def _previous_exp_bonus(prev: List[Dict[str, Any]]) -> float:
+    if not prev:
+        return 0.0
+    score = 0.0
+    for it in prev:
+        if isinstance(it, dict) and (it.get("company") or it.get("title")):
+            score += 0.5
+    return min(score, 2.0)
+
+def _project_count(v: Any) -> int:
+    try:
+        return len(v or [])
+    except TypeError:
+        return 0
+
+def build_match_features(doc: Dict[str, Any]) -> Dict[str, Any]:
+    names: Dict[str, str] = {}
+    for s in doc.get("skills", []) or []:
+        key = str(s or "").strip().lower()
+        if key:
+            names[key] = str(s)
+
+    counts: Dict[str, int] = {}
+    for k, v in (doc.get("projects_by_skill") or {}).items():
+        key = str(k or "").strip().lower()
+        if key:
+            counts[key] = counts.get(key, 0) + _project_count(v)
+
+    days = {d for d in (day_ordinal(x) for x in doc.get("availability_dates", []) or []) if d is not None}
+
+    return {
+        "v": FEATURES_VERSION,
+        "skills": list(names.keys()),
+        "skill_names": list(names.values()),
+        "proj_skills": list(counts.keys()),
+        "proj_counts": list(counts.values()),
+        "projects": [str(p).lower() for p in doc.get("projects", []) or []],
+        "avail_days": sorted(days),
+        "avail_spans": to_spans(days),
+        "prev_bonus": _previous_exp_bonus(doc.get("previous_experience", []) or []),
+    }
+
+def is_current(features: Any) -> bool:
+    return isinstance(features, dict) and features.get("v") == FEATURES_VERSION
+
+# the match_features keys computed from each source field (each key depends on one field only)
+_FEATURE_KEYS = {
+    "skills": ("skills", "skill_names"),
+    "projects_by_skill": ("proj_skills", "proj_counts"),
+    "projects": ("projects",),
+    "previous_experience": ("prev_bonus",),
+    "availability_dates": ("avail_days", "avail_spans"),
+}
+
+def match_features_update(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Dotted $set entries ("match_features.skills", ...) that keep the features
+    current for a partial write of `fields`, so an update needs no read of the
+    other source fields. Features of an older FEATURES_VERSION keep their
+    version and are still rebuilt on read.
+    """
+    changed = [f for f in SOURCE_FIELDS if f in fields]
+    if not changed:
+        return {}
+    built = build_match_features({f: fields[f] for f in changed})
+    return {f"match_features.{k}": built[k] for f in changed for k in _FEATURE_KEYS[f]}
+
+def backfill_match_features(db, batch_size: int = 500, force: bool = False) -> int:
+    """
+    Compute `match_features` for employees that lack it (or have an older
+    version; every employee with force=True). Returns the number updated.
+    """
+    query: Dict[str, Any] = {} if force else {"match_features.v": {"$ne": FEATURES_VERSION}}
+    projection = {f: 1 for f in SOURCE_FIELDS}
+    ops: List[UpdateOne] = []
+    updated = 0
+    for doc in db.employees.find(query, projection).batch_size(batch_size):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"match_features": build_match_features(doc)}}))
+        if len(ops) >= batch_size:
+            updated += db.employees.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += db.employees.bulk_write(ops, ordered=False).modified_count
+    return updated
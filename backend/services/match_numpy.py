@@ -0,0 +1,154 @@
+from typing import Any, Dict, List, Tuple
+from datetime import datetime
+from math import exp
+from utils.skill_matcher import spellings
+
+try:
+    import numpy as np
+except Exception:  # numpy is optional; services.match falls back to pure Python
+    np = None
+
+# ------------------ Vectorized Scoring Engine ------------------
+#
+# Same formula as services.match._score_one:
+#     4*overlap + 3*proj_hits + prev_bonus + avail_bonus
+# but with the employees' match_features (services.match_features) encoded
+# once into flat arrays:
+#   * one sparse (CSR-style) employee x column matrix whose columns are the
+#     lowercased skills followed by the lowercased projects_by_skill keys
+#     (the skill part is 0/1, the project part holds project counts),
+#   * the flattened, lowercased `projects` strings with their owner row
+#     (used by the substring fallback when an employee has no proj hits),
+#   * the previous-experience bonus per row,
+#   * availability day ordinals with their owner row.
+# Scoring a project is then two sparse mat-vecs over that one matrix: a 0/1
+# vector on the required skill columns gives the overlap, and the
+# multiplicity of each required projects_by_skill key gives the project hits.
+# Employees can be encoded once and scored for many projects (CandidatePool).
+
+def available() -> bool:
+    return np is not None
+
+class EmployeeMatrix:
+    def __init__(self, features: List[Dict[str, Any]]):
+        n = len(features)
+
+        skill_cols: Dict[str, int] = {}
+        pbs_keys: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []       # skill columns (pbs columns are offset later)
+        orig: List[str] = []       # display spelling per skill entry
+        p_rows: List[int] = []
+        p_cols: List[int] = []
+        p_vals: List[int] = []
+        flat_text: List[str] = []
+        flat_owner: List[int] = []
+        day_vals: List[int] = []
+        day_owner: List[int] = []
+        prev = [0.0] * n
+
+        for i, f in enumerate(features):
+            for key, spelling in zip(f["skills"], f["skill_names"]):
+                rows.append(i)
+                cols.append(skill_cols.setdefault(key, len(skill_cols)))
+                orig.append(spelling)
+            for key, cnt in zip(f["proj_skills"], f["proj_counts"]):
+                if cnt:
+                    p_rows.append(i)
+                    p_cols.append(pbs_keys.setdefault(key, len(pbs_keys)))
+                    p_vals.append(cnt)
+            flat_text.extend(f["projects"])
+            flat_owner.extend([i] * len(f["projects"]))
+            day_vals.extend(f["avail_days"])
+            day_owner.extend([i] * len(f["avail_days"]))
+            prev[i] = f["prev_bonus"]
+
+        n_skill = len(skill_cols)
+        self.n = n
+        self.skill_cols = skill_cols
+        self.pbs_cols = {k: n_skill + j for k, j in pbs_keys.items()}
+        self.n_cols = n_skill + len(pbs_keys)
+
+        self.rows = np.asarray(rows + p_rows, dtype=np.int64)
+        self.cols = np.asarray(cols + [n_skill + c for c in p_cols], dtype=np.int64)
+        self.vals = np.asarray([1] * len(rows) + p_vals, dtype=np.float64)
+        self.n_skill_entries = len(rows)
+        self.skill_orig = orig
+
+        self.flat_text = np.asarray(flat_text, dtype=np.str_) if flat_text else np.asarray([], dtype=np.str_)
+        self.flat_owner = np.asarray(flat_owner, dtype=np.int64)
+        self.prev = np.asarray(prev, dtype=np.float64)
+        self.day_vals = np.asarray(day_vals, dtype=np.int64)
+        self.day_owner = np.asarray(day_owner, dtype=np.int64)
+
+    # ---- pieces of the formula ----
+
+    def _matvec(self, x: "np.ndarray") -> "np.ndarray":
+        if self.rows.size == 0:
+            return np.zeros(self.n, dtype=np.float64)
+        return np.bincount(self.rows, weights=self.vals * x[self.cols], minlength=self.n)
+
+    def _avail_bonus(self) -> "np.ndarray":
+        out = np.zeros(self.n, dtype=np.float64)
+        if self.day_vals.size == 0:
+            return out
+        today = datetime.utcnow().date().toordinal()
+        dist = np.abs(self.day_vals - today)
+        nearest = np.full(self.n, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(nearest, self.day_owner, dist)
+        has = nearest != np.iinfo(np.int64).max
+        # exp() through math so the values are bit-identical to the Python path
+        uniq, inv = np.unique(nearest[has], return_inverse=True)
+        table = np.asarray([exp(-float(u) / 7.0) for u in uniq], dtype=np.float64)
+        out[has] = table[inv]
+        return out
+
+    def _flat_hits(self, req: List[str]) -> "np.ndarray":
+        hits = np.zeros(self.n, dtype=np.float64)
+        if self.flat_text.size == 0:
+            return hits
+        for r in req:
+            if not r:
+                continue
+            found = np.zeros(self.flat_text.size, dtype=bool)
+            for s in spellings(r):
+                found |= np.char.find(self.flat_text, s) >= 0
+            if found.any():
+                hits += np.bincount(self.flat_owner[found], minlength=self.n)
+        return hits
+
+    def score(self, req: List[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Returns (base_scores, skill_hit_mask) where skill_hit_mask flags the
+        skill entries (in self.skill_orig order) that matched a required skill.
+        """
+        req = req or []
+        skill_w = np.zeros(self.n_cols, dtype=np.float64)
+        proj_w = np.zeros(self.n_cols, dtype=np.float64)
+        for r in {s.strip().lower() for s in req if s}:
+            col = self.skill_cols.get(r)
+            if col is not None:
+                skill_w[col] = 1.0
+        for r in req:
+            col = self.pbs_cols.get((r or "").strip().lower())
+            if col is not None:
+                proj_w[col] += 1.0
+
+        s_overlap = self._matvec(skill_w)
+        proj_hits = self._matvec(proj_w)
+        fallback = self._flat_hits(req)
+        proj_hits = np.where(proj_hits == 0, fallback, proj_hits)
+
+        base = (4.0 * s_overlap) + (3.0 * proj_hits) + (1.0 * self.prev) + (1.0 * self._avail_bonus())
+        hit_mask = skill_w[self.cols[: self.n_skill_entries]] > 0
+        return base, hit_mask
+
+    def matched_skills(self, hit_mask: "np.ndarray", rows=None) -> Dict[int, List[str]]:
+        """Matched skill spellings per row (restricted to `rows` when given)."""
+        hits = np.flatnonzero(hit_mask)
+        if rows is not None:
+            hits = hits[np.isin(self.rows[hits], rows)]
+        out: Dict[int, List[str]] = {}
+        for j in hits:
+            out.setdefault(int(self.rows[j]), []).append(self.skill_orig[j])
+        return out
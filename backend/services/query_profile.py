@@ -0,0 +1,282 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+from threading import Lock
+import hashlib
+import json
+import logging
+import queue
+import re
+import threading
+import time
+
+from bson.regex import Regex
+from pymongo import monitoring
+
+from config import Config
+
+log = logging.getLogger(__name__)
+
+# ------------------ Slow Query Profiling ------------------
+#
+# Opt-in (QUERY_PROFILE_ENABLED): a pymongo command listener times every
+# find / aggregate / count. Those slower than QUERY_SLOW_MS are handed to a
+# background thread, which
+#   * reduces the query to its shape: equality fields, sort, range fields
+#     (values dropped, so no names or search terms are stored),
+#   * runs explain (queryPlanner) for that shape at most once per
+#     QUERY_EXPLAIN_INTERVAL_S and logs the winning plan's stages, e.g.
+#     "COLLSCAN" or a blocking "SORT",
+#   * counts it in the `query_shapes` collection (count / total / max ms,
+#     last stages), shared by every worker process.
+#
+# advise() turns the recorded shapes into compound index suggestions in
+# Equality, Sort, Range order, skipping shapes an existing index already
+# serves.
+
+_PROFILED = ("find", "aggregate", "count")
+_IGNORED = ("query_shapes",)
+_QUEUE_SIZE = 1000
+_MAX_PENDING = 10000
+
+def _classify(flt: Dict[str, Any], eq: set, rng: set, in_or: bool = False) -> None:
+    for key, value in (flt or {}).items():
+        if key == "$and":
+            for part in value:
+                _classify(part, eq, rng, in_or)
+        elif key in ("$or", "$nor"):
+            for part in value:
+                _classify(part, eq, rng, True)
+        elif key.startswith("$"):
+            continue  # $expr, $text, $where: no index shape
+        elif isinstance(value, dict) and any(str(k).startswith("$") for k in value):
+            (eq if set(value) <= {"$eq", "$in"} and not in_or else rng).add(key)
+        elif isinstance(value, (Regex, re.Pattern)) or in_or:
+            rng.add(key)
+        else:
+            eq.add(key)
+
+def _filter_and_sort(command_name: str, command: Dict[str, Any]) -> Tuple[Dict[str, Any], List[List[Any]]]:
+    if command_name == "find":
+        return command.get("filter") or {}, [[f, d] for f, d in (command.get("sort") or {}).items()]
+    if command_name == "count":
+        return command.get("query") or {}, []
+    flt: Dict[str, Any] = {}
+    sort: List[List[Any]] = []
+    for stage in command.get("pipeline") or []:
+        if "$match" in stage and not flt and not sort:
+            flt = stage["$match"]
+        elif "$sort" in stage and not sort:
+            sort = [[f, d] for f, d in stage["$sort"].items()]
+        else:
+            break  # later stages don't use an index
+    return flt, sort
+
+def query_shape(collection: str, command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    flt, sort = _filter_and_sort(command_name, command)
+    eq: set = set()
+    rng: set = set()
+    _classify(flt, eq, rng)
+    return {"collection": collection, "eq": sorted(eq), "sort": sort, "range": sorted(rng - eq)}
+
+def shape_id(shape: Dict[str, Any]) -> str:
+    blob = json.dumps(shape, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+def plan_stages(explain: Dict[str, Any]) -> List[str]:
+    """Stage names of the winning plan(s) in an explain result, outermost first."""
+    out: List[str] = []
+
+    def walk(node: Any, in_plan: bool) -> None:
+        if isinstance(node, dict):
+            if in_plan and isinstance(node.get("stage"), str) and node["stage"] not in out:
+                out.append(node["stage"])
+            for k, v in node.items():
+                if k != "rejectedPlans":
+                    walk(v, in_plan or k == "winningPlan")
+        elif isinstance(node, list):
+            for v in node:
+                walk(v, in_plan)
+
+    walk(explain, False)
+    return out
+
+def _explain_command(collection: str, command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    if command_name == "find":
+        keep = ("filter", "sort", "projection", "skip", "limit", "hint", "collation")
+        return {"find": collection, **{k: command[k] for k in keep if k in command}}
+    if command_name == "count":
+        return {"count": collection, "query": command.get("query") or {}}
+    return {"aggregate": collection, "pipeline": command.get("pipeline") or [], "cursor": {}}
+
+class QueryProfiler(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = Lock()
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str, str, Dict[str, Any]]] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._explained: Dict[str, float] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._client = None
+        self._counts = {"slow": 0, "dropped": 0, "explained": 0, "errors": 0}
+
+    # --- listener (runs on the request thread: keep it cheap) ---
+    def started(self, event) -> None:
+        if event.command_name not in _PROFILED or threading.current_thread() is self._thread:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str) or collection in _IGNORED:
+            return
+        with self._lock:
+            if len(self._pending) > _MAX_PENDING:
+                self._pending.clear()
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.database_name, collection, event.command_name, event.command)
+
+    def succeeded(self, event) -> None:
+        with self._lock:
+            entry = self._pending.pop((event.connection_id, event.request_id), None)
+        if entry is None or event.duration_micros < Config.QUERY_SLOW_MS * 1000:
+            return
+        try:
+            self._queue.put_nowait((*entry, event.duration_micros / 1000.0))
+            self._counts["slow"] += 1
+        except queue.Full:
+            self._counts["dropped"] += 1
+
+    def failed(self, event) -> None:
+        with self._lock:
+            self._pending.pop((event.connection_id, event.request_id), None)
+
+    # --- background thread ---
+    def start(self, client) -> None:
+        self._client = client
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="query-profile", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                self.record(*item)
+            except Exception:
+                self._counts["errors"] += 1
+                log.exception("query profile: could not record a slow query")
+
+    def record(self, db_name: str, collection: str, command_name: str, command: Dict[str, Any], ms: float) -> None:
+        db = self._client[db_name]
+        shape = query_shape(collection, command_name, command)
+        sid = shape_id(shape)
+        stages: Optional[List[str]] = None
+        now = time.monotonic()
+        if now - self._explained.get(sid, -1e9) >= Config.QUERY_EXPLAIN_INTERVAL_S:
+            self._explained[sid] = now
+            explain = db.command({"explain": _explain_command(collection, command_name, command),
+                                  "verbosity": "queryPlanner"})
+            stages = plan_stages(explain)
+            self._counts["explained"] += 1
+            log.warning("slow query: %.0f ms %s.%s eq=%s sort=%s range=%s plan=%s", ms, collection, command_name,
+                        shape["eq"], shape["sort"], shape["range"], " <- ".join(stages) or "?")
+        update: Dict[str, Any] = {
+            "$setOnInsert": {**shape, "first_seen": datetime.utcnow()},
+            "$inc": {"count": 1, "total_ms": ms},
+            "$max": {"max_ms": ms},
+            "$set": {"last_ms": ms, "last_seen": datetime.utcnow()},
+        }
+        if stages is not None:
+            update["$set"]["stages"] = stages
+        db.query_shapes.update_one({"_id": sid}, update, upsert=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": Config.QUERY_PROFILE_ENABLED, "slow_ms": Config.QUERY_SLOW_MS,
+                "queued": self._queue.qsize(), **self._counts}
+
+profiler = QueryProfiler()
+
+def listeners() -> List[monitoring.CommandListener]:
+    """event_listeners for MongoClient (empty unless QUERY_PROFILE_ENABLED)."""
+    return [profiler] if Config.QUERY_PROFILE_ENABLED else []
+
+def ensure_indexes(db) -> None:
+    db.query_shapes.create_index("last_seen", expireAfterSeconds=Config.QUERY_SHAPES_RETENTION_DAYS * 86400)
+
+def start(db) -> None:
+    if Config.QUERY_PROFILE_ENABLED:
+        ensure_indexes(db)
+        profiler.start(db.client)
+
+def slow_queries(db, collection: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Recorded shapes, most total time first."""
+    query = {"collection": collection} if collection else {}
+    rows = []
+    for d in db.query_shapes.find(query).sort("total_ms", -1).limit(limit):
+        d["id"] = d.pop("_id")
+        d["avg_ms"] = round(d["total_ms"] / max(d["count"], 1), 1)
+        rows.append(d)
+    return rows
+
+# ------------------ Index Advisor ------------------
+
+def suggest_index(shape: Dict[str, Any]) -> Optional[List[Tuple[str, int]]]:
+    """ESR key for a shape: equality fields, then the sort, then range fields; None if _id serves it."""
+    if "_id" in shape["eq"]:
+        return None
+    keys: List[Tuple[str, int]] = [(f, 1) for f in shape["eq"]]
+    used = set(shape["eq"])
+    for f, d in shape["sort"]:
+        if f not in used:
+            keys.append((f, int(d)))
+            used.add(f)
+    keys += [(f, 1) for f in shape["range"] if f not in used]
+    fields = [f for f, _ in keys]
+    if "_id" in fields:  # unique: nothing after it narrows the scan
+        keys = keys[:fields.index("_id") + 1]
+    if not keys or [f for f, _ in keys] == ["_id"]:
+        return None
+    return keys
+
+def _covered(keys: List[Tuple[str, int]], n_eq: int, existing: List[List[Tuple[str, int]]]) -> bool:
+    """An existing index starts with `keys` (sort directions may be all reversed)."""
+    for ix in existing:
+        head = ix[:len(keys)]
+        if [f for f, _ in head] != [f for f, _ in keys]:
+            continue
+        rest = [(int(a[1]), b[1]) for a, b in zip(head[n_eq:], keys[n_eq:])]
+        if all(a == b for a, b in rest) or all(a == -b for a, b in rest):
+            return True
+    return False
+
+def advise(db, collection: Optional[str] = None, min_count: int = 1) -> List[Dict[str, Any]]:
+    """
+    Compound indexes for the recorded slow shapes that explain showed as a
+    COLLSCAN or blocking SORT (or weren't explained) and that no existing
+    index serves. One entry per suggested index, most total time first.
+    """
+    query: Dict[str, Any] = {"count": {"$gte": min_count}}
+    if collection:
+        query["collection"] = collection
+    existing: Dict[str, List[List[Tuple[str, int]]]] = {}
+    out: Dict[Tuple[str, Tuple[Tuple[str, int], ...]], Dict[str, Any]] = {}
+    for shape in db.query_shapes.find(query):
+        stages = shape.get("stages")
+        if stages is not None and not {"COLLSCAN", "SORT"} & set(stages):
+            continue
+        keys = suggest_index(shape)
+        if keys is None:
+            continue
+        coll = shape["collection"]
+        if coll not in existing:
+            existing[coll] = [list(ix["key"]) for ix in db[coll].index_information().values()]
+        if _covered(keys, len(shape["eq"]), existing[coll]):
+            continue
+        entry = out.setdefault((coll, tuple(keys)), {
+            "collection": coll,
+            "index": [list(k) for k in keys],
+            "create": f"db.{coll}.createIndex({{{', '.join(f'{json.dumps(f)}: {d}' for f, d in keys)}}})",
+            "shapes": [], "count": 0, "total_ms": 0.0, "max_ms": 0.0, "stages": [],
+        })
+        entry["shapes"].append(shape["_id"])
+        entry["count"] += shape["count"]
+        entry["total_ms"] = round(entry["total_ms"] + shape["total_ms"], 1)
+        entry["max_ms"] = max(entry["max_ms"], shape["max_ms"])
+        entry["stages"] = sorted(set(entry["stages"]) | set(stages or []))
+    return sorted(out.values(), key=lambda e: -e["total_ms"])
@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Tuple
+from collections import deque
+from datetime import datetime
+from threading import Lock
+import json
+import logging
+
+from services.availability import day_ordinal
+from utils.skill_matcher import group_matcher
+
+log = logging.getLogger(__name__)
+
+# ------------------ Rerank Prompt Builder ------------------
+#
+# Compact JSON for gemini_rerank: per candidate only what the model needs to
+# judge the fit,
+#   {"id", "name", "role", "skills": matched skills,
+#    "projects": {skill: [project, ...]} for the matched skills only
+#                (flat `projects` lines that mention a matched skill otherwise),
+#    "exp": ["title @ company", ...], "avail": soonest upcoming date, "score"}
+# and the whole prompt is kept under a token budget (~4 characters per
+# token) by lowering the detail level step by step and, as a last resort,
+# dropping the weakest candidates from the tail.
+
+INSTRUCTIONS = (
+    "You are a technical recruiter AI. Analyze each candidate for the given project.\n"
+    "Focus mainly on skills and whether they have built projects using those skills.\n"
+    "Also lightly consider availability.\n"
+    "Return STRICT JSON with this structure:\n"
+    "{ \"results\": [ {\"id\": string, \"rerank_score\": float (0-1), \"reason\": string} ] }\n"
+    "Each reason must be ONE SENTENCE (<= 180 chars) like:\n"
+    "\"This employee has React and Django skills, has done projects in these areas, and is available soon.\"\n"
+    "---\n"
+)
+
+# (projects per skill, experience entries, max chars per string)
+_DETAIL_LEVELS = [(3, 2, 80), (1, 1, 48), (0, 0, 32)]
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+def _clip(s: Any, n: int) -> str:
+    s = str(s or "")
+    return s if len(s) <= n else s[: n - 1] + "…"
+
+def _soonest(dates: List[str]) -> Any:
+    today = datetime.utcnow().date().toordinal()
+    upcoming = sorted(d for d in dates or [] if (day_ordinal(d) or 0) >= today)
+    return upcoming[0] if upcoming else None
+
+def _relevant_projects(c: Dict[str, Any], matched: List[str], per_skill: int, width: int) -> Dict[str, List[str]]:
+    if per_skill <= 0 or not matched:
+        return {}
+    out: Dict[str, List[str]] = {}
+    by_skill = {str(k).strip().lower(): v for k, v in (c.get("projects_by_skill") or {}).items()}
+    for s in matched:
+        items = by_skill.get(str(s).strip().lower()) or []
+        if isinstance(items, list) and items:
+            out[s] = [_clip(p, width) for p in items[:per_skill]]
+    if out:
+        return out
+    # no grouped projects: flat project lines that mention a matched skill
+    matcher = group_matcher(tuple(str(s).lower() for s in matched))
+    for p in c.get("projects", []) or []:
+        for i in sorted(matcher.labels(str(p).lower())):
+            lst = out.setdefault(matched[i], [])
+            if len(lst) < per_skill:
+                lst.append(_clip(p, width))
+    return out
+
+def _candidate(c: Dict[str, Any], level: Tuple[int, int, int]) -> Dict[str, Any]:
+    per_skill, n_exp, width = level
+    matched = list(c.get("matched_skills", []) or [])
+    out: Dict[str, Any] = {
+        "id": str(c.get("_id") or c.get("id")),
+        "name": _clip(c.get("name"), width),
+        "role": _clip(c.get("role"), width) or None,
+        "skills": matched,
+    }
+    projects = _relevant_projects(c, matched, per_skill, width)
+    if projects:
+        out["projects"] = projects
+    exp = [
+        _clip(" @ ".join(x for x in (it.get("title"), it.get("company")) if x), width)
+        for it in (c.get("previous_experience") or [])[:n_exp]
+        if isinstance(it, dict)
+    ]
+    if exp:
+        out["exp"] = exp
+    out["avail"] = _soonest(c.get("availability_dates")) or _clip(c.get("availability"), width) or None
+    out["score"] = round(float(c.get("_base_score") or 0), 2)
+    return out
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def build_rerank_prompt(project: Dict[str, Any], candidates: List[Dict[str, Any]],
+                        budget_tokens: int) -> Tuple[str, Dict[str, Any]]:
+    """(prompt, payload) for the candidates, within budget_tokens when at all possible."""
+    head = {
+        "name": project.get("project_name"),
+        "required_skills": project.get("required_skills", []),
+    }
+    payload: Dict[str, Any] = {}
+    prompt = ""
+    for level in _DETAIL_LEVELS:
+        payload = {"project": head, "candidates": [_candidate(c, level) for c in candidates]}
+        prompt = INSTRUCTIONS + _dumps(payload)
+        if estimate_tokens(prompt) <= budget_tokens:
+            break
+    while len(payload["candidates"]) > 1 and estimate_tokens(prompt) > budget_tokens:
+        payload["candidates"].pop()
+        prompt = INSTRUCTIONS + _dumps(payload)
+    _record(prompt, len(candidates), len(payload["candidates"]))
+    return prompt, payload
+
+# ------------------ Prompt Size Stats ------------------
+
+_sizes: deque = deque(maxlen=500)
+_sizes_lock = Lock()
+
+def _record(prompt: str, offered: int, sent: int) -> None:
+    tokens = estimate_tokens(prompt)
+    with _sizes_lock:
+        _sizes.append(tokens)
+    log.info("rerank prompt: %d chars, ~%d tokens, %d/%d candidates", len(prompt), tokens, sent, offered)
+
+def prompt_stats() -> Dict[str, Any]:
+    """Estimated token counts of this worker's recent rerank prompts."""
+    with _sizes_lock:
+        sizes = list(_sizes)
+    if not sizes:
+        return {"count": 0}
+    return {
+        "count": len(sizes),
+        "last": sizes[-1],
+        "avg": round(sum(sizes) / len(sizes), 1),
+        "max": max(sizes),
+    }
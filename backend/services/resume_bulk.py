@@ -0,0 +1,299 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+
+from bson import ObjectId
+from gridfs import GridFS
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import Config
+from utils.pdf import extract_text_from_pdf_bytes
+from services.resume_ingest import extract_resume, known_extractions, link_files, name_key
+from services.skill_index import skill_index
+from services import text_index
+from services import search_index
+from services import versions
+from services.match_features import SOURCE_FIELDS, build_match_features
+from utils.ndjson import chunked
+
+# ------------------ Bulk Resume Import ------------------
+#
+# Loads a zip archive or a directory of PDFs, BULK_IMPORT_BATCH files at a
+# time (only one batch of file contents is in memory); per batch:
+#   1. files are hashed; content already in `resume_extractions` (or twice in
+#      the batch) is extracted / parsed once,
+#   2. PDF text extraction fans out over a process pool (pypdf parsing is
+#      CPU-bound and holds the GIL),
+#   3. every file is stored in GridFS and parsed (Gemini / heuristic) on a
+#      thread pool bounded by GEMINI_MAX_CONCURRENCY,
+#   4. the batch's names are looked up (indexed name_key, only those names),
+#      employees are created / updated with one bulk_write, then the skill
+#      and text indexes are updated and the employee version is bumped.
+# The employee name comes from the file name ("jane_doe.pdf" -> "Jane Doe");
+# an existing employee with the same name (case-insensitive, by name_key;
+# run `manage.py backfill-name-keys` for employees written before it) is
+# updated, otherwise one is created. Returns a report with throughput, how many files
+# reused an earlier extraction, and the files that failed (a failed write
+# is reported against its file and its GridFS copy removed).
+
+def name_from_filename(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = re.sub(r"[\s_\-.]+", " ", stem).strip()
+    return name.title() if name.islower() else name
+
+def _is_pdf_name(path: str) -> bool:
+    base = os.path.basename(path)
+    return base.lower().endswith(".pdf") and not base.startswith(".") and "__MACOSX" not in path
+
+def _extract(item: Tuple[str, Any]) -> Tuple[str, str, Optional[str], float]:
+    """Process-pool task: (file, text, error, ms). `src` is a path or the file bytes."""
+    label, src = item
+    t0 = time.perf_counter()
+    try:
+        if isinstance(src, str):
+            with open(src, "rb") as fh:
+                src = fh.read()
+        # already in a pool worker: page budgets, but no nested pool
+        text = extract_text_from_pdf_bytes(src, workers=0, isolate=False) or ""
+        return label, text, None if text.strip() else "no text extracted", (time.perf_counter() - t0) * 1000
+    except Exception as e:
+        return label, "", str(e) or e.__class__.__name__, (time.perf_counter() - t0) * 1000
+
+def _read(src: Any) -> bytes:
+    if isinstance(src, str):
+        with open(src, "rb") as fh:
+            return fh.read()
+    return src
+
+def _digest(src: Any) -> str:
+    h = hashlib.sha256()
+    if isinstance(src, str):
+        with open(src, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                h.update(chunk)
+    else:
+        h.update(src)
+    return h.hexdigest()
+
+def iter_sources(path_or_zip: Any, max_files: int) -> Iterator[Tuple[str, Any]]:
+    """
+    (label, path-or-bytes) for every PDF in a directory, a zip path, or an
+    open zip file object. Zip members are read one at a time as the caller
+    consumes them; the file count is checked up front, from the listing.
+    """
+    max_bytes = Config.MAX_UPLOAD_MB * 1024 * 1024
+    if isinstance(path_or_zip, str) and os.path.isdir(path_or_zip):
+        paths = [os.path.join(root, f) for root, _, files in os.walk(path_or_zip) for f in sorted(files)]
+        paths = [p for p in paths if _is_pdf_name(p)]
+        if len(paths) > max_files:
+            raise ValueError(f"more than {max_files} PDFs")
+        for p in paths:
+            yield os.path.relpath(p, path_or_zip), p
+        return
+    with zipfile.ZipFile(path_or_zip) as zf:
+        members = [info for info in zf.infolist() if not info.is_dir() and _is_pdf_name(info.filename)]
+        if len(members) > max_files:
+            raise ValueError(f"more than {max_files} PDFs")
+        for info in members:
+            if info.file_size > max_bytes:
+                yield info.filename, ValueError(f"larger than {Config.MAX_UPLOAD_MB} MB")
+                continue
+            yield info.filename, zf.read(info)
+
+def _existing(db, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Employees whose name equals one of `names` (case-insensitive, via name_key), by name_key."""
+    keys = [k for k in (name_key(n) for n in names) if k]
+    if not keys:
+        return {}
+    projection = {"name": 1, "name_key": 1, "role": 1, **{f: 1 for f in SOURCE_FIELDS}}
+    return {d["name_key"]: d for d in db.employees.find({"name_key": {"$in": keys}}, projection)}
+
+class _Run:
+    """State shared by the batches of one import."""
+
+    def __init__(self, db, procs: ProcessPoolExecutor, threads: ThreadPoolExecutor):
+        self.db = db
+        self.fs = GridFS(db)
+        self.procs = procs
+        self.threads = threads
+        self.names: Dict[str, str] = {}  # lowercased employee name -> first file with it
+        self.files = self.created = self.updated = self.reused = self.written = 0
+        self.failed: List[Dict[str, str]] = []
+        self.timings = {"extract": 0.0, "extract_cpu": 0.0, "store_parse": 0.0, "write": 0.0}
+
+    def fail(self, label: str, error: Any) -> None:
+        self.failed.append({"file": label, "error": str(error)})
+
+    def batch(self, sources: List[Tuple[str, Any]]) -> None:
+        db = self.db
+        t0 = time.perf_counter()
+        self.files += len(sources)
+        for label, src in sources:
+            if isinstance(src, Exception):
+                self.fail(label, src)
+        sources = [(l, s) for l, s in sources if not isinstance(s, Exception)]
+
+        # 1. content hashes: extract each new content once
+        hashes = {label: _digest(src) for label, src in sources}
+        known = known_extractions(db, list(hashes.values()))
+        pending: Dict[str, Tuple[str, Any]] = {}
+        for label, src in sources:
+            if hashes[label] not in known:
+                pending.setdefault(hashes[label], (label, src))
+
+        # 2. extraction (process pool)
+        texts: Dict[str, str] = {}  # sha256 -> text
+        errors: Dict[str, str] = {}  # sha256 -> error
+        if pending:
+            by_label = {label: sha for sha, (label, _) in pending.items()}
+            for label, text, error, ms in self.procs.map(_extract, pending.values(), chunksize=4):
+                self.timings["extract_cpu"] += ms
+                if error:
+                    errors[by_label[label]] = error
+                else:
+                    texts[by_label[label]] = text
+        t_extract = time.perf_counter()
+
+        # 3. target employees: existing by name, new otherwise (one per name)
+        todo: List[Tuple[str, Any, str]] = []
+        for label, src in sources:
+            if hashes[label] in errors:
+                self.fail(label, errors[hashes[label]])
+                continue
+            name = name_from_filename(label)
+            key = name.lower()
+            if not key:
+                self.fail(label, "can't derive an employee name from the file name")
+            elif key in self.names:
+                self.fail(label, f"same employee name as {self.names[key]}")
+            else:
+                self.names[key] = label
+                todo.append((label, src, name))
+        existing = _existing(db, [name for _, _, name in todo])
+
+        # 4. store + parse (threads: GridFS / Gemini are I/O), once per content
+        def parse(sha: str):
+            try:
+                return sha, extract_resume(db, sha, lambda: texts[sha], entry=known.get(sha)), None
+            except Exception as e:
+                return sha, None, str(e)
+
+        def store(item: Tuple[str, Any, str]):
+            label, src, name = item
+            try:
+                return label, self.fs.put(_read(src), filename=os.path.basename(label),
+                                          contentType="application/pdf", uploadDate=datetime.utcnow(),
+                                          sha256=hashes[label]), None
+            except Exception as e:
+                return label, None, str(e)
+
+        results = {sha: (res, error) for sha, res, error in
+                   self.threads.map(parse, dict.fromkeys(hashes[label] for label, _, _ in todo))}
+        stored = {label: (fid, error) for label, fid, error in self.threads.map(store, todo)}
+        t_parse = time.perf_counter()
+
+        # 5. bulk write
+        ops: List[Any] = []
+        rows: List[Tuple[str, Dict[str, Any], bool]] = []  # (file, doc, created), parallel to ops
+        now = datetime.utcnow()
+        for label, _, name in todo:
+            sha = hashes[label]
+            res, error = results[sha]
+            fid, store_error = stored[label]
+            if error or store_error:
+                self.fail(label, error or store_error)
+                if fid is not None:
+                    self.fs.delete(fid)
+                continue
+            _, extracted, how = res
+            self.reused += how == "reused"
+            fields = {
+                "skills": extracted["skills"],
+                "projects_by_skill": extracted["projects_by_skill"],
+                "projects": extracted["projects"],
+                "previous_experience": extracted["previous_experience"],
+                "cv_file_id": fid,
+                "cv_sha256": sha,
+                "updated_at": now,
+            }
+            old = existing.get(name_key(name))
+            if old is not None:
+                if not old.get("role") and extracted.get("role"):
+                    fields["role"] = extracted["role"]
+                doc = {**old, **fields}
+                fields["match_features"] = build_match_features(doc)
+                # the text is on the resume_extractions entry (services.resume_text)
+                ops.append(UpdateOne({"_id": old["_id"]}, {"$set": fields, "$unset": {"resume_text": ""}}))
+            else:
+                doc = {
+                    "_id": ObjectId(),
+                    "name": name,
+                    "name_key": name_key(name),
+                    "role": extracted.get("role") or None,
+                    **fields,
+                    "availability": extracted.get("availability"),
+                    "availability_dates": [],
+                    "availability_spans": [],
+                    "cv_url": None,
+                    "portfolio_url": None,
+                    "created_at": now,
+                }
+                doc["match_features"] = build_match_features(doc)
+                ops.append(InsertOne(doc))
+            rows.append((label, doc, old is None))
+        failed_ops: Dict[int, str] = {}
+        if ops:
+            try:
+                db.employees.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                failed_ops = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+        docs = []
+        for i, (label, doc, created) in enumerate(rows):
+            if i in failed_ops:
+                self.fail(label, failed_ops[i])
+                self.fs.delete(doc["cv_file_id"])
+                continue
+            docs.append(doc)
+            self.created += created
+            self.updated += not created
+        for doc in docs:
+            skill_index.add(doc)
+        text_index.index_employees(db, docs)
+        search_index.index_employees(docs)
+        link_files(db, {d["cv_file_id"]: d["cv_sha256"] for d in docs})
+        if docs:
+            versions.bump(db, versions.EMPLOYEES)
+        self.written += len(docs)
+        t_end = time.perf_counter()
+
+        self.timings["extract"] += (t_extract - t0) * 1000
+        self.timings["store_parse"] += (t_parse - t_extract) * 1000
+        self.timings["write"] += (t_end - t_parse) * 1000
+
+def import_resumes(db, path_or_zip: Any, processes: Optional[int] = None) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    workers = max(1, processes or Config.BULK_IMPORT_PROCESSES or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as procs, \
+            ThreadPoolExecutor(max_workers=max(Config.GEMINI_MAX_CONCURRENCY, 1)) as threads:
+        run = _Run(db, procs, threads)
+        for sources in chunked(iter_sources(path_or_zip, Config.BULK_IMPORT_MAX_FILES), Config.BULK_IMPORT_BATCH):
+            run.batch(sources)
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "files": run.files,
+        "created": run.created,
+        "updated": run.updated,
+        "reused": run.reused,
+        "failed": run.failed,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "files_per_s": round(run.written / elapsed, 2) if elapsed > 0 else None,
+        "timings_ms": {k: round(v, 1) for k, v in run.timings.items()},
+    }
@@ -0,0 +1,290 @@
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+import hashlib
+import logging
+
+from bson import ObjectId
+from gridfs import GridFS
+from pymongo import ReturnDocument, UpdateOne
+
+from utils.pdf import extract_text_from_pdf_bytes
+from services.gemini_client import gemini_client
+from services.resume_parser import EXTRACT_PROMPT_VERSION, HEURISTIC_VERSION, parse_resume
+from services.skill_index import skill_index
+from services import text_index
+from services import search_index
+from services import versions
+from services.match_features import build_match_features, match_features_update
+from services.resume_text import pack_text, stored_text
+
+log = logging.getLogger(__name__)
+
+# ------------------ Resume -> Employee ------------------
+#
+# The write half of the resume pipeline: resolve which employee an upload is
+# for, pull the text out of the stored file, and create / update the
+# employee from the parsed fields (keeping the skill / text indexes, match
+# features and version counters current). Used by the upload route, the
+# async resume jobs and the bulk importer.
+#
+# Uploads are copied into GridFS chunk by chunk; the same pass computes the
+# SHA-256 (stored as `sha256` on the GridFS file and `cv_sha256` on the
+# employee) and spools PDFs for extraction, so the bytes never have to be
+# read back from Mongo. Extraction results are remembered per content hash
+# in `resume_extractions`; see extract_resume().
+
+class ResumeTargetError(ValueError):
+    """The upload names no employee, or one that doesn't exist (HTTP status in .status)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+def resolve_target(db, employee_id: Optional[str], name: str) -> Optional[ObjectId]:
+    """ObjectId of the employee to update, None to create one named `name`."""
+    if employee_id:
+        try:
+            oid = ObjectId(str(employee_id))
+        except Exception:
+            raise ResumeTargetError("Invalid employee_id")
+        if db.employees.count_documents({"_id": oid}, limit=1) == 0:
+            raise ResumeTargetError("employee_id not found", 404)
+        return oid
+    if not name:
+        raise ResumeTargetError("Missing 'employee_id' (update) or 'name' (create).")
+    return None
+
+def is_pdf(filename: str, mimetype: str) -> bool:
+    return (filename or "").lower().endswith(".pdf") or mimetype == "application/pdf"
+
+def text_from_bytes(data: Any, filename: str, mimetype: str) -> str:
+    """Extracted text of the bytes / binary file (pdf only; other types give "")."""
+    if not is_pdf(filename, mimetype):
+        return ""
+    try:
+        return extract_text_from_pdf_bytes(data) or ""
+    except Exception as ex:
+        log.warning("PDF extract failed: %s", ex)
+        return ""
+
+# ------------------ Streaming Store + Content Hash ------------------
+
+_CHUNK = 256 * 1024
+_SPOOL_MAX = 8 * 1024 * 1024  # spooled PDFs bigger than this go to a temp file
+
+def store_upload(db, stream: BinaryIO, filename: str, mimetype: str,
+                 keep: bool = True) -> Tuple[Any, str, Optional[SpooledTemporaryFile]]:
+    """
+    Copy `stream` into GridFS, hashing it on the way. Returns (file id,
+    sha256 hex, spool): with keep=True a PDF is also teed into a spooled
+    temp file (rewound, caller closes it) for extraction; otherwise None.
+    """
+    sha = hashlib.sha256()
+    spool = SpooledTemporaryFile(max_size=_SPOOL_MAX) if keep and is_pdf(filename, mimetype) else None
+    grid_in = GridFS(db).new_file(filename=filename, contentType=mimetype, uploadDate=datetime.utcnow())
+    try:
+        while True:
+            chunk = stream.read(_CHUNK)
+            if not chunk:
+                break
+            sha.update(chunk)
+            grid_in.write(chunk)
+            if spool is not None:
+                spool.write(chunk)
+        grid_in.sha256 = sha.hexdigest()
+        grid_in.close()
+    except Exception:
+        grid_in.abort()
+        if spool is not None:
+            spool.close()
+        raise
+    if spool is not None:
+        spool.seek(0)
+    return grid_in._id, sha.hexdigest(), spool
+
+# ------------------ Extraction Reuse ------------------
+#
+# resume_extractions: {_id: sha256, text_z (zlib), text_len, file_ids
+# (GridFS files with this content), extracted, source, prompt_version,
+# heuristic_version, created_at, last_used, hits}. For content seen before
+# the PDF step is always skipped (the text is stored); the parsed fields are
+# reused when they came from Gemini with the current EXTRACT_PROMPT_VERSION,
+# or when they came from the current HEURISTIC_VERSION and Gemini is off
+# (the result would be the same).
+# A heuristic result is re-parsed once Gemini is back. The stored text is
+# also what `manage.py reparse-resumes` re-parses (services.resume_reparse),
+# and the only copy of it for employees with a cv_sha256 (services.resume_text).
+
+def ensure_indexes(db) -> None:
+    db.resume_extractions.create_index("file_ids")
+
+def reusable(entry: Dict[str, Any]) -> bool:
+    if entry.get("source") == "gemini":
+        return entry.get("prompt_version") == EXTRACT_PROMPT_VERSION
+    return entry.get("heuristic_version") == HEURISTIC_VERSION and not gemini_client.enabled()
+
+def known_extractions(db, hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Stored extractions for the given content hashes, by hash."""
+    if not hashes:
+        return {}
+    return {d["_id"]: d for d in db.resume_extractions.find({"_id": {"$in": list(set(hashes))}})}
+
+def remember_extraction(db, sha256: str, text: str, extracted: Dict[str, Any], source: str,
+                        file_id: Any = None) -> None:
+    now = datetime.utcnow()
+    update: Dict[str, Any] = {
+        "$set": {**pack_text(text), "extracted": extracted, "source": source,
+                 "prompt_version": EXTRACT_PROMPT_VERSION, "heuristic_version": HEURISTIC_VERSION,
+                 "created_at": now, "last_used": now},
+        "$unset": {"text": ""},
+        "$setOnInsert": {"hits": 0},
+    }
+    if file_id is not None:
+        update["$addToSet"] = {"file_ids": file_id}
+    db.resume_extractions.update_one({"_id": sha256}, update, upsert=True)
+
+def link_files(db, files: Dict[Any, str]) -> None:
+    """Record {GridFS file id: sha256} on the stored extractions."""
+    if files:
+        db.resume_extractions.bulk_write(
+            [UpdateOne({"_id": sha}, {"$addToSet": {"file_ids": fid}}) for fid, sha in files.items()],
+            ordered=False,
+        )
+
+def extract_resume(db, sha256: Optional[str], read_text: Callable[[], str],
+                   entry: Optional[Dict[str, Any]] = None,
+                   on_parse: Optional[Callable[[], None]] = None,
+                   file_id: Any = None) -> Tuple[str, Dict[str, Any], str]:
+    """
+    (text, extracted, how) for the content with hash `sha256` (stored as
+    GridFS file `file_id`); `read_text` does the PDF step when the text isn't
+    known yet, `on_parse` is called before parsing. how is "reused" (nothing
+    ran), "reparsed" (stored text, fresh parse) or "parsed".
+    """
+    if sha256 and entry is None:
+        entry = db.resume_extractions.find_one({"_id": sha256})
+    if entry is not None:
+        text = stored_text(entry)
+        if reusable(entry):
+            update: Dict[str, Any] = {"$set": {"last_used": datetime.utcnow()}, "$inc": {"hits": 1}}
+            if file_id is not None:
+                update["$addToSet"] = {"file_ids": file_id}
+            db.resume_extractions.update_one({"_id": sha256}, update)
+            return text, entry["extracted"], "reused"
+        how = "reparsed"
+    else:
+        text = read_text()
+        how = "parsed"
+    if on_parse is not None:
+        on_parse()
+    extracted, source = parse_resume(text, db)
+    if sha256:
+        remember_extraction(db, sha256, text, extracted, source, file_id)
+    return text, extracted, how
+
+# ------------------ Employee Write ------------------
+#
+# Employees also carry `name_key` (the name stripped and lowercased, indexed)
+# so the bulk importer can find them by name case-insensitively without a
+# regex scan; every write path that sets a name sets it.
+
+def name_key(name: Any) -> Optional[str]:
+    return str(name or "").strip().lower() or None
+
+def backfill_name_keys(db, batch_size: int = 500) -> int:
+    """(Re)compute employees.name_key from name. Returns the number updated."""
+    ops: List[UpdateOne] = []
+    updated = 0
+    for doc in db.employees.find({}, {"name": 1}).batch_size(batch_size):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"name_key": name_key(doc.get("name"))}}))
+        if len(ops) >= batch_size:
+            updated += db.employees.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += db.employees.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+def save_employee(db, extracted: Dict[str, Any], fid: Any, text: str,
+                  oid: Optional[ObjectId] = None, name: str = "", role: str = "",
+                  new_id: Optional[ObjectId] = None, sha256: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Apply parsed resume fields to employee `oid`, or create employee `name`
+    (with _id `new_id` when given). Returns the document. The text is only
+    stored on the employee without a `sha256` (otherwise it is on the
+    resume_extractions entry).
+    """
+    text_field = {} if sha256 else {"resume_text": text}
+    if oid is not None:
+        update = {
+            "skills": extracted["skills"],
+            "projects_by_skill": extracted["projects_by_skill"],
+            "projects": extracted["projects"],  # flattened for UI compatibility
+            "previous_experience": extracted["previous_experience"],
+            **text_field,
+            "cv_file_id": fid,
+            "cv_sha256": sha256,
+            "updated_at": datetime.utcnow(),
+        }
+        update.update(match_features_update(update))
+        # drop the copy an earlier upload left on the employee
+        unset = {} if text_field else {"$unset": {"resume_text": ""}}
+        # the role is only filled in where it's empty: the first update
+        # matches only such employees (one round trip, the usual case after a
+        # first upload), the plain update covers employees that have a role
+        new_role = extracted.get("role") or (role or None)
+        doc = None
+        if new_role:
+            doc = db.employees.find_one_and_update({"_id": oid, "role": {"$in": [None, ""]}},
+                                                   {"$set": {**update, "role": new_role}, **unset},
+                                                   return_document=ReturnDocument.AFTER)
+        if doc is None:
+            doc = db.employees.find_one_and_update({"_id": oid}, {"$set": update, **unset},
+                                                   return_document=ReturnDocument.AFTER)
+        if doc is None:
+            raise ResumeTargetError("employee_id not found", 404)
+    else:
+        doc = {
+            "name": name,
+            "name_key": name_key(name),
+            "role": (role or extracted.get("role")) or None,
+            "skills": extracted["skills"],
+            "projects_by_skill": extracted["projects_by_skill"],
+            "projects": extracted["projects"],
+            "previous_experience": extracted["previous_experience"],
+            "availability": extracted.get("availability"),
+            "availability_dates": [],
+            "availability_spans": [],
+            **text_field,
+            "cv_file_id": fid,
+            "cv_sha256": sha256,
+            "cv_url": None,
+            "portfolio_url": None,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+        doc["match_features"] = build_match_features(doc)
+        if new_id is not None:
+            doc["_id"] = new_id
+        res = db.employees.insert_one(doc)
+        doc["_id"] = res.inserted_id
+    skill_index.add(doc)
+    text_index.index_employee(db, doc)
+    search_index.index_employee(doc)
+    versions.bump(db, versions.EMPLOYEES)
+    return doc
+
+def employee_public(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name"),
+        "role": doc.get("role"),
+        "skills": doc.get("skills", []),
+        "projects_by_skill": doc.get("projects_by_skill", {}),
+        "projects": doc.get("projects", []),
+        "previous_experience": doc.get("previous_experience", []),
+        "availability": doc.get("availability"),
+        "availability_dates": doc.get("availability_dates", []),
+        "cv_file_id": str(doc.get("cv_file_id")) if doc.get("cv_file_id") else None,
+        "cv_sha256": doc.get("cv_sha256"),
+    }
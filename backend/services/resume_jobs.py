@@ -0,0 +1,220 @@
+from typing import Any, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import BoundedSemaphore, Event, Thread
+import logging
+import multiprocessing
+import os
+import socket
+
+from bson import ObjectId
+from gridfs import GridFS
+from pymongo import ReturnDocument
+
+from config import Config
+from utils.pdf import extract_text_from_pdf_bytes
+from services.resume_ingest import employee_public, extract_resume, is_pdf, save_employee, text_from_bytes
+
+log = logging.getLogger(__name__)
+
+# ------------------ Async Resume Jobs ------------------
+#
+# POST /resume/upload?async=true stores the file in GridFS, inserts a job in
+# `resume_jobs` and answers 202; a background runner then does extraction,
+# parsing and the employee write. Job state lives in Mongo:
+#   status   queued -> running -> done | failed
+#   stage    progress inside "running" (extracting, parsing, saving)
+#   extraction  "parsed", or "reused" / "reparsed" for content seen before
+#   attempts how many times a runner claimed it
+# Runners claim jobs with an atomic find_one_and_update, so any number of
+# app processes can share the queue. A job whose runner died (no progress for
+# RESUME_JOB_STALE_S) is put back in the queue, up to RESUME_JOB_MAX_ATTEMPTS
+# claims, which is also what picks up jobs left over by a restart. Finished
+# jobs are kept for RESUME_JOB_RETENTION_DAYS (TTL index). Content parsed
+# before (same sha256) reuses that extraction and skips straight to saving.
+#
+# RESUME_JOB_EXECUTOR=process runs the PDF extraction (CPU-bound, holds the
+# GIL) in a process pool; Mongo and Gemini I/O stay on the runner threads.
+
+def ensure_indexes(db) -> None:
+    db.resume_jobs.create_index([("status", 1), ("created_at", 1)])
+    db.resume_jobs.create_index("finished_at", expireAfterSeconds=Config.RESUME_JOB_RETENTION_DAYS * 86400)
+
+def create_job(db, file_id: Any, filename: str, mimetype: str,
+               employee_oid: Optional[ObjectId], name: str, role: str,
+               sha256: Optional[str] = None) -> ObjectId:
+    now = datetime.utcnow()
+    return db.resume_jobs.insert_one({
+        "status": "queued",
+        "stage": "stored",
+        "file_id": file_id,
+        "filename": filename,
+        "mimetype": mimetype,
+        "sha256": sha256,
+        "employee_id": employee_oid,
+        # _id for the employee a create job makes, so a retried job finds it
+        "new_employee_id": ObjectId() if employee_oid is None else None,
+        "name": name,
+        "role": role,
+        "attempts": 0,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }).inserted_id
+
+def job_public(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc["_id"]),
+        "status": doc.get("status"),
+        "stage": doc.get("stage"),
+        "attempts": doc.get("attempts", 0),
+        "filename": doc.get("filename"),
+        "file_id": str(doc.get("file_id")) if doc.get("file_id") else None,
+        "extraction": doc.get("extraction"),
+        "result": doc.get("result"),
+        "error": doc.get("error"),
+        "timings_ms": doc.get("timings_ms"),
+        "created_at": doc.get("created_at"),
+        "started_at": doc.get("started_at"),
+        "finished_at": doc.get("finished_at"),
+    }
+
+class ResumeJobRunner:
+    def __init__(self, db, workers: int, executor: str = "thread"):
+        self.db = db
+        self.workers = max(int(workers), 1)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._slots = BoundedSemaphore(self.workers)
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="resume-job")
+        self._pdf_pool = None
+        if executor == "process":
+            self._pdf_pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        self._wake = Event()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = Thread(target=self._loop, name="resume-job-dispatch", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self) -> None:
+        """A job was queued; don't wait for the next poll."""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.requeue_stale()
+                while self._slots.acquire(blocking=False):
+                    job = self.claim()
+                    if job is None:
+                        self._slots.release()
+                        break
+                    self._threads.submit(self._run_slot, job)
+            except Exception as e:
+                log.error("resume job dispatch failed: %s", e)
+            self._wake.wait(Config.RESUME_JOB_POLL_S)
+            self._wake.clear()
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return self.db.resume_jobs.find_one_and_update(
+            {"status": "queued"},
+            {"$set": {"status": "running", "stage": "claimed", "worker": self.worker_id,
+                      "started_at": now, "updated_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def requeue_stale(self) -> int:
+        """Put jobs whose runner stopped making progress back in the queue (or fail them)."""
+        cutoff = datetime.utcnow() - timedelta(seconds=Config.RESUME_JOB_STALE_S)
+        stale = {"status": "running", "updated_at": {"$lt": cutoff}}
+        self.db.resume_jobs.update_many(
+            {**stale, "attempts": {"$gte": Config.RESUME_JOB_MAX_ATTEMPTS}},
+            {"$set": {"status": "failed", "error": "worker stopped responding",
+                      "finished_at": datetime.utcnow()}},
+        )
+        return self.db.resume_jobs.update_many(
+            stale, {"$set": {"status": "queued", "stage": "requeued", "updated_at": datetime.utcnow()}},
+        ).modified_count
+
+    def _set(self, job: Dict[str, Any], fields: Dict[str, Any]) -> None:
+        # only while we still own the job (it may have been requeued meanwhile)
+        fields["updated_at"] = datetime.utcnow()
+        self.db.resume_jobs.update_one({"_id": job["_id"], "worker": self.worker_id, "status": "running"},
+                                       {"$set": fields})
+
+    def _run_slot(self, job: Dict[str, Any]) -> None:
+        try:
+            self.run(job)
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def run(self, job: Dict[str, Any]) -> None:
+        t0 = datetime.utcnow()
+        timings: Dict[str, float] = {}
+
+        def lap(name: str, since: datetime) -> datetime:
+            now = datetime.utcnow()
+            timings[name] = round((now - since).total_seconds() * 1000, 1)
+            return now
+
+        try:
+            mark = [t0]
+
+            def parsing() -> None:
+                mark[0] = lap("extract", mark[0])
+                self._set(job, {"stage": "parsing"})
+
+            self._set(job, {"stage": "extracting"})
+            text, extracted, how = extract_resume(self.db, job.get("sha256"), lambda: self._extract(job),
+                                                  on_parse=parsing, file_id=job["file_id"])
+            t = lap("parse" if how != "reused" else "reuse", mark[0])
+
+            self._set(job, {"stage": "saving"})
+            oid, new_id = job.get("employee_id"), job.get("new_employee_id")
+            if oid is None and new_id is not None and self.db.employees.count_documents({"_id": new_id}, limit=1):
+                oid = new_id  # retried create job: its employee already exists
+            doc = save_employee(self.db, extracted, job["file_id"], text,
+                                oid, job.get("name") or "", job.get("role") or "",
+                                new_id=new_id, sha256=job.get("sha256"))
+            lap("save", t)
+            self._set(job, {"status": "done", "stage": "done", "extraction": how, "timings_ms": timings,
+                            "result": {"employee": employee_public(doc)}, "finished_at": datetime.utcnow()})
+        except Exception as e:
+            log.warning("resume job %s failed: %s", job["_id"], e)
+            self._set(job, {"status": "failed", "error": str(e), "timings_ms": timings,
+                            "finished_at": datetime.utcnow()})
+
+    def _extract(self, job: Dict[str, Any]) -> str:
+        filename, mimetype = job.get("filename") or "", job.get("mimetype") or ""
+        if not is_pdf(filename, mimetype):
+            return ""
+        data = GridFS(self.db).get(job["file_id"]).read()
+        if self._pdf_pool is None:
+            return text_from_bytes(data, filename, mimetype)
+        try:
+            return self._pdf_pool.submit(extract_text_from_pdf_bytes, data, workers=0, isolate=False).result() or ""
+        except Exception as ex:
+            log.warning("PDF extract failed: %s", ex)
+            return ""
+
+runner: Optional[ResumeJobRunner] = None
+
+def start_runner(db) -> Optional[ResumeJobRunner]:
+    """Start this process's job runner (no-op when RESUME_JOB_WORKERS is 0)."""
+    global runner
+    if runner is None and Config.RESUME_JOB_WORKERS > 0:
+        runner = ResumeJobRunner(db, Config.RESUME_JOB_WORKERS, Config.RESUME_JOB_EXECUTOR)
+        runner.start()
+    return runner
@@ -0,0 +1,233 @@
+from typing import Any, Dict, Tuple
+from utils.skill_matcher import group_matcher
+from config import Config
+from services.gemini_client import gemini_client
+from services.llm_cache import llm_cache
+import json, re
+
+# ------------------ Resume Parsing ------------------
+#
+# Resume text -> {skills, projects_by_skill, projects, previous_experience,
+# role, availability}: Gemini when it is enabled and answers in time,
+# otherwise a keyword heuristic. Shared by the upload route, the async
+# resume jobs and the bulk importer.
+
+def json_from_text(txt: str):
+    """
+    Extract first JSON object from a text response if the model adds prose.
+    """
+    if not txt:
+        return None
+    # Find the first {...} block
+    m = re.search(r"\{[\s\S]*\}", txt)
+    if not m:
+        return None
+    try:
+        return json.loads(m.group(0))
+    except Exception:
+        return None
+
+def normalize_extracted(raw: dict):
+    """
+    Coerce Gemini (or heuristic) output into our canonical shape:
+      skills: list[str]
+      projects_by_skill: dict[str, list[str]]
+      previous_experience: list[{company, title, duration}]
+      role: str|None
+      availability: str|None
+
+    Also produce a flattened:
+      projects: list[str]   # e.g., ["Django — Online Exam Portal", ...]
+    """
+    skills = []
+    pbs = {}    # projects_by_skill
+    prev = []   # previous_experience
+    role = None
+    availability = None
+
+    if not isinstance(raw, dict):
+        raw = {}
+
+    # skills
+    if isinstance(raw.get("skills"), list):
+        skills = [str(s).strip() for s in raw["skills"] if str(s).strip()]
+
+    # projects_by_skill
+    if isinstance(raw.get("projects_by_skill"), dict):
+        for k, v in raw["projects_by_skill"].items():
+            key = str(k).strip()
+            if not key:
+                continue
+            vals = []
+            if isinstance(v, list):
+                vals = [str(x).strip() for x in v if str(x).strip()]
+            elif isinstance(v, str) and v.strip():
+                vals = [v.strip()]
+            if vals:
+                pbs[key] = vals
+
+    # fallback: some models return only projects[] -> try to infer with skills
+    if not pbs and isinstance(raw.get("projects"), list) and skills:
+        # bucket: if project line contains the skill (or a lexicon synonym)
+        pbs = {s: [] for s in skills}
+        matcher = group_matcher(tuple(skills))
+        for proj in raw["projects"]:
+            p = str(proj).strip()
+            if not p:
+                continue
+            hits = matcher.labels(p.lower())
+            for i in sorted(hits):
+                pbs[skills[i]].append(p)
+            if not hits:
+                # dump to a generic bucket
+                pbs.setdefault("Projects", []).append(p)
+
+    # previous_experience
+    if isinstance(raw.get("previous_experience"), list):
+        for item in raw["previous_experience"]:
+            if not isinstance(item, dict):
+                continue
+            company = str(item.get("company") or "").strip()
+            title = str(item.get("title") or "").strip()
+            duration = str(item.get("duration") or "").strip() or None
+            if company or title:
+                prev.append({"company": company or None, "title": title or None, "duration": duration})
+    # legacy "experience"
+    elif isinstance(raw.get("experience"), list) and not prev:
+        for item in raw["experience"]:
+            if not isinstance(item, dict):
+                continue
+            title = str(item.get("title") or "").strip()
+            duration = str(item.get("duration") or "").strip() or None
+            if title:
+                prev.append({"company": None, "title": title, "duration": duration})
+
+    role = (raw.get("role") or None) if isinstance(raw.get("role"), str) else None
+    availability = (raw.get("availability") or None) if isinstance(raw.get("availability"), str) else None
+
+    # flattened projects array for existing UI compatibility
+    projects_flat = []
+    if pbs:
+        for skill, plist in pbs.items():
+            for proj in plist:
+                projects_flat.append(f"{skill} — {proj}")
+    elif isinstance(raw.get("projects"), list):
+        projects_flat = [str(x).strip() for x in raw["projects"] if str(x).strip()]
+
+    # compact unique
+    def uniq(seq):
+        out = []
+        seen = set()
+        for x in seq:
+            if x not in seen:
+                seen.add(x)
+                out.append(x)
+        return out
+
+    skills = uniq(skills)[:50]
+    projects_flat = uniq(projects_flat)[:50]
+    # normalize pbs empties
+    pbs = {k: uniq(v)[:20] for k, v in pbs.items() if v}
+
+    return {
+        "skills": skills,
+        "projects_by_skill": pbs,
+        "projects": projects_flat,
+        "previous_experience": prev[:20],
+        "role": role,
+        "availability": availability,
+    }
+
+_TECH_KEYWORDS = ("react", "next", "node", "python", "java", "mongodb", "flask", "django",
+                  "aws", "gcp", "azure", "docker", "kubernetes", "typescript")
+
+def heuristic_parse(text: str):
+    """
+    Very light fallback if Gemini fails completely.
+    """
+    skills, projects, prev = [], [], []
+    tech = group_matcher(_TECH_KEYWORDS)
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    for l in lines:
+        low = l.lower()
+        if tech.search(low):
+            for w in l.replace(",", " ").split():
+                wclean = w.strip("•- ").strip()
+                if wclean and 1 < len(wclean) < 30:
+                    skills.append(wclean)
+        if low.startswith("project") or "project:" in low:
+            projects.append(re.sub(r"^(project\s*:?\s*)", "", l, flags=re.I).strip())
+        if any(x in low for x in ["company", "experience", "worked at", "at "]):
+            prev.append({"company": None, "title": l, "duration": None})
+
+    skills = list(dict.fromkeys(skills))[:50]
+    projects = list(dict.fromkeys(projects))[:20]
+    normalized = normalize_extracted({
+        "skills": skills,
+        "projects": projects,
+        "previous_experience": prev,
+        "role": None,
+        "availability": None,
+    })
+    return normalized
+
+# Bump when the extraction prompt changes (invalidates cached responses).
+EXTRACT_PROMPT_VERSION = 1
+# Bump when heuristic_parse changes (stored heuristic extractions are re-parsed).
+HEURISTIC_VERSION = 1
+
+def gemini_extract(text: str, db=None):
+    """
+    Ask Gemini for strict JSON in a robust schema.
+    Returns None (caller falls back to the heuristic) when Gemini is off,
+    failing, or slower than GEMINI_EXTRACT_TIMEOUT_S. With a db, responses
+    for the same resume text are served from llm_cache.
+    """
+    if not gemini_client.enabled():
+        return None
+
+    prompt = f"""
+You are a senior resume parser. Return STRICT JSON only (no prose).
+Schema:
+{{
+  "skills": string[],  // deduplicated canonical skill names (e.g., "Django", "React", "Python")
+  "projects_by_skill": {{ [skill: string]: string[] }}, // project names for each skill
+  "previous_experience": [{{ "company": string, "title": string, "duration": string }}], // employment history
+  "role": string|null,
+  "availability": string|null
+}}
+
+Guidelines:
+- "projects_by_skill" should map each skill to the project names where that skill was *actually used*.
+- Use concise project names only (e.g., "Online Examination Portal", "Smart Resource Allocation Tool").
+- "previous_experience" should contain real company names and job titles, with brief durations if available.
+- Do not invent facts. If unsure, omit entries.
+- Return ONLY JSON that conforms to the schema above.
+
+---
+RESUME TEXT:
+{text}
+"""
+
+    try:
+        model = gemini_client.model_name()
+        raw_txt = llm_cache.get(db, "extract", model, EXTRACT_PROMPT_VERSION, text)
+        fresh = raw_txt is None
+        if fresh:
+            raw_txt = gemini_client.generate(prompt, timeout=Config.GEMINI_EXTRACT_TIMEOUT_S)
+        parsed = json_from_text(raw_txt)
+        if not parsed:
+            return None
+        if fresh:
+            llm_cache.put(db, "extract", model, EXTRACT_PROMPT_VERSION, text, raw_txt)
+        return normalize_extracted(parsed)
+    except Exception:
+        return None
+
+
+def parse_resume(text: str, db=None) -> Tuple[Dict[str, Any], str]:
+    """(fields, source): source is "gemini", or "heuristic" when it fell back."""
+    extracted = gemini_extract(text, db)
+    if extracted:
+        return extracted, "gemini"
+    return heuristic_parse(text), "heuristic"
@@ -0,0 +1,226 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+import time
+import uuid
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config import Config
+from services.resume_parser import EXTRACT_PROMPT_VERSION, HEURISTIC_VERSION, parse_resume
+from services.resume_ingest import known_extractions, remember_extraction, reusable, stored_text
+from services import text_index
+from services import versions
+from services.match_features import build_match_features
+
+# ------------------ Corpus Re-parse ------------------
+#
+# After a change to the extraction prompt or the heuristic, re-run the parse
+# step for every employee with a resume, from the text already stored
+# (resume_extractions by cv_sha256, else the legacy employees.resume_text); GridFS
+# files are never downloaded and PDFs never re-extracted. Employees without
+# stored text are counted as no_text and left alone. A stored extraction
+# that is still current (services.resume_ingest.reusable: Gemini with the
+# current prompt version, or the current heuristic version while Gemini is
+# off) isn't parsed again unless force=True; it is only copied to employees that don't have it yet
+# (synced), e.g. a second employee with the same file.
+#
+# Employees are walked in _id order, batch_size at a time; after each batch
+# the last _id and the running counts are saved in `maintenance_checkpoints`,
+# so an interrupted run continues where it stopped (restart=True starts a new
+# pass). Parsing runs on `workers` threads and at most `rate` parses per
+# second start (Gemini quota).
+#
+# One run at a time: a run takes the checkpoint with a conditional update
+# (owner + lease_until) and renews the lease after every batch; a second run
+# fails with ReparseBusy until the first finishes or its lease (REPARSE_LEASE_S)
+# runs out, e.g. after a crash.
+
+CHECKPOINT_ID = "reparse-resumes"
+
+class ReparseBusy(RuntimeError):
+    pass
+
+class _RateLimiter:
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next, now)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+_PARSED_FIELDS = ("skills", "projects_by_skill", "projects", "previous_experience")
+
+def _new_counts() -> Dict[str, int]:
+    return {"scanned": 0, "reparsed": 0, "synced": 0, "current": 0, "no_text": 0, "failed": 0,
+            "parses": 0, "gemini": 0, "heuristic": 0}
+
+def _plan(db, docs: List[Dict[str, Any]], force: bool, counts: Dict[str, int]
+          ) -> Tuple[Dict[Any, Tuple[str, Optional[str]]], Dict[Any, Any], Dict[Any, Dict[str, Any]]]:
+    """
+    For one batch: ({parse key: (text, sha256)}, {employee _id: parse key},
+    {parse key: extracted} for current extractions that only need copying).
+    """
+    entries = known_extractions(db, [d["cv_sha256"] for d in docs if d.get("cv_sha256")])
+    tasks: Dict[Any, Tuple[str, Optional[str]]] = {}
+    keys: Dict[Any, Any] = {}
+    stored: Dict[Any, Dict[str, Any]] = {}
+    for doc in docs:
+        sha = doc.get("cv_sha256")
+        entry = entries.get(sha) if sha else None
+        if entry is not None:
+            if not force and reusable(entry):
+                extracted = entry["extracted"]
+                if all(doc.get(f) == extracted.get(f) for f in _PARSED_FIELDS):
+                    counts["current"] += 1
+                else:
+                    stored[sha] = extracted
+                    keys[doc["_id"]] = sha
+                continue
+            text = stored_text(entry)
+        elif doc.get("resume_text"):
+            text, sha = doc["resume_text"], None
+        else:
+            counts["no_text"] += 1
+            continue
+        key = sha or doc["_id"]  # same content: parsed once
+        tasks.setdefault(key, (text, sha))
+        keys[doc["_id"]] = key
+    return tasks, keys, stored
+
+def _apply(db, docs: List[Dict[str, Any]], keys: Dict[Any, Any], results: Dict[Any, Optional[Dict[str, Any]]],
+           stored: Dict[Any, Dict[str, Any]], counts: Dict[str, int]) -> None:
+    ops: List[UpdateOne] = []
+    changed: List[Dict[str, Any]] = []
+    now = datetime.utcnow()
+    for doc in docs:
+        key = keys.get(doc["_id"])
+        if key is None:
+            continue
+        extracted = stored.get(key) or results.get(key)
+        if extracted is None:
+            counts["failed"] += 1
+            continue
+        counts["synced" if key in stored else "reparsed"] += 1
+        fields = {
+            "skills": extracted["skills"],
+            "projects_by_skill": extracted["projects_by_skill"],
+            "projects": extracted["projects"],
+            "previous_experience": extracted["previous_experience"],
+            "updated_at": now,
+        }
+        if not doc.get("role") and extracted.get("role"):
+            fields["role"] = extracted["role"]
+        doc.update(fields)
+        fields["match_features"] = build_match_features(doc)
+        update: Dict[str, Any] = {"$set": fields}
+        if key == doc.get("cv_sha256") and "resume_text" in doc:
+            # the text is on the resume_extractions entry; drop the old copy
+            update["$unset"] = {"resume_text": ""}
+        ops.append(UpdateOne({"_id": doc["_id"]}, update))
+        changed.append(doc)
+    if not ops:
+        return
+    db.employees.bulk_write(ops, ordered=False)
+    # the servers' skill / search indexes follow the version bump
+    text_index.index_employees(db, changed)
+    versions.bump(db, versions.EMPLOYEES)
+
+def _lease() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=Config.REPARSE_LEASE_S)
+
+def _claim(db, owner: str) -> Dict[str, Any]:
+    """Take the checkpoint for `owner` (created if missing); ReparseBusy if another run holds it."""
+    free = {"$or": [{"owner": None}, {"lease_until": {"$lt": datetime.utcnow()}}]}
+    try:
+        cp = db.maintenance_checkpoints.find_one_and_update(
+            {"_id": CHECKPOINT_ID, **free}, {"$set": {"owner": owner, "lease_until": _lease()}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        cp = None
+    if cp is None:
+        held = db.maintenance_checkpoints.find_one({"_id": CHECKPOINT_ID}) or {}
+        raise ReparseBusy(f"another reparse-resumes run holds the checkpoint until {held.get('lease_until')}")
+    return cp
+
+def _save(db, cp: Dict[str, Any]) -> None:
+    """Write the checkpoint and renew the lease; ReparseBusy if it was taken over."""
+    cp["lease_until"] = _lease()
+    res = db.maintenance_checkpoints.replace_one({"_id": CHECKPOINT_ID, "owner": cp["owner"]}, cp)
+    if res.matched_count == 0:
+        raise ReparseBusy("the checkpoint was taken over by another run (lease expired)")
+
+def reparse_resumes(db, batch_size: int = 100, workers: Optional[int] = None, rate: Optional[float] = None,
+                    force: bool = False, restart: bool = False, limit: Optional[int] = None,
+                    progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Re-parse stored resume text (see above). `limit` stops after that many
+    employees (the checkpoint stays open); `progress` gets the checkpoint
+    after every batch. Returns the final checkpoint.
+    """
+    workers = max(workers or Config.REPARSE_WORKERS or Config.GEMINI_MAX_CONCURRENCY, 1)
+    limiter = _RateLimiter(Config.REPARSE_RATE_PER_S if rate is None else rate)
+    owner = uuid.uuid4().hex
+    cp = _claim(db, owner)
+    if restart or cp.get("status") != "running":
+        cp = {"_id": CHECKPOINT_ID, "owner": owner, "status": "running", "last_id": None, "counts": _new_counts(),
+              "prompt_version": EXTRACT_PROMPT_VERSION, "heuristic_version": HEURISTIC_VERSION,
+              "started_at": datetime.utcnow()}
+    counts = cp["counts"]
+    seen = 0
+
+    def parse(item: Tuple[Any, Tuple[str, Optional[str]]]):
+        key, (text, sha) = item
+        limiter.wait()
+        try:
+            extracted, source = parse_resume(text, db)
+        except Exception:
+            return key, None, None
+        if sha:
+            remember_extraction(db, sha, text, extracted, source)
+        return key, extracted, source
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reparse") as pool:
+            while limit is None or seen < limit:
+                query: Dict[str, Any] = {"cv_file_id": {"$ne": None}}
+                if cp["last_id"] is not None:
+                    query["_id"] = {"$gt": cp["last_id"]}
+                n = batch_size if limit is None else min(batch_size, limit - seen)
+                docs = list(db.employees.find(query, {"match_features": 0}).sort("_id", 1).limit(n))
+                if not docs:
+                    cp["status"] = "done"
+                    cp["finished_at"] = datetime.utcnow()
+                    break
+                tasks, keys, stored = _plan(db, docs, force, counts)
+                results: Dict[Any, Optional[Dict[str, Any]]] = {}
+                for key, extracted, source in pool.map(parse, tasks.items()):
+                    results[key] = extracted
+                    counts["parses"] += 1
+                    if source:
+                        counts[source] += 1
+                _apply(db, docs, keys, results, stored, counts)
+
+                seen += len(docs)
+                counts["scanned"] += len(docs)
+                cp["last_id"] = docs[-1]["_id"]
+                cp["updated_at"] = datetime.utcnow()
+                _save(db, cp)
+                if progress is not None:
+                    progress(cp)
+    finally:
+        # release the lease; a run that lost it leaves the new owner alone
+        cp["owner"] = None
+        cp["lease_until"] = None
+        db.maintenance_checkpoints.replace_one({"_id": CHECKPOINT_ID, "owner": owner}, cp)
+    return cp
@@ -0,0 +1,29 @@
+from typing import Any, Dict, List
+import zlib
+
+from bson import Binary
+
+# ------------------ Stored Resume Text ------------------
+#
+# The text extracted from a resume is stored once, zlib-compressed, on its
+# `resume_extractions` entry (by content sha256). Employees point at it
+# through `cv_sha256`; only employees without one (uploaded before the
+# entries existed, or non-PDF uploads) keep a plain `resume_text`.
+
+def pack_text(text: str) -> Dict[str, Any]:
+    return {"text_z": Binary(zlib.compress(text.encode("utf-8"), 6)), "text_len": len(text)}
+
+def stored_text(entry: Dict[str, Any]) -> str:
+    if entry.get("text_z") is not None:
+        return zlib.decompress(entry["text_z"]).decode("utf-8")
+    return entry.get("text") or ""  # stored before compression
+
+def employee_texts(db, docs: List[Dict[str, Any]]) -> Dict[Any, str]:
+    """Resume text of each employee document, by _id ("" when there is none)."""
+    hashes = list({d["cv_sha256"] for d in docs if d.get("cv_sha256")})
+    entries = {e["_id"]: e for e in db.resume_extractions.find({"_id": {"$in": hashes}})} if hashes else {}
+    out: Dict[Any, str] = {}
+    for d in docs:
+        entry = entries.get(d.get("cv_sha256"))
+        out[d["_id"]] = stored_text(entry) if entry is not None else (d.get("resume_text") or "")
+    return out
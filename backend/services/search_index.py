@@ -0,0 +1,227 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from threading import RLock
+import re
+import unicodedata
+
+from config import Config
+from services import versions
+
+# ------------------ Trigram Search Index ------------------
+#
+# Process-local trigram postings for the `q` search of /employees (name) and
+# /projects (project_name, description), so a search no longer means an
+# unanchored $regex collection scan. Text is normalized (accents stripped,
+# lowercased, punctuation -> space) and every 3-character window of
+# "  " + text + " " is posted. A query then matches
+#   * as a substring: the documents holding all of its trigrams, verified
+#     with `in` (1-2 character queries scan the normalized texts in memory),
+#   * fuzzily, only when there are fewer than _FUZZY_FALLBACK substring
+#     matches: documents holding at least SEARCH_FUZZY_MIN of the query's
+#     padded trigrams (typos, missing letters: "jon smith" -> "John Smith"),
+# and is ranked by relevance: exact text > word prefix > substring > fuzzy,
+# shorter texts first within a tier.
+#
+# Like the skill index, the write paths keep it current (index_* / remove_*)
+# and it is built from Mongo at startup or on first search. Each side
+# remembers the versions.EMPLOYEES / versions.PROJECTS value it was built at
+# and is rebuilt before a search once the shared counter has moved, so
+# documents written by another worker or by manage.py are found too.
+
+_FUZZY_FALLBACK = 10
+
+def normalize(text: Any) -> str:
+    s = unicodedata.normalize("NFKD", str(text or ""))
+    s = "".join(c for c in s if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w]+", " ", s).split())
+
+def _grams(s: str) -> Set[str]:
+    padded = "  " + s + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _inner_grams(s: str) -> Set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+class TrigramIndex:
+    def __init__(self, lock: Optional[RLock] = None):
+        self._lock = lock or RLock()
+        self._postings: Dict[str, Set[Any]] = {}
+        self._text: Dict[Any, str] = {}
+        self.version: Optional[int] = None
+
+    @property
+    def built(self) -> bool:
+        return self.version is not None
+
+    def add(self, doc_id: Any, text: Any) -> None:
+        s = normalize(text)
+        with self._lock:
+            self._drop(doc_id)
+            if not s:
+                return
+            self._text[doc_id] = s
+            for g in _grams(s):
+                self._postings.setdefault(g, set()).add(doc_id)
+
+    def remove(self, doc_id: Any) -> None:
+        with self._lock:
+            self._drop(doc_id)
+
+    def _drop(self, doc_id: Any) -> None:
+        s = self._text.pop(doc_id, None)
+        if s is None:
+            return
+        for g in _grams(s):
+            ids = self._postings.get(g)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._postings[g]
+
+    def rebuild(self, items: Iterable[Tuple[Any, Any]], version: int) -> int:
+        """Replace the postings with `items`, read from Mongo at counter `version`."""
+        with self._lock:
+            self._postings, self._text = {}, {}
+            for doc_id, text in items:
+                self.add(doc_id, text)
+            self.version = version
+            return len(self._text)
+
+    def bumped(self, version: int) -> None:
+        """This process bumped the counter after applying its write here."""
+        with self._lock:
+            if self.version == version - 1:
+                self.version = version
+
+    def search(self, query: Any) -> Dict[Any, float]:
+        """{doc id: score} for every match (see the tiers above)."""
+        q = normalize(query)
+        if not q:
+            return {}
+        out: Dict[Any, float] = {}
+        with self._lock:
+            inner = _inner_grams(q)
+            if inner:
+                lists = sorted((self._postings.get(g, set()) for g in inner), key=len)
+                candidates = set(lists[0]).intersection(*lists[1:])
+            else:
+                candidates = self._text.keys()
+            for doc_id in candidates:
+                text = self._text[doc_id]
+                pos = text.find(q)
+                if pos < 0:
+                    continue
+                tier = 3.0 if text == q else 2.0 if pos == 0 or text[pos - 1] == " " else 1.0
+                out[doc_id] = tier + len(q) / len(text)
+            if not inner or len(out) >= _FUZZY_FALLBACK:
+                return out
+            grams = _grams(q)
+            shared: Dict[Any, int] = {}
+            for g in grams:
+                for doc_id in self._postings.get(g, ()):
+                    shared[doc_id] = shared.get(doc_id, 0) + 1
+            for doc_id, n in shared.items():
+                ratio = n / len(grams)
+                if doc_id not in out and ratio >= Config.SEARCH_FUZZY_MIN:
+                    out[doc_id] = ratio * 0.99
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"built": self.built, "version": self.version, "documents": len(self._text),
+                    "trigrams": len(self._postings)}
+
+employee_names = TrigramIndex()
+# one lock for both project indexes: they are rebuilt together from one read
+_project_lock = RLock()
+project_names = TrigramIndex(_project_lock)
+project_descriptions = TrigramIndex(_project_lock)
+versions.on_bump(versions.EMPLOYEES, employee_names.bumped)
+versions.on_bump(versions.PROJECTS, project_names.bumped)
+versions.on_bump(versions.PROJECTS, project_descriptions.bumped)
+
+def enabled() -> bool:
+    return Config.SEARCH_INDEX_ENABLED
+
+def index_employee(doc: Dict[str, Any]) -> None:
+    employee_names.add(doc["_id"], doc.get("name"))
+
+def index_employees(docs: Iterable[Dict[str, Any]]) -> None:
+    for doc in docs:
+        index_employee(doc)
+
+def remove_employee(emp_id: Any) -> None:
+    employee_names.remove(emp_id)
+
+def index_project(doc: Dict[str, Any]) -> None:
+    project_names.add(doc["_id"], doc.get("project_name"))
+    project_descriptions.add(doc["_id"], doc.get("description"))
+
+def remove_project(project_id: Any) -> None:
+    project_names.remove(project_id)
+    project_descriptions.remove(project_id)
+
+def _rebuild_employees(db) -> int:
+    # the lock is held while reading so a concurrent index_employee() can't
+    # be lost by the rebuild (and then skipped over by bumped())
+    with employee_names._lock:
+        version = versions.get_version(db, versions.EMPLOYEES)
+        return employee_names.rebuild(((d["_id"], d.get("name")) for d in db.employees.find({}, {"name": 1})),
+                                      version)
+
+def _rebuild_projects(db) -> int:
+    with _project_lock:
+        version = versions.get_version(db, versions.PROJECTS)
+        projects = list(db.projects.find({}, {"project_name": 1, "description": 1}))
+        project_descriptions.rebuild(((d["_id"], d.get("description")) for d in projects), version)
+        return project_names.rebuild(((d["_id"], d.get("project_name")) for d in projects), version)
+
+def rebuild(db) -> Dict[str, int]:
+    return {"employees": _rebuild_employees(db), "projects": _rebuild_projects(db)}
+
+def _sync_employees(db) -> None:
+    """Rebuild when never built or when the employees have been written since."""
+    if employee_names.version != versions.get_version(db, versions.EMPLOYEES):
+        _rebuild_employees(db)
+
+def _sync_projects(db) -> None:
+    version = versions.get_version(db, versions.PROJECTS)
+    if project_names.version != version or project_descriptions.version != version:
+        _rebuild_projects(db)
+
+def _ranked(scores: Dict[Any, float]) -> List[Tuple[Any, float]]:
+    return sorted(scores.items(), key=lambda kv: (-kv[1], str(kv[0])))
+
+def search_employees(db, q: str) -> List[Tuple[Any, float]]:
+    """(employee _id, score) best first."""
+    _sync_employees(db)
+    return _ranked(employee_names.search(q))
+
+def search_projects(db, q: str) -> List[Tuple[Any, float]]:
+    """(project _id, score) best first; a name match outweighs a description match."""
+    _sync_projects(db)
+    scores = {k: 2 * v for k, v in project_names.search(q).items()}
+    for k, v in project_descriptions.search(q).items():
+        scores[k] = scores.get(k, 0.0) + v
+    return _ranked(scores)
+
+def relevance_page(collection, query: Dict[str, Any], ranked: List[Tuple[Any, float]], skip: int, limit: int,
+                   projection: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    One page of `ranked` (best SEARCH_MAX_RESULTS) restricted to `query`, in
+    relevance order, each row with its `_score`. Returns (rows, total).
+    """
+    scores = dict(ranked[:Config.SEARCH_MAX_RESULTS])
+    match = {**query, "_id": {"$in": list(scores)}}
+    ids = sorted((d["_id"] for d in collection.find(match, {"_id": 1})), key=lambda i: (-scores[i], str(i)))
+    window = ids[skip:skip + limit]
+    docs = {d["_id"]: d for d in collection.find({"_id": {"$in": window}}, projection)}
+    rows = []
+    for i in window:
+        if i in docs:
+            docs[i]["_score"] = round(scores[i], 4)
+            rows.append(docs[i])
+    return rows, len(ids)
+
+def stats() -> Dict[str, Any]:
+    return {"employees": employee_names.stats(), "project_names": project_names.stats(),
+            "project_descriptions": project_descriptions.stats()}
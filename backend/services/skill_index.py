@@ -0,0 +1,149 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+from threading import RLock
+import re
+
+from services import versions
+from utils.skill_matcher import SKILL_LEXICON, group_matcher, spellings
+
+# ------------------ Inverted Skill Index ------------------
+#
+# Process-local map of canonical (stripped, lowercased) skill -> employee ids.
+# An employee is posted under their skills, their projects_by_skill keys and
+# the skills their flat `projects` lines mention (every word and word pair,
+# plus all spellings of a lexicon skill found in the line), since the scorer
+# also counts project hits from those lines.
+# The write paths (employees CRUD, resume upload) keep it current with
+# add()/remove(). Writes made elsewhere (another worker process, manage.py)
+# are picked up through the shared versions.EMPLOYEES counter: the index
+# remembers the value it was built at and ensure_built() rebuilds it once the
+# counter has moved. Edits made by hand in Mongo bypass the counter; call
+# rebuild(db) or hit POST /match/index/rebuild after those.
+
+def _canon(skill: Any) -> str:
+    return str(skill or "").strip().lower()
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+_LEXICON_TERMS = tuple(SKILL_LEXICON)
+
+def _project_keys(line: Any) -> Set[str]:
+    low = str(line or "").lower()
+    words = [w.rstrip(".") for w in _WORD.findall(low)]
+    keys = set(words)
+    keys.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for i in group_matcher(_LEXICON_TERMS).labels(low):
+        keys.update(spellings(_LEXICON_TERMS[i]))
+    return keys
+
+def employee_skill_keys(doc: Dict[str, Any]) -> Set[str]:
+    """Canonical skill keys an employee is posted under (see above)."""
+    keys = {_canon(s) for s in doc.get("skills", []) or []}
+    keys.update(_canon(k) for k in (doc.get("projects_by_skill") or {}).keys())
+    for p in doc.get("projects", []) or []:
+        keys |= _project_keys(p)
+    keys.discard("")
+    return keys
+
+class SkillIndex:
+    def __init__(self):
+        self._lock = RLock()
+        self._postings: Dict[str, Set[Any]] = {}
+        self._keys_by_emp: Dict[Any, Set[str]] = {}
+        self._version: Optional[int] = None
+
+    @property
+    def built(self) -> bool:
+        return self._version is not None
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        """Insert or replace the postings for one employee document."""
+        emp_id = doc.get("_id")
+        if emp_id is None:
+            return
+        keys = employee_skill_keys(doc)
+        with self._lock:
+            self._drop(emp_id)
+            for k in keys:
+                self._postings.setdefault(k, set()).add(emp_id)
+            self._keys_by_emp[emp_id] = keys
+
+    def remove(self, emp_id: Any) -> None:
+        with self._lock:
+            self._drop(emp_id)
+
+    def _drop(self, emp_id: Any) -> None:
+        for k in self._keys_by_emp.pop(emp_id, ()):
+            ids = self._postings.get(k)
+            if ids is None:
+                continue
+            ids.discard(emp_id)
+            if not ids:
+                del self._postings[k]
+
+    def lookup(self, skills: Iterable[str]) -> Set[Any]:
+        """Union of the postings for the given skills."""
+        out: Set[Any] = set()
+        with self._lock:
+            for s in skills or []:
+                out |= self._postings.get(_canon(s), set())
+        return out
+
+    def rebuild(self, db) -> int:
+        """Reload every posting from Mongo. Returns the number of employees indexed."""
+        # the lock is held while reading so a concurrent add() can't be lost
+        # by the swap below (and then skipped over by bumped())
+        with self._lock:
+            version = versions.get_version(db, versions.EMPLOYEES)
+            postings: Dict[str, Set[Any]] = {}
+            keys_by_emp: Dict[Any, Set[str]] = {}
+            for doc in db.employees.find({}, {"skills": 1, "projects_by_skill": 1, "projects": 1}):
+                emp_id = doc["_id"]
+                keys = employee_skill_keys(doc)
+                for k in keys:
+                    postings.setdefault(k, set()).add(emp_id)
+                keys_by_emp[emp_id] = keys
+            self._postings = postings
+            self._keys_by_emp = keys_by_emp
+            self._version = version
+            return len(keys_by_emp)
+
+    def ensure_built(self, db) -> None:
+        """Rebuild when never built or when the employees have been written since."""
+        if self._version != versions.get_version(db, versions.EMPLOYEES):
+            with self._lock:
+                if self._version != versions.get_version(db, versions.EMPLOYEES):
+                    self.rebuild(db)
+
+    def bumped(self, version: int) -> None:
+        """This process bumped the employees counter after applying its write here."""
+        with self._lock:
+            if self._version == version - 1:
+                self._version = version
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "built": self.built,
+                "version": self._version,
+                "employees": len(self._keys_by_emp),
+                "skills": len(self._postings),
+            }
+
+skill_index = SkillIndex()
+versions.on_bump(versions.EMPLOYEES, skill_index.bumped)
+
+def has_skills(required_skills: List[str]) -> bool:
+    """Whether there is anything to prefilter on (candidate_ids won't return None)."""
+    return any(_canon(s) for s in required_skills or [])
+
+def candidate_ids(db, required_skills: List[str], sync: bool = True) -> Optional[List[Any]]:
+    """
+    Employee ids whose postings intersect the required skills.
+    Returns None when there is nothing to prefilter on (no required skills),
+    meaning the caller should consider every employee. sync=False skips the
+    version check (the caller just made it).
+    """
+    if not has_skills(required_skills):
+        return None
+    if sync or not skill_index.built:
+        skill_index.ensure_built(db)
+    return list(skill_index.lookup(required_skills))
@@ -0,0 +1,246 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from collections import Counter
+from threading import RLock
+import math
+import re
+import zlib
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from config import Config
+from services import match_numpy
+from services import versions
+from services.resume_text import employee_texts
+
+np = match_numpy.np
+
+# ------------------ Text Vector Index ------------------
+#
+# Local, no-network similarity between a project's text (name, description,
+# required skills) and every employee's resume text (services.resume_text;
+# plus role / skills / project lines). A text becomes a hashed TF vector of word unigrams and
+# bigrams (crc32(term), weight 1 + log(count)); TF-IDF weighting is applied
+# at query time from the live document frequencies, so writing one employee
+# never re-encodes the others. Projects are encoded when they are matched.
+#
+# The employee vectors are stored in Mongo (`text_vectors`: {_id: employee
+# _id, t: term hashes, w: weights}) by the employee write paths, so every
+# worker process and manage.py command writes to the same place. Each process
+# keeps a sparse copy in memory (term hashes folded into TEXT_INDEX_DIM
+# columns) and reloads it when versions.EMPLOYEES has moved past the value it
+# was loaded at; its own writes are applied in place.
+#
+# Off unless TEXT_MATCH_WEIGHT > 0: the write paths only store vectors while
+# it is on, so run `manage.py rebuild-text-index` after turning it on.
+# Needs numpy.
+
+_BATCH = 500
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+def tokens(text: str) -> List[str]:
+    return [t.rstrip(".") for t in _TOKEN.findall((text or "").lower())]
+
+def _terms(text: str) -> Counter:
+    toks = tokens(text)
+    terms = Counter(toks)
+    terms.update(f"{a} {b}" for a, b in zip(toks, toks[1:]))
+    return terms
+
+def employee_text(doc: Dict[str, Any]) -> str:
+    """Text of an employee; `resume_text` is filled in by _store (services.resume_text)."""
+    parts: List[str] = [doc.get("role") or ""]
+    parts.extend(str(s) for s in doc.get("skills", []) or [])
+    parts.extend(str(p) for p in doc.get("projects", []) or [])
+    for it in doc.get("previous_experience", []) or []:
+        if isinstance(it, dict):
+            parts.append(" ".join(str(it.get(k) or "") for k in ("title", "company")))
+    parts.append(doc.get("resume_text") or "")
+    return "\n".join(p for p in parts if p)
+
+def project_text(doc: Dict[str, Any]) -> str:
+    parts = [doc.get("project_name") or "", doc.get("description") or ""]
+    parts.extend(str(s) for s in doc.get("required_skills", []) or [])
+    return "\n".join(p for p in parts if p)
+
+def encode(text: str) -> Tuple[Any, Any]:
+    """(term hashes, weights) of a text's TF vector."""
+    terms = _terms(text)
+    t = np.fromiter((zlib.crc32(k.encode("utf-8")) for k in terms), dtype=np.uint32, count=len(terms))
+    w = np.fromiter((1.0 + math.log(c) for c in terms.values()), dtype=np.float32, count=len(terms))
+    return t, w
+
+class EmployeeVectors:
+    """This process's copy of the stored employee vectors."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._lock = RLock()
+        self._rows: Dict[str, Tuple[Any, Any]] = {}   # str(_id) -> (columns, weights)
+        self._version: Optional[int] = None
+        self._packed = None   # flat arrays over all rows, rebuilt after a change
+
+    def _fold(self, t, w) -> Tuple[Any, Any]:
+        cols, inv = np.unique((t % self.dim).astype(np.int32), return_inverse=True)
+        return cols, np.bincount(inv, weights=w, minlength=len(cols)).astype(np.float32)
+
+    # ---------- writes (this process) ----------
+
+    def put(self, key: str, t, w) -> None:
+        row = self._fold(t, w)
+        with self._lock:
+            self._rows[key] = row
+            self._packed = None
+
+    def drop(self, key: str) -> None:
+        with self._lock:
+            if self._rows.pop(key, None) is not None:
+                self._packed = None
+
+    def bumped(self, version: int) -> None:
+        """This process bumped the employees counter after applying its write here."""
+        with self._lock:
+            if self._version == version - 1:
+                self._version = version
+
+    # ---------- loading ----------
+
+    def load(self, db) -> int:
+        """Replace the copy with every stored vector. Returns the number of rows."""
+        # held while reading so a concurrent put() can't be lost by the swap
+        with self._lock:
+            version = versions.get_version(db, versions.EMPLOYEES)
+            rows = {}
+            for d in db.text_vectors.find({}):
+                rows[str(d["_id"])] = self._fold(np.frombuffer(d["t"], dtype=np.uint32),
+                                                 np.frombuffer(d["w"], dtype=np.float32))
+            self._rows, self._packed, self._version = rows, None, version
+            return len(rows)
+
+    def sync(self, db) -> None:
+        """Reload when never loaded or when the employees have been written since."""
+        if self._version != versions.get_version(db, versions.EMPLOYEES):
+            with self._lock:
+                if self._version != versions.get_version(db, versions.EMPLOYEES):
+                    self.load(db)
+
+    # ---------- queries ----------
+
+    def _pack(self):
+        if self._packed is None:
+            ids = list(self._rows)
+            rows = list(self._rows.values())
+            lens = np.fromiter((len(c) for c, _ in rows), dtype=np.int64, count=len(rows))
+            cols = np.concatenate([c for c, _ in rows]) if rows else np.zeros(0, dtype=np.int32)
+            vals = np.concatenate([w for _, w in rows]).astype(np.float64) if rows else np.zeros(0)
+            row_of = np.repeat(np.arange(len(rows)), lens)
+            df = np.bincount(cols, minlength=self.dim)
+            idf2 = (np.log((1.0 + len(rows)) / (1.0 + df)) + 1.0) ** 2
+            # ||row * idf||, the cosine denominators
+            norms = np.sqrt(np.bincount(row_of, weights=vals ** 2 * idf2[cols], minlength=len(rows)))
+            self._packed = (ids, row_of, cols, vals, idf2, norms)
+        return self._packed
+
+    def similarities(self, t, w) -> Tuple[List[str], Any]:
+        """Cosine similarity (TF-IDF weighted) of every row to a query's (hashes, weights)."""
+        with self._lock:
+            ids, row_of, cols, vals, idf2, norms = self._pack()
+            if not ids:
+                return [], None
+            q = np.zeros(self.dim)
+            qc, qw = self._fold(t, w)
+            q[qc] = qw
+            q_norm = math.sqrt(float((q ** 2) @ idf2))
+            if q_norm == 0:
+                return ids, np.zeros(len(ids))
+            dots = np.bincount(row_of, weights=vals * (q * idf2)[cols], minlength=len(ids))
+            denom = norms * q_norm
+            return ids, np.divide(dots, denom, out=np.zeros(len(ids)), where=denom > 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"rows": len(self._rows), "version": self._version, "dim": self.dim}
+
+# ------------------ Module State ------------------
+
+employee_vectors: Optional[EmployeeVectors] = None
+if match_numpy.available():
+    employee_vectors = EmployeeVectors(Config.TEXT_INDEX_DIM)
+    versions.on_bump(versions.EMPLOYEES, employee_vectors.bumped)
+
+def available() -> bool:
+    return employee_vectors is not None
+
+def enabled() -> bool:
+    return available() and Config.TEXT_MATCH_WEIGHT > 0
+
+def raw_id(key: str) -> Any:
+    """Index keys are str(_id); turn one back into the stored _id."""
+    return ObjectId(key) if ObjectId.is_valid(key) else key
+
+def _write(db, batch: List[Tuple[Any, Any, Any]]) -> int:
+    db.text_vectors.bulk_write([ReplaceOne({"_id": i}, {"t": t.tobytes(), "w": w.tobytes()}, upsert=True)
+                                for i, t, w in batch], ordered=False)
+    for i, t, w in batch:
+        employee_vectors.put(str(i), t, w)
+    return len(batch)
+
+def _encode_batch(db, docs: List[Dict[str, Any]]) -> List[Tuple[Any, Any, Any]]:
+    texts = employee_texts(db, docs)
+    return [(d["_id"], *encode(employee_text({**d, "resume_text": texts[d["_id"]]}))) for d in docs]
+
+def _store(db, docs: Iterable[Dict[str, Any]]) -> int:
+    batch: List[Dict[str, Any]] = []
+    n = 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= _BATCH:
+            n += _write(db, _encode_batch(db, batch))
+            batch = []
+    if batch:
+        n += _write(db, _encode_batch(db, batch))
+    return n
+
+def index_employee(db, doc: Dict[str, Any]) -> None:
+    index_employees(db, [doc])
+
+def index_employees(db, docs: Iterable[Dict[str, Any]]) -> None:
+    """Store the vectors of written employee documents (call before versions.bump)."""
+    if enabled():
+        _store(db, docs)
+
+def remove_employee(db, emp_id: Any) -> None:
+    if enabled():
+        db.text_vectors.delete_one({"_id": emp_id})
+        employee_vectors.drop(str(emp_id))
+
+def employee_similarities(db, project: Dict[str, Any]) -> Dict[str, float]:
+    """employee id (str) -> text similarity to the project; empty when disabled."""
+    if not enabled():
+        return {}
+    employee_vectors.sync(db)
+    ids, sims = employee_vectors.similarities(*encode(project_text(project)))
+    if sims is None:
+        return {}
+    return {i: float(s) for i, s in zip(ids, sims) if s > 0}
+
+def rebuild(db) -> int:
+    """Re-encode every employee from Mongo and drop vectors of deleted ones."""
+    if not available():
+        return 0
+    fields = {"role": 1, "skills": 1, "projects": 1, "previous_experience": 1, "resume_text": 1, "cv_sha256": 1}
+    seen: List[Any] = []
+
+    def docs():
+        for d in db.employees.find({}, fields).batch_size(_BATCH):
+            seen.append(d["_id"])
+            yield d
+
+    n = _store(db, docs())
+    db.text_vectors.delete_many({"_id": {"$nin": seen}})
+    # every process reloads (and cached /match results are recomputed)
+    versions.bump(db, versions.EMPLOYEES)
+    return n
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": enabled(), **(employee_vectors.stats() if available() else {})}
@@ -0,0 +1,43 @@
+from typing import Callable, Dict, Iterable, List
+
+from pymongo import ReturnDocument
+
+# ------------------ Collection Version Counters ------------------
+#
+# One monotonically increasing counter per logical data set, stored in the
+# `versions` collection ({_id: name, v: int}) so every worker process sees the
+# same value. Writers bump(); readers fold the counters into cache keys, so a
+# write anywhere invalidates results computed from the old data.
+#
+# The in-process indexes (skill, search, text) remember the counter they were
+# built at and rebuild when it has moved. on_bump() listeners hear this
+# process's own bumps, so an index that already applied the write (the write
+# paths update it before bumping) can move to the new value without a
+# rebuild.
+
+EMPLOYEES = "employees"
+PROJECTS = "projects"
+ALLOCATIONS = "allocations"
+
+_listeners: Dict[str, List[Callable[[int], None]]] = {}
+
+def on_bump(name: str, listener: Callable[[int], None]) -> None:
+    """Call listener(new value) after every bump of `name` made by this process."""
+    _listeners.setdefault(name, []).append(listener)
+
+def bump(db, *names: str) -> None:
+    for name in names:
+        doc = db.versions.find_one_and_update({"_id": name}, {"$inc": {"v": 1}}, upsert=True,
+                                              return_document=ReturnDocument.AFTER)
+        for listener in _listeners.get(name, ()):
+            listener(int(doc["v"]))
+
+def get_versions(db, names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    out = {n: 0 for n in names}
+    for doc in db.versions.find({"_id": {"$in": names}}):
+        out[doc["_id"]] = int(doc.get("v") or 0)
+    return out
+
+def get_version(db, name: str) -> int:
+    return get_versions(db, [name])[name]
@@ -0,0 +1,75 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# ------------------ Bulk PATCH ------------------
+#
+# PATCH /employees and /projects take a list of {"id": ..., "changes": {...}}
+# and apply every valid item in one unordered bulk_write, then read the
+# written documents back with one find (for the response and the in-process
+# indexes): two round trips for the whole list instead of two per item.
+# Items fail individually (bad id, empty changes, same id twice, not found,
+# write error) without stopping the others.
+
+def _oid(s: Any) -> Optional[ObjectId]:
+    try:
+        return ObjectId(str(s))
+    except Exception:
+        return None
+
+def parse_items(body: Any) -> Optional[List[Any]]:
+    """The item list of a bulk PATCH body: a bare list or {"items": [...]}."""
+    items = body.get("items") if isinstance(body, dict) else body
+    return items if isinstance(items, list) else None
+
+def apply_patches(collection, items: List[Any], changes_of: Callable[[Dict[str, Any]], Dict[str, Any]]
+                  ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    (per-item results in item order, documents as written). A result is
+    {"id", "ok": True, "doc"} or {"id", "ok": False, "error"}; changes_of
+    turns an item's changes into its $set.
+    """
+    results: List[Dict[str, Any]] = []
+    ops: List[UpdateOne] = []
+    pending: List[Tuple[int, ObjectId]] = []
+    seen = set()
+    for item in items:
+        raw_id = item.get("id") if isinstance(item, dict) else None
+        oid = _oid(raw_id) if raw_id is not None else None
+        changes = item.get("changes") if isinstance(item, dict) else None
+        result: Dict[str, Any] = {"id": str(raw_id) if raw_id is not None else None, "ok": False}
+        results.append(result)
+        if oid is None:
+            result["error"] = "invalid id"
+        elif not isinstance(changes, dict) or not changes:
+            result["error"] = "changes must be a non-empty object"
+        elif oid in seen:
+            result["error"] = "same id more than once in this request"
+        else:
+            seen.add(oid)
+            ops.append(UpdateOne({"_id": oid}, {"$set": changes_of(changes)}))
+            pending.append((len(results) - 1, oid))
+    if not ops:
+        return results, []
+
+    failed: Dict[int, str] = {}
+    try:
+        collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+    ids = [oid for k, (_, oid) in enumerate(pending) if k not in failed]
+    docs = {d["_id"]: d for d in collection.find({"_id": {"$in": ids}})} if ids else {}
+
+    written = []
+    for k, (i, oid) in enumerate(pending):
+        if k in failed:
+            results[i]["error"] = failed[k]
+        elif oid not in docs:
+            results[i]["error"] = "not found"
+        else:
+            results[i]["ok"] = True
+            results[i]["doc"] = docs[oid]
+            written.append(docs[oid])
+    return results, written
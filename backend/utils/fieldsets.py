@@ -0,0 +1,35 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# ------------------ Sparse Fieldsets ------------------
+#
+# Read endpoints take `fields=name,role,skills` to return only those response
+# fields (plus "id"). The list becomes an inclusion projection, so the other
+# fields (projects_by_skill, previous_experience, ...) are never read from
+# Mongo nor serialized; pick() then drops the defaults _public() fills in
+# for fields that weren't loaded. Response field names are the stored field
+# names, except "id" (_id).
+
+def parse_fields(raw: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """`fields` query value -> requested fields (None: all); ValueError naming unknown ones."""
+    if raw is None or not raw.strip():
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"unknown field(s) {', '.join(unknown)}; fields can be {', '.join(allowed)}")
+    return fields
+
+def projection(fields: Optional[List[str]], default: Optional[Dict[str, int]] = None,
+               also: Iterable[str] = ()) -> Optional[Dict[str, int]]:
+    """Mongo projection for `fields` (`default` when all are wanted); `also` are extra stored fields the route needs."""
+    if fields is None:
+        return default
+    proj = {("_id" if f == "id" else f): 1 for f in fields}
+    for f in also:
+        proj[f] = 1
+    return proj
+
+def pick(public: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return public
+    return {k: public[k] for k in ("id", *fields) if k in public}
@@ -0,0 +1,157 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+import json
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# ------------------ NDJSON Import / Export ------------------
+#
+# Bulk endpoints read and write one JSON document per line. Import reads the
+# request body line by line and hands it to the caller in chunks (one
+# bulk_write each), so neither side ever holds the whole payload; export
+# streams rows from a batched cursor. Bad lines are reported with their line
+# number instead of failing the whole import.
+
+MAX_REPORTED_ERRORS = 100
+
+def iter_lines(stream) -> Iterator[Tuple[int, Any]]:
+    """(line number, parsed object or ValueError) per non-blank line of a binary stream."""
+    for n, raw in enumerate(stream, 1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            obj = json.loads(raw)
+        except ValueError as e:
+            yield n, ValueError(f"invalid JSON: {e}")
+            continue
+        yield n, obj if isinstance(obj, dict) else ValueError("line is not a JSON object")
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class ImportReport:
+    def __init__(self):
+        self.lines = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def fail(self, line: int, error: Any) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": str(error)})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"lines": self.lines, "created": self.created, "updated": self.updated,
+                "failed": self.failed, "errors": self.errors}
+
+def _oid(s: Any) -> Optional[ObjectId]:
+    try:
+        return ObjectId(str(s))
+    except Exception:
+        return None
+
+def upsert_chunk(collection, chunk: List[Tuple[int, Any]], report: ImportReport, name_field: str, by_name: bool,
+                 fields_of: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 new_doc: Callable[[Dict[str, Any], datetime], Dict[str, Any]],
+                 derive: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Write one chunk of (line, object) with a single bulk_write and return the
+    documents written, as stored. A line with "id" updates that document with
+    the fields it carries (an unknown id creates it); with by_name a line
+    without "id" updates the document whose `name_field` equals its value;
+    any other line creates a document. fields_of normalizes a line, new_doc
+    fills in a new document's defaults, derive(doc) returns fields computed
+    from the merged document (set on every write). Several lines for the same
+    document become one write.
+    """
+    report.lines += len(chunk)
+    rows = []
+    for line, obj in chunk:
+        if isinstance(obj, Exception):
+            report.fail(line, obj)
+            continue
+        fields = fields_of(obj)
+        oid = _oid(obj["id"]) if obj.get("id") is not None else None
+        if obj.get("id") is not None and oid is None:
+            report.fail(line, "invalid id")
+        elif name_field in fields and not fields[name_field]:
+            report.fail(line, f"{name_field} can't be empty")
+        elif oid is None and not fields.get(name_field):
+            report.fail(line, f"{name_field} is required")
+        else:
+            rows.append((line, oid, fields))
+    if not rows:
+        return []
+
+    ids = [oid for _, oid, _ in rows if oid is not None]
+    names = [f[name_field] for _, oid, f in rows if oid is None] if by_name else []
+    existing = {d["_id"]: d for d in collection.find({"_id": {"$in": ids}})} if ids else {}
+    named = {d[name_field]: d for d in collection.find({name_field: {"$in": names}})} if names else {}
+
+    now = datetime.utcnow()
+    targets: Dict[Any, Dict[str, Any]] = {}
+    for line, oid, fields in rows:
+        if oid is None and by_name and fields[name_field] in named:
+            oid = named[fields[name_field]]["_id"]
+            existing.setdefault(oid, named[fields[name_field]])
+        t = targets.get(oid) if oid is not None else None
+        if t is None:
+            old = existing.get(oid) if oid is not None else None
+            if old is None:
+                doc = new_doc(fields, now)
+                doc["_id"] = oid or ObjectId()
+                t = {"doc": doc, "set": None, "lines": []}
+            else:
+                t = {"doc": old, "set": {}, "lines": []}
+            targets[t["doc"]["_id"]] = t
+            if by_name and t["doc"].get(name_field):
+                named[t["doc"][name_field]] = t["doc"]
+        if t["set"] is not None:
+            t["set"].update(fields)
+        t["doc"].update(fields)
+        t["lines"].append(line)
+
+    ops: List[Any] = []
+    for t in targets.values():
+        doc = t["doc"]
+        doc["updated_at"] = now
+        extra = derive(doc) if derive else {}
+        doc.update(extra)
+        if t["set"] is None:
+            ops.append(InsertOne(doc))
+        else:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {**t["set"], **extra, "updated_at": now}}))
+    failed: Dict[int, str] = {}
+    try:
+        collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+
+    written = []
+    for i, t in enumerate(targets.values()):
+        if i in failed:
+            for line in t["lines"]:
+                report.fail(line, failed[i])
+            continue
+        written.append(t["doc"])
+        created = t["set"] is None
+        report.created += created
+        report.updated += len(t["lines"]) - created
+    return written
+
+def export_lines(cursor, to_public: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 dumps: Callable[[Any], str]) -> Iterator[str]:
+    for doc in cursor:
+        yield dumps(to_public(doc)) + "\n"
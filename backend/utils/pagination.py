@@ -0,0 +1,126 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+from threading import Lock
+import base64
+
+from bson import json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS
+
+# ------------------ Keyset Pagination ------------------
+#
+# List endpoints page with an opaque `after` token instead of skip(): the
+# token holds the sort field, direction and the (value, _id) of the last row
+# served, and the next page is
+#     field > value  OR  (field == value AND _id > last _id)
+# (reversed for descending sorts) over a (field, _id) index, so page 1000
+# costs the same as page 1. Documents without the field sort as null (first
+# ascending, last descending). page/limit keeps working (skip) for older
+# clients; those responses carry the token too, so a client can switch over.
+#
+# Totals are optional (see count_total): a full count_documents on every
+# call is what made deep listings slow.
+
+def parse_sort(sort: str, default: Tuple[str, int]) -> Tuple[str, int]:
+    """"-field" / "field" -> (field, -1 / 1); empty -> default."""
+    sort = (sort or "").strip()
+    if not sort:
+        return default
+    if sort.startswith("-"):
+        return sort[1:], -1
+    return sort, 1
+
+def sort_spec(field: str, direction: int) -> List[Tuple[str, int]]:
+    if field == "_id":
+        return [("_id", direction)]
+    return [(field, direction), ("_id", direction)]
+
+def encode_cursor(field: str, direction: int, doc: Dict[str, Any]) -> str:
+    blob = json_util.dumps({"s": field, "d": direction, "v": doc.get(field), "id": doc["_id"]},
+                           json_options=CANONICAL_JSON_OPTIONS, separators=(",", ":"))
+    return base64.urlsafe_b64encode(blob.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str, field: str, direction: int) -> Tuple[Any, Any]:
+    """(value, _id) of the last row; ValueError if the token is bad or for another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json_util.loads(raw.decode("utf-8"))
+        value, last_id = data["v"], data["id"]
+        same_sort = data["s"] == field and data["d"] == direction
+    except Exception:
+        raise ValueError("invalid 'after' cursor")
+    if not same_sort:
+        raise ValueError("'after' cursor was made for a different sort")
+    return value, last_id
+
+def keyset_filter(field: str, direction: int, value: Any, last_id: Any) -> Dict[str, Any]:
+    """Rows strictly after (value, last_id) in sort_spec(field, direction) order."""
+    op = "$gt" if direction > 0 else "$lt"
+    if field == "_id":
+        return {"_id": {op: last_id}}
+    same = {field: value, "_id": {op: last_id}}
+    if value is None:
+        # nulls sort first ascending, last descending
+        return {"$or": [same, {field: {"$ne": None}}]} if direction > 0 else same
+    after = [{field: {op: value}}, same]
+    if direction < 0:
+        after.append({field: None})
+    return {"$or": after}
+
+def with_filter(query: Dict[str, Any], extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not extra:
+        return query
+    return {"$and": [query, extra]} if query else extra
+
+def page_rows(cursor, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """Up to `limit` rows from a cursor limited to limit + 1, and whether there are more."""
+    rows = list(cursor)
+    return rows[:limit], len(rows) > limit
+
+# ------------------ Totals ------------------
+#
+# count_total(mode):
+#   exact      count_documents(query) every call,
+#   cached     exact count, remembered per (collection, filter, version
+#              counter) so it is recomputed only after a write,
+#   estimated  collection metadata (estimated_document_count) when there is
+#              no filter, the cached count otherwise,
+#   none       no total.
+
+COUNT_MODES = ("exact", "cached", "estimated", "none")
+
+class _CountCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._data: "OrderedDict[Hashable, int]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            n = self._data.get(key)
+            if n is not None:
+                self._data.move_to_end(key)
+            return n
+
+    def put(self, key: Hashable, n: int) -> None:
+        with self._lock:
+            self._data[key] = n
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+_counts = _CountCache()
+
+def count_total(collection, query: Dict[str, Any], mode: str, version: int) -> Optional[int]:
+    """Total for `query` per `mode` (see above); `version` is the collection's write counter."""
+    if mode == "none":
+        return None
+    if mode == "exact":
+        return collection.count_documents(query)
+    if mode == "estimated" and not query:
+        return collection.estimated_document_count()
+    key = (collection.name, json_util.dumps(query, sort_keys=True), version)
+    n = _counts.get(key)
+    if n is None:
+        n = collection.count_documents(query)
+        _counts.put(key, n)
+    return n
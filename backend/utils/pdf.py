@@ -1,22 +1,235 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
+from threading import Lock
+import logging
+import multiprocessing
+import time
 
-def extract_text_from_pdf_bytes(data: bytes) -> str:
+from config import Config
+
+log = logging.getLogger(__name__)
+
+# ------------------ PDF Text Extraction ------------------
+#
+# pypdf (PyPDF2 as a fallback) with budgets, so one pathological file can't
+# pin a worker:
+#   max_pages    only the first N pages are read,
+#   max_seconds  wall-clock budget for the whole file,
+#   max_chars    stop once this much text is collected.
+# iter_pdf_pages() yields (page number, text) as pages are done, so a caller
+# can stop early; extract_pdf_text() collects them and returns timings.
+#
+# With workers > 1 (per-page parallelism) or isolate=True the pages are
+# extracted in a spawned process pool, started for each file and terminated
+# when the time budget runs out or the caller stops, so a page that hangs or
+# crashes the parser takes down only that pool (a crashed worker ends the
+# file with stopped="error" rather than waiting for its lost pages). In-process extraction can only check
+# the time budget between pages. Code already running inside a pool worker
+# must use workers=0, isolate=False (pool workers can't start processes).
+
+_PAGES_PER_TASK = 4
+
+def _reader(data: Any):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        try:
+            from PyPDF2 import PdfReader
+        except ImportError:
+            return None
+    return PdfReader(BytesIO(data) if isinstance(data, (bytes, bytearray)) else data, strict=False)
+
+def _page_text(reader, i: int) -> Tuple[str, Optional[str]]:
+    try:
+        return reader.pages[i].extract_text() or "", None
+    except Exception as e:
+        return "", str(e) or e.__class__.__name__
+
+# ------------------ Pool Worker ------------------
+
+_worker_reader = None
+_worker_error: Optional[str] = None
+
+def _init_worker(data: bytes) -> None:
+    # an exception here would make the pool respawn workers forever
+    global _worker_reader, _worker_error
+    try:
+        _worker_reader = _reader(data)
+    except Exception as e:
+        _worker_error = str(e) or e.__class__.__name__
+
+def _worker_page_count() -> int:
+    if _worker_error:
+        raise ValueError(_worker_error)
+    return len(_worker_reader.pages) if _worker_reader is not None else 0
+
+def _worker_pages(pages: List[int]) -> List[Tuple[int, str, Optional[str]]]:
+    return [(i, *_page_text(_worker_reader, i)) for i in pages]
+
+# ------------------ Extraction ------------------
+
+class _Budget:
+    def __init__(self, max_pages: Optional[int], max_seconds: Optional[float]):
+        self.max_pages = Config.PDF_MAX_PAGES if max_pages is None else max_pages
+        self.max_seconds = Config.PDF_MAX_SECONDS if max_seconds is None else max_seconds
+        self.deadline = time.monotonic() + self.max_seconds if self.max_seconds > 0 else None
+
+    def pages(self, total: int) -> int:
+        return min(total, self.max_pages) if self.max_pages > 0 else total
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else max(self.deadline - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+def _iter_in_process(data: Any, budget: _Budget, stats: Dict[str, Any]) -> Iterator[Tuple[int, str]]:
+    reader = _reader(data)
+    if reader is None:
+        stats["stopped"] = "no pdf library"
+        return
+    stats["pages_total"] = total = len(reader.pages)
+    for i in range(budget.pages(total)):
+        if budget.expired():
+            stats["stopped"] = "time"
+            return
+        text, error = _page_text(reader, i)
+        if error:
+            stats["page_errors"] += 1
+        stats["pages_read"] += 1
+        yield i, text
+    if budget.pages(total) < total:
+        stats["stopped"] = "max_pages"
+
+def _terminate(pool: ProcessPoolExecutor) -> None:
+    # shutdown() alone would wait for (or leave running) a hung page; it also
+    # forgets the worker processes, so take them first
+    procs = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in procs:
+        p.terminate()
+
+def _iter_pooled(data: Any, budget: _Budget, workers: int, stats: Dict[str, Any]) -> Iterator[Tuple[int, str]]:
+    if not isinstance(data, (bytes, bytearray)):
+        data = data.read()
+    # a worker that dies makes every pending result raise BrokenProcessPool
+    # (multiprocessing.Pool would replace it and wait forever for its task)
+    pool = ProcessPoolExecutor(max(workers, 1), mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(bytes(data),))
+    try:
+        stats["pages_total"] = total = pool.submit(_worker_page_count).result(budget.remaining())
+        n = budget.pages(total)
+        chunks = [list(range(i, min(i + _PAGES_PER_TASK, n))) for i in range(0, n, _PAGES_PER_TASK)]
+        futures = [pool.submit(_worker_pages, chunk) for chunk in chunks]
+        for fut in futures:
+            for i, text, error in fut.result(budget.remaining()):
+                if error:
+                    stats["page_errors"] += 1
+                stats["pages_read"] += 1
+                yield i, text
+        if n < total:
+            stats["stopped"] = "max_pages"
+    except FutureTimeout:
+        stats["stopped"] = "time"
+    except BrokenProcessPool as e:
+        stats["stopped"] = "error"
+        log.warning("PDF extraction worker crashed: %s", e)
+    except Exception as e:
+        stats["stopped"] = "error"
+        log.warning("PDF extraction worker failed: %s", e)
+    finally:
+        _terminate(pool)
+
+def iter_pdf_pages(data: Any, max_pages: Optional[int] = None, max_seconds: Optional[float] = None,
+                   workers: Optional[int] = None, isolate: Optional[bool] = None,
+                   stats: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[int, str]]:
     """
-    Very safe, dependency-light extractor using PyPDF2.
-    If PyPDF2 is not installed, return empty string.
+    (page index, text) for the pages of a PDF (bytes or binary file), in
+    page order, within the budgets (None = Config defaults). Pass a dict as
+    `stats` to get pages_total / pages_read / page_errors / stopped filled in.
+    In pool mode (workers > 1 or isolate) every call starts its own spawn
+    pool, which costs a few hundred ms of interpreter start-up per file.
     """
+    if stats is None:
+        stats = {}
+    stats.update({"pages_total": 0, "pages_read": 0, "page_errors": 0, "stopped": None})
+    budget = _Budget(max_pages, max_seconds)
+    workers = Config.PDF_PAGE_WORKERS if workers is None else workers
+    isolate = Config.PDF_ISOLATE if isolate is None else isolate
+    stats["mode"] = "pool" if workers > 1 or isolate else "inline"
     try:
-        import PyPDF2  # pip install PyPDF2
-    except Exception:
-        return ""
-    try:
-        reader = PyPDF2.PdfReader(BytesIO(data))
-        text = []
-        for page in reader.pages:
-            try:
-                text.append(page.extract_text() or "")
-            except Exception:
-                pass
-        return "\n".join(text)
-    except Exception:
-        return ""
+        if stats["mode"] == "pool":
+            yield from _iter_pooled(data, budget, workers, stats)
+        else:
+            yield from _iter_in_process(data, budget, stats)
+    except Exception as e:
+        # unreadable file (bad xref, encrypted, not a PDF)
+        stats["stopped"] = "error"
+        log.warning("PDF extraction failed: %s", e)
+
+def extract_pdf_text(data: Any, max_pages: Optional[int] = None, max_seconds: Optional[float] = None,
+                     max_chars: Optional[int] = None, workers: Optional[int] = None,
+                     isolate: Optional[bool] = None) -> Tuple[str, Dict[str, Any]]:
+    """(text, stats) with stats = pages, errors, why it stopped early, chars and ms."""
+    t0 = time.perf_counter()
+    max_chars = Config.PDF_MAX_CHARS if max_chars is None else max_chars
+    stats: Dict[str, Any] = {}
+    parts: List[str] = []
+    size = 0
+    pages = iter_pdf_pages(data, max_pages, max_seconds, workers, isolate, stats)
+    for _, text in pages:
+        parts.append(text)
+        size += len(text) + 1
+        if 0 < max_chars <= size:
+            stats["stopped"] = "max_chars"
+            break
+    pages.close()
+    text = "\n".join(parts)
+    if max_chars > 0:
+        text = text[:max_chars]
+    stats["chars"] = len(text)
+    stats["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    _record(stats)
+    return text, stats
+
+def extract_text_from_pdf_bytes(data: Any, **opts) -> str:
+    """
+    Text of a PDF (bytes or seekable binary file) within the Config budgets;
+    "" when it can't be read or no PDF library is installed. `opts` go to
+    extract_pdf_text().
+    """
+    return extract_pdf_text(data, **opts)[0]
+
+# ------------------ Extraction Stats ------------------
+
+_recent: deque = deque(maxlen=500)
+_recent_lock = Lock()
+
+def _record(stats: Dict[str, Any]) -> None:
+    with _recent_lock:
+        _recent.append((stats["ms"], stats["pages_read"], stats["stopped"]))
+    log.info("pdf extract: %d/%d pages, %d chars, %.1f ms (%s)%s", stats["pages_read"], stats["pages_total"],
+             stats["chars"], stats["ms"], stats["mode"], f", stopped: {stats['stopped']}" if stats["stopped"] else "")
+
+def pdf_stats() -> Dict[str, Any]:
+    """Timings of this process's recent extractions."""
+    with _recent_lock:
+        recent = list(_recent)
+    if not recent:
+        return {"count": 0}
+    ms = sorted(r[0] for r in recent)
+    stopped: Dict[str, int] = {}
+    for r in recent:
+        if r[2]:
+            stopped[r[2]] = stopped.get(r[2], 0) + 1
+    return {
+        "count": len(recent),
+        "avg_ms": round(sum(ms) / len(ms), 1),
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        "max_ms": ms[-1],
+        "pages": sum(r[1] for r in recent),
+        "stopped": stopped,
+    }
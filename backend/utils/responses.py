@@ -0,0 +1,194 @@
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+from datetime import date, datetime
+import hashlib
+import json
+import zlib
+
+from bson import ObjectId
+from flask import Flask, current_app, g, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+from config import Config
+from services import versions
+
+try:
+    import orjson
+except Exception:  # orjson is optional; the stdlib encoder is used without it
+    orjson = None
+try:
+    import brotli
+except Exception:  # brotli is optional; gzip only without it
+    brotli = None
+
+# ------------------ Response Layer ------------------
+#
+# install(app) puts three things in front of every blueprint:
+#   * JSON: orjson encodes jsonify() / app.json bodies (and parses request
+#     JSON) when it is installed. The output matches Flask's encoder: sorted
+#     keys, datetimes as HTTP dates, ObjectIds as strings; anything orjson
+#     can't encode falls back to the stdlib.
+#   * ETag / If-None-Match: GETs of the endpoints given in `versioned` get an
+#     ETag from the collection version counters (services.versions), the
+#     full URL and the day, and are answered 304 before the view runs when
+#     the client's copy is current. Other GET JSON responses get an ETag
+#     from a hash of the body (saves the transfer, not the work). A view
+#     that served a degraded result calls no_store(): no ETag, and
+#     Cache-Control: no-store.
+#   * Compression: brotli (when installed) or gzip, per Accept-Encoding, for
+#     JSON / NDJSON / text bodies of at least COMPRESS_MIN_BYTES; streamed
+#     responses are compressed chunk by chunk with a flush after each, so
+#     NDJSON lines still arrive as they are produced.
+
+_COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+
+def _default(o: Any) -> Any:
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (date, datetime)):
+        return http_date(o)
+    return DefaultJSONProvider.default(o)
+
+if orjson is not None:
+    _OPTS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+             | orjson.OPT_SERIALIZE_NUMPY)
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+
+    def _fast(self) -> bool:
+        return orjson is not None and Config.JSON_FAST
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if self._fast() and not kwargs:
+            try:
+                return orjson.dumps(obj, default=_default, option=_OPTS).decode("utf-8")
+            except orjson.JSONEncodeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if self._fast() and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if not self._fast():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        opts = _OPTS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            opts |= orjson.OPT_INDENT_2
+        try:
+            data = orjson.dumps(obj, default=_default, option=opts)
+        except orjson.JSONEncodeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
+
+# ------------------ Compression ------------------
+
+def _encoding() -> Optional[str]:
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=Config.COMPRESS_BROTLI_QUALITY)
+    c = zlib.compressobj(Config.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress(data) + c.flush()
+
+def _compress_stream(chunks: Iterable[Any], encoding: str) -> Iterator[bytes]:
+    if encoding == "br":
+        c = brotli.Compressor(quality=Config.COMPRESS_BROTLI_QUALITY)
+        step, end = (lambda b: c.process(b) + c.flush()), c.finish
+    else:
+        z = zlib.compressobj(Config.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        step, end = (lambda b: z.compress(b) + z.flush(zlib.Z_SYNC_FLUSH)), z.flush
+    try:
+        for chunk in chunks:
+            out = step(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            if out:
+                yield out
+        yield end()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+def _maybe_compress(response) -> None:
+    if not Config.COMPRESS_MIN_BYTES or response.direct_passthrough:
+        return
+    if not (response.mimetype or "").startswith(_COMPRESSIBLE):
+        return
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or "Content-Encoding" in response.headers or request.method == "HEAD":
+        return
+    encoding = _encoding()
+    if encoding is None:
+        return
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < Config.COMPRESS_MIN_BYTES:
+            return
+        response.set_data(_compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+
+# ------------------ ETags ------------------
+
+def _version_etag(names: Sequence[str]) -> Optional[str]:
+    db = current_app.config.get("DB")
+    if db is None:
+        return None
+    key = [request.full_path, sorted(versions.get_versions(db, names).items()), datetime.utcnow().date().toordinal()]
+    return "v-" + hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()[:24]
+
+def no_store() -> None:
+    """Don't validate or store this request's response (e.g. a fallback result)."""
+    g.version_etag = None
+    g.no_store = True
+
+def install(app: Flask, versioned: Optional[Dict[str, Sequence[str]]] = None) -> None:
+    """
+    Set up the response layer on `app`. `versioned` maps an endpoint
+    ("match.match_for_project") or a whole blueprint ("employees") to the
+    version counters its GET responses are computed from.
+    """
+    versioned = versioned or {}
+    app.json = FastJSONProvider(app)
+
+    @app.before_request
+    def _not_modified():
+        if not Config.HTTP_ETAGS or request.method not in ("GET", "HEAD"):
+            return None
+        names = versioned.get(request.endpoint or "") or versioned.get(request.blueprint or "")
+        tag = _version_etag(names) if names else None
+        g.version_etag = tag
+        if tag is not None and request.if_none_match.contains_weak(tag):
+            response = app.response_class(status=304)
+            response.set_etag(tag, weak=True)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return None
+
+    @app.after_request
+    def _finish(response):
+        if g.get("no_store"):
+            response.headers["Cache-Control"] = "no-store"
+        elif Config.HTTP_ETAGS and request.method in ("GET", "HEAD") and response.status_code == 200:
+            tag = g.get("version_etag")
+            if tag is not None:
+                response.set_etag(tag, weak=True)
+            elif not response.is_streamed and (response.mimetype or "").startswith(_COMPRESSIBLE):
+                response.set_etag(hashlib.sha1(response.get_data()).hexdigest()[:24], weak=True)
+            if response.get_etag()[0]:
+                response.headers.setdefault("Cache-Control", "no-cache")
+                response.make_conditional(request)
+        _maybe_compress(response)
+        return response
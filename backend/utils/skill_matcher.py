@@ -0,0 +1,168 @@
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Set, Tuple
+from collections import deque
+from functools import lru_cache
+
+try:
+    import ahocorasick  # pip install pyahocorasick (optional C automaton)
+except Exception:
+    ahocorasick = None
+
+# ------------------ Skill Lexicon ------------------
+#
+# Canonical skill name -> lowercase spellings that mean the same thing.
+# Matching is substring based (like the `skill in text` checks it replaces),
+# so every spelling is looked for anywhere in the lowercased text.
+
+SKILL_LEXICON: Dict[str, List[str]] = {
+    "React": ["react", "reactjs", "react.js"],
+    "Next.js": ["nextjs", "next.js"],
+    "Node.js": ["node", "nodejs", "node.js"],
+    "JavaScript": ["javascript", "ecmascript"],
+    "TypeScript": ["typescript"],
+    "Python": ["python"],
+    "Java": ["java"],
+    "MongoDB": ["mongodb", "mongo db"],
+    "Flask": ["flask"],
+    "Django": ["django"],
+    "AWS": ["aws", "amazon web services"],
+    "GCP": ["gcp", "google cloud"],
+    "Azure": ["azure"],
+    "Docker": ["docker"],
+    "Kubernetes": ["kubernetes", "k8s"],
+}
+
+def _build_synonyms() -> Dict[str, Tuple[str, ...]]:
+    out: Dict[str, Tuple[str, ...]] = {}
+    for canonical, spellings in SKILL_LEXICON.items():
+        group = tuple(dict.fromkeys([canonical.lower()] + [s.lower() for s in spellings]))
+        for s in group:
+            out[s] = group
+    return out
+
+_SYNONYMS = _build_synonyms()
+
+def spellings(skill: str) -> Tuple[str, ...]:
+    """Lowercase spellings to look for when matching `skill` (itself + lexicon synonyms)."""
+    low = (skill or "").lower()
+    group = _SYNONYMS.get(low.strip())
+    if group is None:
+        return (low,)
+    return tuple(dict.fromkeys((low,) + group))
+
+# ------------------ Aho-Corasick Automaton ------------------
+
+# Below this many patterns, and without pyahocorasick, a plain `p in text`
+# loop (C substring search per pattern) beats walking a Python-level automaton
+# character by character; see bench/bench_skill_matcher.py.
+_LOOP_MAX_PATTERNS = 96
+
+class SkillMatcher:
+    """
+    Multi-pattern substring matcher: every pattern maps to one or more labels,
+    and labels(text) returns the labels of all patterns occurring in the text
+    after a single left-to-right scan. Uses pyahocorasick when installed, and
+    otherwise a pure-Python automaton (large pattern sets) or a substring loop
+    (small ones) with the same results.
+    """
+
+    def __init__(self, patterns: Dict[str, Iterable[Hashable]]):
+        self._patterns = {p: frozenset(labels) for p, labels in patterns.items() if p}
+        self._native = None
+        self._loop = None
+        if ahocorasick is not None and self._patterns:
+            auto = ahocorasick.Automaton()
+            for p, labels in self._patterns.items():
+                auto.add_word(p, labels)
+            auto.make_automaton()
+            self._native = auto
+        elif len(self._patterns) <= _LOOP_MAX_PATTERNS:
+            self._loop = list(self._patterns.items())
+        else:
+            self._build()
+
+    def _build(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Set[Hashable]] = [set()]
+        for p, labels in self._patterns.items():
+            node = 0
+            for ch in p:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(set())
+                node = nxt
+            out[node].update(labels)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+                out[nxt] |= out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out: List[FrozenSet[Hashable]] = [frozenset(o) for o in out]
+
+    def labels(self, text: str) -> Set[Hashable]:
+        """Labels of every pattern found in `text` (lowercase it first)."""
+        found: Set[Hashable] = set()
+        if not text or not self._patterns:
+            return found
+        if self._native is not None:
+            for _, labels in self._native.iter(text):
+                found |= labels
+            return found
+        if self._loop is not None:
+            for p, labels in self._loop:
+                if p in text:
+                    found |= labels
+            return found
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+    def search(self, text: str) -> bool:
+        """True if any pattern occurs in `text` (stops at the first hit)."""
+        if not text or not self._patterns:
+            return False
+        if self._native is not None:
+            for _ in self._native.iter(text):
+                return True
+            return False
+        if self._loop is not None:
+            return any(p in text for p, _ in self._loop)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                return True
+        return False
+
+@lru_cache(maxsize=256)
+def group_matcher(terms: Tuple[str, ...]) -> SkillMatcher:
+    """
+    Matcher whose labels are positions in `terms`: labels(text) tells which
+    terms (or one of their lexicon synonyms) occur in the text.
+    """
+    patterns: Dict[str, Set[int]] = {}
+    for i, term in enumerate(terms):
+        for s in spellings(term):
+            patterns.setdefault(s, set()).add(i)
+    return SkillMatcher(patterns)